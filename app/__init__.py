@@ -1,18 +1,10 @@
 import time
 from typing import Tuple
 
-from flask import Flask, render_template, request
+from flask import Flask, g, render_template, request
 from flask_login import LoginManager
 from pymongo.errors import ServerSelectionTimeoutError
 
-from app.cache import cache
-from app.config import APP_SECRET, CACHE_TIMEOUT, ENV, REDIS_URL, REDISHOST, REDISPORT
-from app.helpers.users import user_utils
-from app.logging import logger, return_client_ip
-from app.models.users import UserInfo
-from app.mongo import mongodb
-from app.views import backstage_bp, frontstage_bp, main_bp
-
 
 def create_app() -> Flask:
     """Create and configure the Flask application.
@@ -28,6 +20,17 @@ def create_app() -> Flask:
     Returns:
         Flask: The configured Flask application instance.
     """
+    # imported here rather than with the package, so that a process importing a single module
+    # of it, such as the renderer in the processes of an import, does not set up the others
+    from app.cache import cache, cache_serializer, user_cache
+    from app.commands import register_commands
+    from app.config import APP_SECRET, CACHE_TIMEOUT, ENV, REDIS_URL, REDISHOST, REDISPORT
+    from app.helpers.users import user_utils
+    from app.logging import logger, return_client_ip
+    from app.models.users import UserInfo
+    from app.mongo import mongodb
+    from app.views import backstage_bp, frontstage_bp, main_bp
+
     app = Flask(__name__)
     logger.info("App initialization started.")
     app.secret_key = APP_SECRET
@@ -50,7 +53,10 @@ def create_app() -> Flask:
     app.config["CACHE_REDIS_DB"] = 0
     app.config["CACHE_REDIS_URL"] = REDIS_URL
     app.config["CACHE_DEFAULT_TIMEOUT"] = CACHE_TIMEOUT
+    # cached values are serialized with msgpack instead of pickle, namespaced by format version
+    app.config["CACHE_KEY_PREFIX"] = cache_serializer.key_prefix
     cache.init_app(app)
+    app.extensions["cache"][cache].serializer = cache_serializer
     logger.debug(f"{app.config['CACHE_TYPE']} initialized.")
 
     # Login manager configuration
@@ -70,13 +76,7 @@ def create_app() -> Flask:
         Returns:
             UserInfo: The user information object.
         """
-        user = cache.get(username)
-        if not user:
-            user = user_utils.get_user_info(username)
-            if user:
-                logger.debug("Updating user cache from user loader.")
-                cache.set(username, user, timeout=5 * 60)
-        return user
+        return user_cache.load(username, user_utils.get_user_info)
 
     # Error handlers
     @app.errorhandler(404)
@@ -109,12 +109,29 @@ def create_app() -> Flask:
 
     logger.debug("Error handlers registered.")
 
+    @app.teardown_request
+    def report_identity_map(error) -> None:
+        """Log how many database calls the identity map saved during the request.
+
+        Args:
+            error: The unhandled exception of the request, if any.
+        """
+        identity_map = g.get("identity_map")
+        if identity_map is not None and identity_map.hits:
+            logger.debug(
+                f"Identity map saved {identity_map.hits} of "
+                f"{identity_map.hits + identity_map.misses} lookups at {request.path}."
+            )
+
     # Register blueprints
     app.register_blueprint(frontstage_bp, url_prefix="/")
     app.register_blueprint(backstage_bp, url_prefix="/backstage/")
     app.register_blueprint(main_bp, url_prefix="/")
     logger.debug("Blueprints registered.")
 
+    # Register CLI commands
+    register_commands(app)
+
     # Check MongoDB connection
     while True:
         try:
@@ -125,6 +142,9 @@ def create_app() -> Flask:
             logger.error("MongoDB is NOT connected. Retry in 60 secs.")
             time.sleep(60)
 
+    # Create missing indexes
+    mongodb.ensure_indexes()
+
     logger.info("App initialization completed.")
 
     return app
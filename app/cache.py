@@ -1,24 +1,1467 @@
+import functools
+import hashlib
+import json
+import math
+import os
+import pathlib
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import fields, is_dataclass, replace
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional, TypeVar
+
+import msgpack
+import zstandard
+from flask import Response, current_app, g, has_app_context, make_response, request, session
 from flask_caching import Cache
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from redis import Redis
+from redis.exceptions import RedisError
 
-from app.helpers.users import user_utils
+from app.config import (
+    CACHE_COMPRESS_LEVEL,
+    CACHE_COMPRESS_THRESHOLD,
+    CACHE_LOCK_POLL_INTERVAL,
+    CACHE_LOCK_TIMEOUT,
+    CACHE_REFRESH_BETA,
+    CACHE_STALE_GRACE,
+    CACHE_TIMEOUT,
+    PAGE_CACHE_ENABLED,
+    PAGE_CACHE_TIMEOUT,
+    USER_NEAR_CACHE_SIZE,
+    USER_NEAR_CACHE_TIMEOUT,
+)
 from app.logging import logger
+from app.models.users import UserInfo
 
 cache = Cache()
 
+T = TypeVar("T")
+
+
+class CacheDecodeError(ValueError):
+    """Raised when a cached value cannot be decoded, e.g. written by another schema version."""
+
+
+class CacheSerializer:
+    """Compact, versioned serializer of cached values, replacing pickle.
+
+    Values are encoded with msgpack. Datetimes are kept as ISO 8601 strings,
+    so that naive ones stay naive, and registered dataclasses as their name,
+    the schema version they were registered with and their fields. Payloads
+    above a size threshold are compressed with zstd. Every value is framed by a
+    marker byte never produced by msgpack, the format version and whether it is
+    compressed.
+
+    Values that cannot be decoded, e.g. a dataclass of an unknown schema
+    version, or pickles written before, read as a miss instead of raising, so
+    that workers of different versions can share Redis during a rolling deploy.
+
+    Implements the serializer interface of the Flask-Caching Redis backend,
+    which stores integers as plain digits for INCR. The sizes of the values
+    written are counted in power-of-two buckets per kind of value.
+    """
+
+    FORMAT_VERSION = 1
+    MARKER = b"\xc1"
+    COMPRESSED = 1
+
+    # msgpack extension types
+    DATETIME_EXT = 1
+    MODEL_EXT = 2
+
+    def __init__(self, threshold: int, level: int) -> None:
+        """Initialize the cache serializer.
+
+        Args:
+            threshold (int): The size in bytes above which payloads are compressed.
+            level (int): The zstd compression level.
+        """
+        self._threshold = threshold
+        self._level = level
+        self._models = {}
+        self._lock = threading.Lock()
+        self._sizes = {}
+        self._stats = {"compressed": 0, "decode_failures": 0}
+
+    @property
+    def key_prefix(self) -> str:
+        """The prefix of the keys of the Flask-Caching backend, changing with the format."""
+        return f"msgpack-v{self.FORMAT_VERSION}:"
+
+    def register(self, model: type, version: int) -> None:
+        """Register a dataclass, encoded with its schema version.
+
+        Args:
+            model (type): The dataclass.
+            version (int): The schema version, bumped whenever the dataclass changes shape.
+        """
+        self._models[model.__name__] = (model, version)
+
+    def schema_version(self, model: type) -> int:
+        """Get the schema version a dataclass is registered with.
+
+        Args:
+            model (type): The dataclass.
+
+        Returns:
+            int: The schema version.
+        """
+        return self._models[model.__name__][1]
+
+    def _default(self, value: object) -> msgpack.ExtType:
+        """Encode the values msgpack has no type for.
+
+        Args:
+            value (object): The value.
+
+        Returns:
+            msgpack.ExtType: The encoded value.
+
+        Raises:
+            TypeError: If the value is of an unsupported type.
+        """
+        if isinstance(value, datetime):
+            return msgpack.ExtType(self.DATETIME_EXT, value.isoformat().encode("ascii"))
+        name = type(value).__name__
+        if is_dataclass(value) and name in self._models:
+            data = {field.name: getattr(value, field.name) for field in fields(value)}
+            payload = self._pack([name, self._models[name][1], data])
+            return msgpack.ExtType(self.MODEL_EXT, payload)
+        raise TypeError(f"Cannot serialize a value of type {name}.")
+
+    def _ext_hook(self, code: int, payload: bytes) -> object:
+        """Decode the values encoded by _default.
+
+        Args:
+            code (int): The extension type.
+            payload (bytes): The encoded value.
+
+        Returns:
+            object: The value.
+
+        Raises:
+            CacheDecodeError: If the extension type, model or schema version is unknown.
+        """
+        if code == self.DATETIME_EXT:
+            return datetime.fromisoformat(payload.decode("ascii"))
+        if code == self.MODEL_EXT:
+            name, version, data = self._unpack(payload)
+            model, current_version = self._models.get(name, (None, None))
+            if model is None or version != current_version:
+                raise CacheDecodeError(f"Unknown schema version {version} of {name}.")
+            return model(**data)
+        raise CacheDecodeError(f"Unknown extension type {code}.")
+
+    def _pack(self, value: object) -> bytes:
+        """Encode a value with msgpack.
+
+        Args:
+            value (object): The value.
+
+        Returns:
+            bytes: The encoded value.
+        """
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def _unpack(self, data: bytes) -> object:
+        """Decode a value encoded with msgpack.
+
+        Args:
+            data (bytes): The encoded value.
+
+        Returns:
+            object: The value.
+        """
+        return msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+
+    def _record(self, kind: str, size: int, compressed: bool) -> None:
+        """Count the size of a written value.
+
+        Args:
+            kind (str): The kind of value, its type name.
+            size (int): The size in bytes as stored.
+            compressed (bool): Whether the value was compressed.
+        """
+        bucket = 1 << max(size - 1, 0).bit_length()
+        with self._lock:
+            sizes = self._sizes.setdefault(kind, {})
+            sizes[bucket] = sizes.get(bucket, 0) + 1
+            self._stats["compressed"] += compressed
+
+    def dumps(self, value: object) -> bytes:
+        """Serialize a value.
+
+        Args:
+            value (object): The value.
+
+        Returns:
+            bytes: The serialized value.
+        """
+        if type(value) is int:
+            # the Redis backend increments integers in place
+            return str(value).encode("ascii")
+        payload = self._pack(value)
+        flags = 0
+        if len(payload) > self._threshold:
+            payload = zstandard.ZstdCompressor(level=self._level).compress(payload)
+            flags |= self.COMPRESSED
+        data = self.MARKER + bytes([self.FORMAT_VERSION, flags]) + payload
+        self._record(type(value).__name__, len(data), bool(flags & self.COMPRESSED))
+        return data
+
+    def decode(self, data: bytes) -> object:
+        """Deserialize a value.
+
+        Args:
+            data (bytes): The serialized value.
+
+        Returns:
+            object: The value.
+
+        Raises:
+            CacheDecodeError: If the value cannot be decoded.
+        """
+        if data[:1] != self.MARKER or data[1:2] != bytes([self.FORMAT_VERSION]):
+            raise CacheDecodeError("Unknown serialization format.")
+        payload = data[3:]
+        try:
+            if data[2] & self.COMPRESSED:
+                payload = zstandard.ZstdDecompressor().decompress(payload)
+            return self._unpack(payload)
+        except CacheDecodeError:
+            raise
+        except Exception as error:
+            raise CacheDecodeError(f"Corrupt cached value: {error}") from error
+
+    def loads(self, data: Optional[bytes]) -> object:
+        """Deserialize a value, reading any value that cannot be decoded as a miss.
+
+        Args:
+            data (Optional[bytes]): The serialized value, or None on a miss.
+
+        Returns:
+            object: The value, or None on a miss.
+        """
+        if data is None:
+            return None
+        if data[:1] != self.MARKER:
+            try:
+                return int(data)
+            except ValueError:
+                pass
+        try:
+            return self.decode(data)
+        except CacheDecodeError as error:
+            logger.debug(f"Cached value read as a miss. {error}")
+            with self._lock:
+                self._stats["decode_failures"] += 1
+            return None
+
+    def stats(self) -> dict:
+        """Get the counters and the size histograms of the values written by this worker.
+
+        Returns:
+            dict: The counters, and per kind of value the number of values written in each
+                power-of-two size bucket, keyed by its upper bound in bytes.
+        """
+        with self._lock:
+            sizes = {kind: dict(sorted(buckets.items())) for kind, buckets in self._sizes.items()}
+            return {**self._stats, "sizes": sizes}
+
+
+class StampedeGuard:
+    """Keeps the lookups missing the same cache entry from all recomputing it at once.
+
+    Misses are filled in a single flight: within a worker, concurrent lookups of
+    a key wait on the thread computing it, and across workers the computing one
+    holds a short Redis lock while the others poll the cache for its result.
+
+    Entries may also record how long they took to compute and until when they
+    are fresh. Each lookup then recomputes an entry ahead of its expiry with a
+    probability growing as the expiry nears and with the cost of the entry
+    (XFetch), and entries are kept for a grace period after they expire, during
+    which they are still served while the lock holder recomputes them.
+    """
+
+    # delete the lock at KEYS[1] only if it is still held with the token ARGV[1]
+    RELEASE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(
+        self, cache: Cache, beta: float, grace: int, lock_timeout: float, poll_interval: float
+    ) -> None:
+        """Initialize the stampede guard.
+
+        Args:
+            cache (Cache): The shared cache backend, a RedisCache.
+            beta (float): How early entries are recomputed, 1.0 being the XFetch default.
+            grace (int): How long expired entries are still served in seconds.
+            lock_timeout (float): How long a worker may hold the lock of a key in seconds.
+            poll_interval (float): How often waiting workers poll the cache in seconds.
+        """
+        self._cache = cache
+        self._beta = beta
+        self.grace = grace
+        self._lock_timeout = lock_timeout
+        self._poll_interval = poll_interval
+        self._mutex = threading.Lock()
+        self._flights = {}
+        self._stats = {
+            "joined_flights": 0,
+            "lock_waits": 0,
+            "lock_timeouts": 0,
+            "refreshes": 0,
+            "stale_hits": 0,
+        }
+
+    def _client(self) -> Optional[Redis]:
+        """Get the Redis client of the shared cache backend.
+
+        Returns:
+            Optional[Redis]: The client, or None outside an application context.
+        """
+        if not has_app_context():
+            return None
+        return self._cache.cache._write_client
+
+    def _count(self, counter: str) -> None:
+        """Increment a counter.
+
+        Args:
+            counter (str): The name of the counter.
+        """
+        with self._mutex:
+            self._stats[counter] += 1
+
+    def fresh_until(self, timeout: int) -> float:
+        """Get the time until which an entry computed now is fresh.
+
+        Args:
+            timeout (int): The timeout of the entry in seconds.
+
+        Returns:
+            float: The time as a Unix timestamp, comparable across workers.
+        """
+        return time.time() + timeout
+
+    def refresh_due(self, fresh_until: float, delta: float) -> bool:
+        """Decide whether a lookup should recompute an entry, as XFetch does.
+
+        Args:
+            fresh_until (float): The time until which the entry is fresh.
+            delta (float): How long the entry took to compute in seconds.
+
+        Returns:
+            bool: True if the entry is expired or picked for an early refresh.
+        """
+        return time.time() - delta * self._beta * math.log(1.0 - random.random()) >= fresh_until
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[bool]:
+        """Hold the lock of a key across workers, if no other worker holds it.
+
+        Without an application context or a reachable Redis, the lock is always granted, so
+        that lookups never wait on a lock nobody can release.
+
+        Args:
+            key (str): The cache key.
+
+        Yields:
+            bool: True if the lock is held.
+        """
+        client = self._client()
+        token = uuid.uuid4().hex
+        try:
+            acquired = client is None or bool(
+                client.set(f"lock:{key}", token, nx=True, px=int(self._lock_timeout * 1000))
+            )
+        except RedisError:
+            logger.warning("Cache lock backend is unreachable.")
+            client, acquired = None, True
+        try:
+            yield acquired
+        finally:
+            if client is not None and acquired:
+                try:
+                    client.register_script(self.RELEASE)(keys=[f"lock:{key}"], args=[token])
+                except RedisError:
+                    logger.warning("Cache lock backend is unreachable, the lock expires.")
+
+    def _locked(self, key: str) -> bool:
+        """Check if another worker holds the lock of a key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            bool: True if the lock is held.
+        """
+        client = self._client()
+        if client is None:
+            return False
+        try:
+            return bool(client.exists(f"lock:{key}"))
+        except RedisError:
+            return False
+
+    def wait(self, key: str, read: Callable[[], Optional[T]]) -> Optional[T]:
+        """Poll the cache while another worker holds the lock of a key.
+
+        Args:
+            key (str): The cache key.
+            read (Callable[[], Optional[T]]): Reads the entry, returning None on a miss.
+
+        Returns:
+            Optional[T]: The entry, or None if the lock was released or timed out without it.
+        """
+        self._count("lock_waits")
+        deadline = time.monotonic() + self._lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self._poll_interval)
+            locked = self._locked(key)
+            value = read()
+            if value is not None or not locked:
+                return value
+        self._count("lock_timeouts")
+        return None
+
+    def fill(self, key: str, read: Callable[[], Optional[T]], compute: Callable[[], T]) -> T:
+        """Fill a missing entry in a single flight.
+
+        Args:
+            key (str): The cache key.
+            read (Callable[[], Optional[T]]): Reads the entry, returning None on a miss.
+            compute (Callable[[], T]): Computes and stores the entry.
+
+        Returns:
+            T: The entry, computed here or by another thread or worker.
+        """
+        with self._mutex:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+            else:
+                self._stats["joined_flights"] += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            with self.lock(key) as acquired:
+                if acquired:
+                    # another worker may have filled the entry before the lock was released
+                    value = read()
+                    if value is None:
+                        value = compute()
+            if not acquired:
+                value = self.wait(key, read)
+                if value is None:
+                    value = compute()
+            flight.set_result(value)
+            return value
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._mutex:
+                del self._flights[key]
+
+    @contextmanager
+    def revalidate(self, key: str, fresh_until: float, delta: float) -> Iterator[bool]:
+        """Decide whether a lookup should recompute the entry it read, or serve it as is.
+
+        Only the lookup holding the lock of the key recomputes an expired or early refreshed
+        entry, the others serve it meanwhile.
+
+        Args:
+            key (str): The cache key.
+            fresh_until (float): The time until which the entry is fresh.
+            delta (float): How long the entry took to compute in seconds.
+
+        Yields:
+            bool: True if the lookup should recompute the entry, while holding the lock.
+        """
+        if not self.refresh_due(fresh_until, delta):
+            yield False
+            return
+        expired = time.time() >= fresh_until
+        with self.lock(key) as acquired:
+            if acquired:
+                self._count("refreshes")
+            elif expired:
+                self._count("stale_hits")
+            yield acquired
+
+    def stats(self) -> dict[str, int]:
+        """Get the counters of joined flights, lock waits, refreshes and stale hits.
+
+        Returns:
+            dict[str, int]: The counters.
+        """
+        with self._mutex:
+            return dict(self._stats)
+
+
+class UserCache:
+    """Two-tier write-through cache of user information, ordered by document version.
+
+    Every update of a user information document increments its ``version``
+    field. Entries are Redis hashes holding the version next to the serialized
+    user, and are never replaced by an older version, checked atomically by a
+    Lua script, so that a slow writer cannot overwrite newer data. Loads
+    rewrite the entry at its version, since fields such as the view count are
+    updated without a new version. Writers either store the document returned
+    by their update, or patch the changed fields onto the previous version. A
+    patch that does not apply leaves a tombstone at its version, which reads as
+    a miss but still fences off older writers.
+
+    Loads go through a StampedeGuard. Entries record when they stop being fresh
+    and how long the user took to fetch, and outlive their freshness by the
+    grace period of the guard.
+
+    Each worker process keeps the serialized users it read last in a bounded LRU
+    with a short timeout, in front of Redis. Every write is broadcast over a
+    Redis channel, and a listener thread in each worker evicts the copies it
+    keeps at that version or older. The in-process tier is only used while the
+    listener is subscribed, since broadcasts sent in the meantime are lost.
+
+    Keys are namespaced as ``user-info:v<schema>:<username>``, the schema
+    version being bumped whenever UserInfo changes shape, and is registered
+    with the serializer. Entries that cannot be decoded are dropped and read as
+    a miss.
+    """
+
+    # 2: serialized with msgpack instead of pickle
+    # 3: last_updated
+    SCHEMA_VERSION = 3
+
+    # replace the entry at KEYS[1] unless it holds a newer version, or the write is a tombstone
+    # at the version it holds; an empty delta keeps the former one
+    SET_IF_NEWER = """
+    local current = tonumber(redis.call('HGET', KEYS[1], 'version'))
+    local version = tonumber(ARGV[1])
+    if current and current > version then
+        return 0
+    end
+    local delta = ARGV[5]
+    if delta == '' then
+        delta = redis.call('HGET', KEYS[1], 'delta') or '0'
+    end
+    if current == version and ARGV[2] == '' then
+        return 0
+    end
+    redis.call(
+        'HSET', KEYS[1], 'version', ARGV[1], 'data', ARGV[2], 'fresh_until', ARGV[4], 'delta', delta
+    )
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+    """
+
+    def __init__(
+        self,
+        cache: Cache,
+        serializer: CacheSerializer,
+        guard: StampedeGuard,
+        timeout: int,
+        near_entries: int,
+        near_timeout: float,
+    ) -> None:
+        """Initialize the user cache.
+
+        Args:
+            cache (Cache): The shared cache backend, a RedisCache.
+            serializer (CacheSerializer): Serializes the users, registered with the schema
+                version.
+            guard (StampedeGuard): Coordinates the loads missing the same user.
+            timeout (int): How long shared entries are fresh in seconds.
+            near_entries (int): The maximum number of users kept in each worker.
+            near_timeout (float): The timeout of entries kept in each worker in seconds.
+        """
+        self._cache = cache
+        self._serializer = serializer
+        self._serializer.register(UserInfo, self.SCHEMA_VERSION)
+        self._guard = guard
+        self._timeout = timeout
+        self._near_entries = near_entries
+        self._near_timeout = near_timeout
+        self._channel = f"user-info:v{self.SCHEMA_VERSION}:invalidations"
+        self._lock = threading.Lock()
+        self._near = OrderedDict()
+        self._listener_pid = None
+        self._subscribed = False
+        self._stats = {
+            "near_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def _client(self) -> Optional[Redis]:
+        """Get the Redis client of the shared cache backend, starting the listener if needed.
+
+        Returns:
+            Optional[Redis]: The client, or None outside an application context.
+        """
+        if not has_app_context():
+            return None
+        client = self._cache.cache._write_client
+        with self._lock:
+            if self._listener_pid != os.getpid():
+                # the listener thread does not survive a fork, start one per worker process
+                self._listener_pid = os.getpid()
+                self._subscribed = False
+                self._near.clear()
+                threading.Thread(
+                    target=self._listen, args=(client,), name="user-cache-listener", daemon=True
+                ).start()
+        return client
+
+    def _listen(self, client: Redis) -> None:
+        """Evict the users written by other workers, reconnecting whenever Redis goes away.
+
+        Args:
+            client (Redis): The Redis client.
+        """
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                with self._lock:
+                    # users read before subscribing may have missed their broadcasts
+                    self._near.clear()
+                    self._subscribed = True
+                for message in pubsub.listen():
+                    username, version = json.loads(message["data"])
+                    self._evict(username, version)
+            except RedisError:
+                logger.warning("User cache channel is unreachable, retrying.")
+            with self._lock:
+                self._subscribed = False
+                self._near.clear()
+            time.sleep(self._near_timeout)
+
+    def _key(self, username: str) -> str:
+        """Build the cache key of a user.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            str: The cache key.
+        """
+        return f"user-info:v{self.SCHEMA_VERSION}:{username}"
+
+    def _remember(self, username: str, version: int, data: bytes) -> None:
+        """Keep a serialized user in the worker, unless it already keeps a newer version.
+
+        Args:
+            username (str): The username.
+            version (int): The version of the user information.
+            data (bytes): The serialized user.
+        """
+        with self._lock:
+            if not self._subscribed:
+                return
+            entry = self._near.get(username)
+            if entry is not None and entry[1] > version:
+                return
+            self._near[username] = (time.monotonic() + self._near_timeout, version, data)
+            self._near.move_to_end(username)
+            while len(self._near) > self._near_entries:
+                self._near.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _evict(self, username: str, version: Optional[int]) -> None:
+        """Drop a user from the worker unless the kept version is newer than a written one.
+
+        A copy at the written version is dropped too, since loads rewrite the entry at its
+        version with fields such as the view count, which change without a new version.
+
+        Args:
+            username (str): The username.
+            version (Optional[int]): The written version, or None to drop any version.
+        """
+        with self._lock:
+            entry = self._near.get(username)
+            if entry is not None and (version is None or entry[1] <= version):
+                del self._near[username]
+                self._stats["invalidations"] += 1
+
+    def _publish(self, client: Redis, username: str, version: Optional[int]) -> None:
+        """Tell every worker that a user was written.
+
+        Args:
+            client (Redis): The Redis client.
+            username (str): The username.
+            version (Optional[int]): The written version, or None if the user was removed.
+        """
+        client.publish(self._channel, json.dumps([username, version]))
+
+    def _read(self, username: str) -> tuple[int, Optional[bytes], float, float]:
+        """Read the entry of a user from Redis.
 
-def update_user_cache(cache: Cache, username: str) -> None:
-    """Update the cache with user information.
+        Args:
+            username (str): The username.
 
-    This function fetches user information using the `user_utils.get_user_info`
-    function and updates the cache with the fetched data.
+        Returns:
+            tuple[int, Optional[bytes], float, float]: The cached version, or -1 if there is no
+                entry, the serialized user, or None if there is no entry or it is a tombstone, the
+                time until which the entry is fresh, and how long the user took to fetch.
+        """
+        client = self._client()
+        if client is None:
+            return -1, None, 0.0, 0.0
+        version, data, fresh_until, delta = client.hmget(
+            self._key(username), "version", "data", "fresh_until", "delta"
+        )
+        if version is None:
+            return -1, None, 0.0, 0.0
+        return int(version), data or None, float(fresh_until or 0), float(delta or 0)
 
-    Args:
-        cache (Cache): The cache instance to update.
-        username (str): The username for which to update the cache.
+    def _write(
+        self, username: str, version: int, user: Optional[UserInfo], delta: Optional[float] = None
+    ) -> bool:
+        """Write the entry of a user unless the cache holds a newer version.
 
-    Returns:
-        None
+        An entry holding the same version is rewritten, since the user was fetched again from
+        the database, and fields such as the view count change without a new version.
+
+        Args:
+            username (str): The username.
+            version (int): The version of the user information.
+            user (Optional[UserInfo]): The user, or None to leave a tombstone.
+            delta (Optional[float]): How long the user took to fetch in seconds. Defaults to
+                the time recorded by the entry written before.
+
+        Returns:
+            bool: True if the entry was written.
+        """
+        client = self._client()
+        if client is None:
+            return False
+        data = self._serializer.dumps(user) if user is not None else b""
+        set_if_newer = client.register_script(self.SET_IF_NEWER)
+        written = set_if_newer(
+            keys=[self._key(username)],
+            args=[
+                version,
+                data,
+                self._timeout + self._guard.grace,
+                self._guard.fresh_until(self._timeout),
+                "" if delta is None else delta,
+            ],
+        )
+        if not written:
+            return False
+        if data:
+            self._remember(username, version, data)
+        else:
+            self._evict(username, version)
+        self._publish(client, username, version)
+        return True
+
+    def _near_get(self, username: str) -> Optional[UserInfo]:
+        """Get a user kept in the worker.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            Optional[UserInfo]: The user, or None on a miss.
+        """
+        with self._lock:
+            entry = self._near.get(username)
+            if entry is not None and entry[0] > time.monotonic():
+                self._near.move_to_end(username)
+                self._stats["near_hits"] += 1
+                return self._serializer.loads(entry[2])
+            if entry is not None:
+                del self._near[username]
+        return None
+
+    def _shared_get(self, username: str) -> Optional[tuple[bytes, UserInfo, float, float]]:
+        """Get a user from Redis and keep it in the worker.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            Optional[tuple[bytes, UserInfo, float, float]]: The serialized user, the user, the
+                time until which it is fresh and how long it took to fetch, or None on a miss.
+        """
+        try:
+            version, data, fresh_until, delta = self._read(username)
+            if not data:
+                return None
+            try:
+                user = self._serializer.decode(data)
+            except CacheDecodeError as error:
+                # drop it so that the next load fetches a readable one
+                logger.warning(f"Cached user {username} dropped. {error}")
+                self._client().delete(self._key(username))
+                return None
+        except RedisError:
+            logger.warning("User cache backend is unreachable.")
+            return None
+        with self._lock:
+            self._stats["shared_hits"] += 1
+        self._remember(username, version, data)
+        return data, user, fresh_until, delta
+
+    def get(self, username: str) -> Optional[UserInfo]:
+        """Get a user from the worker, or from Redis.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            Optional[UserInfo]: The user, or None on a miss.
+        """
+        user = self._near_get(username)
+        if user is not None:
+            return user
+        entry = self._shared_get(username)
+        if entry is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        return entry[1]
+
+    def load(self, username: str, fetch: Callable[[str], Optional[UserInfo]]) -> Optional[UserInfo]:
+        """Get a user from the cache, fetching and caching it on a miss.
+
+        Concurrent misses of the same user fetch it once, and users close to or past their
+        expiry are fetched again by a single load while the others are served the cached copy.
+
+        Args:
+            username (str): The username.
+            fetch (Callable[[str], Optional[UserInfo]]): Fetches the user from the database.
+
+        Returns:
+            Optional[UserInfo]: The user, or None if there is no such user.
+        """
+        user = self._near_get(username)
+        if user is not None:
+            return user
+
+        def read() -> Optional[bytes]:
+            entry = self._shared_get(username)
+            return entry[0] if entry is not None else None
+
+        def compute() -> bytes:
+            start = time.monotonic()
+            user = fetch(username)
+            with self._lock:
+                self._stats["misses"] += 1
+            if user is None:
+                return b""
+            logger.debug("Updating user cache from user loader.")
+            self.put(user, delta=time.monotonic() - start)
+            return self._serializer.dumps(user)
+
+        key = self._key(username)
+        entry = self._shared_get(username)
+        if entry is None:
+            data = self._guard.fill(key, read, compute)
+        else:
+            data, user, fresh_until, delta = entry
+            with self._guard.revalidate(key, fresh_until, delta) as refresh:
+                if not refresh:
+                    return user
+                data = compute()
+        return self._serializer.loads(data) if data else None
+
+    def put(self, user: UserInfo, delta: Optional[float] = None) -> None:
+        """Cache a user, unless the cache already holds a newer version.
+
+        Args:
+            user (UserInfo): The user.
+            delta (Optional[float]): How long the user took to fetch in seconds, if known.
+        """
+        try:
+            self._write(user.username, user.version, user, delta)
+        except RedisError:
+            logger.warning("User cache backend is unreachable.")
+
+    def store(self, user_info: dict) -> None:
+        """Cache a user information document, e.g. as returned by an update.
+
+        Args:
+            user_info (dict): The whole user information document.
+        """
+        self.put(UserInfo(**{key: value for key, value in user_info.items() if key != "_id"}))
+
+    def update_fields(self, username: str, version: int, fields: dict) -> None:
+        """Apply the fields changed by an update to the cached user.
+
+        The fields are applied to the previous version only. Otherwise the cached entry is
+        outdated or missing, and is replaced by a tombstone at the new version.
+
+        Args:
+            username (str): The username.
+            version (int): The version of the user information after the update.
+            fields (dict): The changed top-level fields and their new values.
+        """
+        try:
+            cached_version, data, _, _ = self._read(username)
+            if cached_version >= version:
+                return
+            user = None
+            if cached_version == version - 1 and data:
+                try:
+                    user = replace(self._serializer.decode(data), **fields, version=version)
+                except CacheDecodeError as error:
+                    logger.warning(f"Cached user {username} dropped. {error}")
+            self._write(username, version, user)
+        except RedisError:
+            logger.warning("User cache backend is unreachable.")
+
+    def discard(self, username: str) -> None:
+        """Remove a user from the cache of every worker.
+
+        Args:
+            username (str): The username.
+        """
+        self._evict(username, None)
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.delete(self._key(username))
+            self._publish(client, username, None)
+        except RedisError:
+            logger.warning("User cache backend is unreachable.")
+
+    def stats(self) -> dict[str, float]:
+        """Get the hit counters and hit ratios of each tier in this worker.
+
+        Returns:
+            dict[str, float]: The counters, the hit ratio of the in-process tier over all
+                lookups, the hit ratio of Redis over the lookups reaching it, and the current
+                size of the in-process tier.
+        """
+        with self._lock:
+            stats = {**self._stats, "near_size": len(self._near), "subscribed": self._subscribed}
+        lookups = stats["near_hits"] + stats["shared_hits"] + stats["misses"]
+        shared_lookups = stats["shared_hits"] + stats["misses"]
+        stats["near_hit_ratio"] = stats["near_hits"] / lookups if lookups else 0.0
+        stats["shared_hit_ratio"] = stats["shared_hits"] / shared_lookups if shared_lookups else 0.0
+        return stats
+
+
+class RenderCache:
+    """Two-level cache of rendered markdown, keyed by a hash of the source text.
+
+    An in-process LRU sits in front of the shared Flask-Caching backend, so that
+    identical content is rendered once across all workers instead of on every
+    request. The shared backend is skipped outside an application context and
+    while it is unreachable. Concurrent misses of the same content render it
+    once, through a StampedeGuard.
+    """
+
+    def __init__(
+        self, cache: Cache, guard: StampedeGuard, version: int, max_entries: int, timeout: int
+    ) -> None:
+        """Initialize the render cache.
+
+        Args:
+            cache (Cache): The shared cache backend.
+            guard (StampedeGuard): Coordinates the lookups missing the same content.
+            version (int): The renderer version, part of every key.
+            max_entries (int): The maximum number of entries in the in-process LRU.
+            timeout (int): The timeout of shared entries in seconds.
+        """
+        self._cache = cache
+        self._guard = guard
+        self._version = version
+        self._max_entries = max_entries
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0}
+
+    def _key(self, profile: str, text: str) -> str:
+        """Build the cache key of a piece of content.
+
+        Args:
+            profile (str): The rendering profile.
+            text (str): The original markdown content.
+
+        Returns:
+            str: The cache key.
+        """
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"render:{profile}:v{self._version}:{digest}"
+
+    def _remember(self, key: str, html: str) -> None:
+        """Store rendered HTML in the in-process LRU, evicting the oldest entries.
+
+        Args:
+            key (str): The cache key.
+            html (str): The rendered HTML.
+        """
+        with self._lock:
+            self._local[key] = html
+            self._local.move_to_end(key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def fetch(self, profile: str, text: str, render: Callable[[str], str]) -> str:
+        """Get the rendered HTML of some content, rendering it on a miss.
+
+        Args:
+            profile (str): The rendering profile.
+            text (str): The original markdown content.
+            render (Callable[[str], str]): The function rendering the content.
+
+        Returns:
+            str: The rendered HTML.
+        """
+        key = self._key(profile, text)
+        with self._lock:
+            html = self._local.get(key)
+            if html is not None:
+                self._local.move_to_end(key)
+                self._stats["local_hits"] += 1
+                return html
+
+        def read() -> Optional[str]:
+            if not has_app_context():
+                return None
+            try:
+                html = self._cache.get(key)
+            except RedisError:
+                logger.warning("Render cache backend is unreachable.")
+                return None
+            if html is not None:
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+            return html
+
+        def compute() -> str:
+            html = render(text)
+            with self._lock:
+                self._stats["misses"] += 1
+            if has_app_context():
+                try:
+                    self._cache.set(key, html, timeout=self._timeout)
+                except RedisError:
+                    logger.warning("Render cache backend is unreachable.")
+            return html
+
+        html = read()
+        if html is None:
+            html = self._guard.fill(key, read, compute)
+        self._remember(key, html)
+        return html
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit, miss and eviction counters.
+
+        Returns:
+            dict[str, int]: The counters and the current size of the in-process LRU.
+        """
+        with self._lock:
+            return {**self._stats, "size": len(self._local)}
+
+
+class PageCache:
+    """Full-page cache of rendered frontstage responses.
+
+    Entries are keyed by endpoint, view arguments and query arguments, and carry
+    surrogate tags such as ``user:<username>`` or ``post:<post_uid>``. Every tag
+    has a token in the shared cache; an entry is only served while the tokens it
+    was stored with are current, so purging a tag is a single write no matter
+    how many pages carry it.
+
+    Authenticated users, non-GET requests and requests with pending flash
+    messages always bypass the cache. The CSRF token of forms embedded in a page
+    is replaced per request.
+
+    A missing page is rendered by the one request holding its lock in the
+    StampedeGuard, while the others wait for it. Expired pages are served for
+    the grace period of the guard while they are rendered again, but purged
+    pages never are.
     """
-    logger.debug("Updating user cache from cache updater.")
-    user = user_utils.get_user_info(username)
-    cache.set(username, user)
+
+    CSRF_PLACEHOLDER = "\x02page-cache-csrf\x03"
+
+    def __init__(self, cache: Cache, guard: StampedeGuard, enabled: bool, timeout: int) -> None:
+        """Initialize the page cache.
+
+        Args:
+            cache (Cache): The shared cache backend.
+            guard (StampedeGuard): Coordinates the requests missing the same page.
+            enabled (bool): Whether pages are cached at all.
+            timeout (int): How long cached pages are fresh in seconds.
+        """
+        self._cache = cache
+        self._guard = guard
+        self._enabled = enabled
+        self._timeout = timeout
+
+    def _bypass(self) -> bool:
+        """Check if the current request must be served without the cache.
+
+        Returns:
+            bool: True if the request must bypass the cache.
+        """
+        return (
+            not self._enabled
+            or request.method != "GET"
+            or current_user.is_authenticated
+            or "_flashes" in session
+        )
+
+    @staticmethod
+    def _key() -> str:
+        """Build the cache key of the current request.
+
+        Returns:
+            str: The cache key.
+        """
+        view_args = sorted((request.view_args or {}).items())
+        query_args = sorted(request.args.items(multi=True))
+        material = repr((request.endpoint, view_args, query_args))
+        return f"page:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        """Build the cache key holding the token of a tag.
+
+        Args:
+            tag (str): The surrogate tag.
+
+        Returns:
+            str: The cache key.
+        """
+        return f"page-tag:{tag}"
+
+    def _current_tokens(self, tags: list[str]) -> dict[str, str]:
+        """Get the current token of each tag, creating missing ones.
+
+        Args:
+            tags (list[str]): The surrogate tags.
+
+        Returns:
+            dict[str, str]: The token of each tag key.
+        """
+        keys = [self._tag_key(tag) for tag in tags]
+        tokens = dict(zip(keys, self._cache.get_many(*keys)))
+        for key, token in tokens.items():
+            if token is None:
+                token = uuid.uuid4().hex
+                if not self._cache.add(key, token, timeout=0):
+                    token = self._cache.get(key)
+                tokens[key] = token
+        return tokens
+
+    def tag_token(self, tag: str) -> str | None:
+        """Get the current token of a tag, for caches that are purged along with the pages.
+
+        Args:
+            tag (str): The surrogate tag.
+
+        Returns:
+            str | None: The token, or None if the shared cache is not available.
+        """
+        if not has_app_context():
+            return None
+        try:
+            return self._current_tokens([tag])[self._tag_key(tag)]
+        except RedisError:
+            logger.warning("Page cache backend is unreachable.")
+            return None
+
+    def cached(
+        self,
+        tags: Callable[..., list[str]],
+        on_hit: Callable[..., None] | None = None,
+    ) -> Callable:
+        """Cache the responses of a view.
+
+        Args:
+            tags (Callable[..., list[str]]): Builds the surrogate tags of a page from the view
+                arguments.
+            on_hit (Callable[..., None] | None): Called with the view arguments when a page is
+                served from the cache, for side effects such as visit counting.
+
+        Returns:
+            Callable: The decorator.
+        """
+
+        def decorator(view: Callable) -> Callable:
+            def serve(entry: dict, *args, **kwargs) -> Response:
+                if on_hit is not None:
+                    on_hit(*args, **kwargs)
+                body = entry["body"]
+                if self.CSRF_PLACEHOLDER in body:
+                    body = body.replace(self.CSRF_PLACEHOLDER, generate_csrf())
+                return Response(body, mimetype=entry["mimetype"])
+
+            def render(key: str, tokens: dict[str, str], *args, **kwargs) -> Response:
+                start = time.monotonic()
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.mimetype != "text/html":
+                    return response
+
+                body = response.get_data(as_text=True)
+                csrf_token = g.get(current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"))
+                if csrf_token:
+                    body = body.replace(csrf_token, self.CSRF_PLACEHOLDER)
+                entry = {
+                    "body": body,
+                    "mimetype": response.mimetype,
+                    "tokens": tokens,
+                    "fresh_until": self._guard.fresh_until(self._timeout),
+                    "delta": time.monotonic() - start,
+                }
+                try:
+                    self._cache.set(key, entry, timeout=self._timeout + self._guard.grace)
+                except RedisError:
+                    logger.warning("Page cache backend is unreachable.")
+                return response
+
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs) -> Response:
+                if self._bypass():
+                    return view(*args, **kwargs)
+
+                key = self._key()
+                try:
+                    entry = self._cache.get(key)
+                    tokens = self._current_tokens(tags(*args, **kwargs))
+                except RedisError:
+                    logger.warning("Page cache backend is unreachable.")
+                    return view(*args, **kwargs)
+
+                if entry is not None and entry["tokens"] == tokens:
+                    fresh_until, delta = entry.get("fresh_until", 0.0), entry.get("delta", 0.0)
+                    with self._guard.revalidate(key, fresh_until, delta) as refresh:
+                        if refresh:
+                            return render(key, tokens, *args, **kwargs)
+                    return serve(entry, *args, **kwargs)
+
+                with self._guard.lock(key) as acquired:
+                    if acquired:
+                        return render(key, tokens, *args, **kwargs)
+
+                def read() -> Optional[dict]:
+                    try:
+                        entry = self._cache.get(key)
+                    except RedisError:
+                        return None
+                    return entry if entry is not None and entry["tokens"] == tokens else None
+
+                entry = self._guard.wait(key, read)
+                if entry is not None:
+                    return serve(entry, *args, **kwargs)
+                return render(key, tokens, *args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def purge(self, *tags: str) -> None:
+        """Invalidate every cached page carrying any of the given tags.
+
+        Args:
+            *tags (str): The surrogate tags, e.g. ``user:<username>``.
+        """
+        try:
+            self._cache.set_many({self._tag_key(tag): uuid.uuid4().hex for tag in tags}, timeout=0)
+        except RedisError:
+            logger.warning("Page cache backend is unreachable, pages expire on their own.")
+
+
+class ConditionalGet:
+    """Conditional GET support for pages derived from a few versioned documents.
+
+    A view declares validators: a cheap lookup returning the versions its page
+    is derived from, and optionally a time moving whenever any of them does.
+    The versions, the endpoint and a fingerprint of the templates are hashed
+    into a strong ETag. A request whose If-None-Match, or failing that
+    If-Modified-Since, still matches is answered with a 304 before the view
+    runs.
+
+    Last-Modified is only sent when the validators give such a time, raised to
+    the last modification of the application files, since a deploy changes the
+    templates or the renderer without moving any document. It is never sent
+    for pages embedding forms, whose CSRF tokens expire independently of any
+    time. Other pages are matched on their ETag only.
+
+    Validated pages are sent with ``Cache-Control: private, no-cache``, so that
+    browsers revalidate on every visit. Authenticated users, requests with
+    pending flash messages and requests other than GET and HEAD are never
+    validated, like the page cache.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the conditional GET support."""
+        self._fingerprint = None
+        self._files_modified = None
+
+    def _template_fingerprint(self) -> str:
+        """Hash the templates of the application, so that a deploy changes every ETag.
+
+        The last modification of the templates and modules of the application is recorded
+        along the way.
+
+        Returns:
+            str: The hex digest of the template files.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            root = pathlib.Path(current_app.root_path)
+            folder = root / current_app.template_folder
+            for path in sorted(folder.rglob("*")):
+                if path.is_file():
+                    digest.update(str(path.relative_to(folder)).encode("utf-8"))
+                    digest.update(path.read_bytes())
+            paths = [*folder.rglob("*"), *root.rglob("*.py")]
+            modified = max((path.stat().st_mtime for path in paths if path.is_file()), default=0)
+            self._files_modified = datetime.fromtimestamp(modified, timezone.utc)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @staticmethod
+    def _bypass() -> bool:
+        """Check if the current request must not be validated.
+
+        Returns:
+            bool: True if the request must bypass validation.
+        """
+        return (
+            request.method not in ("GET", "HEAD")
+            or current_user.is_authenticated
+            or "_flashes" in session
+        )
+
+    @staticmethod
+    def _csrf_window() -> Optional[int]:
+        """Get the period in which the CSRF tokens of forms embedded in a page are issued.
+
+        A page revalidated within the period it was rendered in still holds a valid token.
+
+        Returns:
+            Optional[int]: The index of the period, or None if tokens never expire.
+        """
+        time_limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+        if not time_limit:
+            return None
+        return int(time.time() // time_limit)
+
+    def _matches(self, etag: str, last_modified: Optional[datetime]) -> bool:
+        """Check if the validators sent by the client match the current ones.
+
+        Args:
+            etag (str): The current ETag.
+            last_modified (Optional[datetime]): The current modification time.
+
+        Returns:
+            bool: True if the client holds the current page.
+        """
+        if request.if_none_match:
+            return request.if_none_match.contains(etag)
+        if last_modified is not None and request.if_modified_since is not None:
+            return last_modified <= request.if_modified_since
+        return False
+
+    def validated(
+        self,
+        validators: Callable[..., Optional[tuple[list, Optional[datetime]]]],
+        on_match: Callable[..., None] | None = None,
+        forms: bool = False,
+    ) -> Callable:
+        """Answer the requests of a view with a 304 while its page is unchanged.
+
+        Args:
+            validators (Callable[..., Optional[tuple[list, Optional[datetime]]]]): Looks up the
+                versions the page is derived from, from the view arguments, and a time moving
+                whenever any of the versions does, or None if there is no such time. Returns
+                None if the view would not render the page, e.g. for a redirect or a 404.
+            on_match (Callable[..., None] | None): Called with the view arguments when a 304 is
+                sent, for side effects such as visit counting.
+            forms (bool): Whether the page embeds forms with a CSRF token. Defaults to False.
+
+        Returns:
+            Callable: The decorator.
+        """
+
+        def decorator(view: Callable) -> Callable:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs) -> Response:
+                if self._bypass():
+                    return view(*args, **kwargs)
+                current = validators(*args, **kwargs)
+                if current is None:
+                    return view(*args, **kwargs)
+
+                versions, last_modified = current
+                material = [self._template_fingerprint(), request.endpoint, versions]
+                if forms:
+                    # an unchanged time says nothing of the CSRF tokens
+                    last_modified = None
+                if last_modified is not None:
+                    if last_modified.tzinfo is None:
+                        last_modified = last_modified.replace(tzinfo=timezone.utc)
+                    # HTTP dates have a resolution of one second
+                    last_modified = max(last_modified, self._files_modified)
+                    last_modified = last_modified.replace(microsecond=0)
+                if forms:
+                    material.append(self._csrf_window())
+                etag = hashlib.sha256(repr(material).encode("utf-8")).hexdigest()
+
+                if self._matches(etag, last_modified):
+                    if on_match is not None:
+                        on_match(*args, **kwargs)
+                    response = Response(status=304)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+cache_serializer = CacheSerializer(threshold=CACHE_COMPRESS_THRESHOLD, level=CACHE_COMPRESS_LEVEL)
+stampede_guard = StampedeGuard(
+    cache=cache,
+    beta=CACHE_REFRESH_BETA,
+    grace=CACHE_STALE_GRACE,
+    lock_timeout=CACHE_LOCK_TIMEOUT,
+    poll_interval=CACHE_LOCK_POLL_INTERVAL,
+)
+page_cache = PageCache(
+    cache=cache, guard=stampede_guard, enabled=PAGE_CACHE_ENABLED, timeout=PAGE_CACHE_TIMEOUT
+)
+user_cache = UserCache(
+    cache=cache,
+    serializer=cache_serializer,
+    guard=stampede_guard,
+    timeout=CACHE_TIMEOUT,
+    near_entries=USER_NEAR_CACHE_SIZE,
+    near_timeout=USER_NEAR_CACHE_TIMEOUT,
+)
+conditional_get = ConditionalGet()
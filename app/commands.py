@@ -0,0 +1,58 @@
+import click
+from flask import Flask
+
+from app.helpers.comments import comment_utils
+from app.helpers.tags import tag_index
+from app.helpers.users import user_utils
+from app.mongo import mongodb
+
+
+def register_commands(app: Flask) -> None:
+    """Register the maintenance commands on the Flask CLI.
+
+    Args:
+        app (Flask): The Flask application.
+    """
+
+    @app.cli.command("repair-counters")
+    @click.option("--username", default=None, help="Only repair the counters of this user.")
+    def repair_counters(username: str | None) -> None:
+        """Recompute the denormalized content counters of users."""
+        repaired = user_utils.repair_counts(username)
+        click.echo(f"Repaired content counters of {repaired} user(s).")
+
+    @app.cli.command("backfill-comment-counts")
+    def backfill_comment_counts() -> None:
+        """Store the number of comments on the posts without one."""
+        updated = comment_utils.backfill_comment_counts()
+        click.echo(f"Stored comment counts of {updated} post(s).")
+
+    @app.cli.command("rebuild-tag-index")
+    @click.option("--username", default=None, help="Only rebuild the tag index of this user.")
+    def rebuild_tag_index(username: str | None) -> None:
+        """Recompute the tag index from the posts and projects."""
+        kept = tag_index.rebuild(username)
+        click.echo(f"Tag index holds {kept} tag(s).")
+
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes() -> None:
+        """Create the indexes of every collection."""
+        failures = mongodb.ensure_indexes()
+        if failures:
+            raise click.ClickException(f"Indexes of {failures} collection(s) could not be built.")
+        click.echo("Indexes are up to date.")
+
+    @app.cli.command("audit-indexes")
+    def audit_indexes() -> None:
+        """Explain the query shapes of the app and flag collection scans."""
+        flagged = 0
+        for report in mongodb.audit_indexes():
+            flagged += report["flagged"]
+            mark = "!" if report["flagged"] else " "
+            sort = f" sort={report['sort']}" if report["sort"] else ""
+            click.echo(
+                f"{mark} {report['collection']:<16} {' > '.join(report['stages']):<32} "
+                f"{report['filter']}{sort}"
+            )
+        if flagged:
+            raise click.ClickException(f"{flagged} query shape(s) scan the whole collection.")
@@ -15,7 +15,35 @@ RECAPTCHA_SECRET: str = os.getenv("RECAPTCHA_SECRET")  # reCAPTCHA secret key
 REDISHOST: str = os.getenv("REDISHOST")
 REDISPORT: str = os.getenv("REDISPORT")
 REDIS_URL: str = os.getenv("REDIS_URL")
+PAGE_CACHE_ENABLED: bool = os.getenv("PAGE_CACHE_ENABLED") == "true"  # Frontstage page cache
+CACHE_STATS_ENABLED: bool = os.getenv("CACHE_STATS_ENABLED") == "true"  # Cache counters route
 
 # Application settings
 TEMPLATE_FOLDER: pathlib.Path = (pathlib.Path(__file__).parent / "template").resolve()
 CACHE_TIMEOUT: int = 5 * 60  # Cache timeout in seconds (5 minutes)
+MARKDOWN_POOL_SIZE: int = 4  # Idle Markdown engines kept per rendering profile in each worker
+RENDER_CACHE_SIZE: int = 512  # Rendered markdown documents kept in memory by each worker
+RENDER_CACHE_TIMEOUT: int = 7 * 24 * 60 * 60  # Shared render cache timeout in seconds (7 days)
+PAGE_CACHE_TIMEOUT: int = 5 * 60  # Frontstage page cache timeout in seconds (5 minutes)
+COUNTER_FLUSH_INTERVAL: int = 10  # Seconds between flushes of buffered view and read counters
+PAGE_ANCHORS_TIMEOUT: int = 24 * 60 * 60  # Pagination anchors timeout in seconds (1 day)
+EXPORT_BATCH_SIZE: int = 100  # Documents fetched at a time when exporting an account
+IMPORT_BATCH_SIZE: int = 500  # Records written at a time when importing an export file
+# Processes rendering post content during an import, none under the development server, since
+# each would run run.py again
+IMPORT_WORKERS: int = 1 if ENV == "dev" else os.cpu_count() or 1
+UID_INSERT_ATTEMPTS: int = 5  # UIDs tried before an insert with a duplicate UID fails
+TAG_RECENT_UIDS: int = 10  # Newest UIDs kept per tag in the tag index, serving first tag pages
+USER_NEAR_CACHE_SIZE: int = 1024  # Users kept in memory by each worker in front of Redis
+USER_NEAR_CACHE_TIMEOUT: int = 30  # Timeout of users kept in memory by each worker in seconds
+CACHE_REFRESH_BETA: float = 1.0  # How early cached lookups are recomputed before they expire
+CACHE_STALE_GRACE: int = 60  # Seconds an expired cache entry is served while it is recomputed
+CACHE_LOCK_TIMEOUT: float = 5.0  # Seconds a worker may recompute a cache entry others wait for
+CACHE_LOCK_POLL_INTERVAL: float = 0.05  # Seconds between polls of a cache entry being recomputed
+SITEMAP_SHARD_SIZE: int = 10_000  # URLs per sitemap shard, at most 50,000
+SITEMAP_TIMEOUT: int = 7 * 24 * 60 * 60  # Cached sitemap shards timeout in seconds (7 days)
+SITEMAP_INDEX_TIMEOUT: int = 60 * 60  # Cached sitemap index timeout in seconds (1 hour)
+KEY_FILTER_ERROR_RATE: float = 0.01  # False positive rate of the username, email and UID filters
+KEY_FILTER_REBUILD_INTERVAL: int = 24 * 60 * 60  # Key filters rebuild interval in seconds (1 day)
+CACHE_COMPRESS_THRESHOLD: int = 1024  # Cached values larger than this in bytes are compressed
+CACHE_COMPRESS_LEVEL: int = 3  # zstd level of compressed cached values
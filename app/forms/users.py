@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import (
     BooleanField,
     HiddenField,
@@ -190,3 +191,16 @@ class UserDeletionForm(FlaskForm):
 
     password = PasswordField(validators=[InputRequired()])
     submit_delete = SubmitField(label="Delete")
+
+
+class ImportDataForm(FlaskForm):
+    """
+    Form for importing the data of an exported account.
+
+    Fields:
+        file (FileField): The JSON or NDJSON export file.
+        submit_import (SubmitField): Import button.
+    """
+
+    file = FileField(validators=[FileRequired(), FileAllowed(["json", "ndjson"])])
+    submit_import = SubmitField(label="Import")
@@ -4,7 +4,8 @@ from datetime import datetime, timezone
 from flask_login import current_user
 
 from app.forms.changelog import EditChangelogForm, NewChangelogForm
-from app.helpers.utils import UIDGenerator, process_tags
+from app.helpers.users import user_utils
+from app.helpers.utils import UIDGenerator, keyset_pagination, process_tags
 from app.models.changelog import Changelog
 from app.mongo import Database, mongodb
 
@@ -22,7 +23,8 @@ class NewChangelogSetup:
     """
 
     def __init__(self, changelog_uid_generator: UIDGenerator, db_handler: Database) -> None:
-        self._changelog_uid = changelog_uid_generator.generate_changelog_uid()
+        self._uid_generator = changelog_uid_generator
+        self._changelog_uid = changelog_uid_generator.generate()
         self._db_handler = db_handler
 
     def _create_changelog(self, form: NewChangelogForm, author_name: str) -> dict:
@@ -59,7 +61,10 @@ class NewChangelogSetup:
             str: The unique ID of the newly created changelog.
         """
         new_changelog_entry = self._create_changelog(form, author_name)
-        self._db_handler.changelog.insert_one(new_changelog_entry)
+        self._changelog_uid = self._db_handler.changelog.insert_with_uid(
+            new_changelog_entry, "changelog_uid", self._uid_generator.generate
+        )
+        user_utils.update_counts(author_name, "changelog", active=1)
         return self._changelog_uid
 
 
@@ -72,7 +77,7 @@ def create_changelog(form: NewChangelogForm) -> str:
     Returns:
         str: The unique ID of the newly created changelog.
     """
-    uid_generator = UIDGenerator(db_handler=mongodb)
+    uid_generator = UIDGenerator()
     new_changelog_setup = NewChangelogSetup(uid_generator, mongodb)
     new_changelog_uid = new_changelog_setup.create_changelog(
         form=form, author_name=current_user.username
@@ -192,22 +197,7 @@ class ChangelogUtils:
         Returns:
             list[dict]: A list of dictionaries representing the user's paginated changelog entries.
         """
-        if page_number == 1:
-            result = (
-                self._db_handler.changelog.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .limit(changelogs_per_page)
-                .as_list()
-            )
-        elif page_number > 1:
-            result = (
-                self._db_handler.changelog.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .skip((page_number - 1) * changelogs_per_page)
-                .limit(changelogs_per_page)
-                .as_list()
-            )
-        return result
+        return keyset_pagination.find_page("changelog", username, page_number, changelogs_per_page)
 
 
 changelog_utils = ChangelogUtils(mongodb)
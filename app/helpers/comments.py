@@ -41,7 +41,8 @@ class NewCommentSetup:
             db_handler (Database): The database handler.
         """
         self._db_handler = db_handler
-        self._comment_uid = comment_uid_generator.generate_comment_uid()
+        self._uid_generator = comment_uid_generator
+        self._comment_uid = comment_uid_generator.generate()
 
     @staticmethod
     def _recaptcha_verified(request: Request) -> bool:
@@ -89,7 +90,14 @@ class NewCommentSetup:
             )
 
         new_comment_data = asdict(new_comment)
-        self._db_handler.comment.insert_one(new_comment_data)
+        self._comment_uid = self._db_handler.comment.insert_with_uid(
+            new_comment_data, "comment_uid", self._uid_generator.generate
+        )
+        # posts written before comment_count was introduced are counted on read until backfilled
+        self._db_handler.post_info.make_increments(
+            filter={"post_uid": post_uid, "comment_count": {"$exists": True}},
+            increments={"comment_count": 1},
+        )
 
 
 def create_comment(post_uid: str, form: CommentForm) -> None:
@@ -100,7 +108,7 @@ def create_comment(post_uid: str, form: CommentForm) -> None:
         post_uid (str): The UID of the post the comment is associated with.
         form (CommentForm): The form containing comment data.
     """
-    uid_generator = UIDGenerator(db_handler=mongodb)
+    uid_generator = UIDGenerator()
     comment_setup = NewCommentSetup(comment_uid_generator=uid_generator, db_handler=mongodb)
     comment_setup.create_comment(post_uid=post_uid, form=form)
 
@@ -122,6 +130,12 @@ class CommentUtils:
     Methods:
         find_comments_by_post_uid(post_uid: str) -> list[dict]:
             Retrieves comments associated with a specific post UID.
+        count_comments(post_uids: list[str]) -> dict[str, int]:
+            Counts the comments under each of the given posts in a single aggregation.
+        fill_comment_counts(posts: list[dict]) -> None:
+            Sets the number of comments on each post of a listing.
+        backfill_comment_counts() -> int:
+            Stores the number of comments on every post.
     """
 
     def __init__(self, db_handler: Database) -> None:
@@ -148,5 +162,65 @@ class CommentUtils:
         )
         return result
 
+    def count_comments(self, post_uids: list[str]) -> dict[str, int]:
+        """
+        Counts the comments under each of the given posts in a single aggregation.
+
+        Args:
+            post_uids (list[str]): The UIDs of the posts.
+
+        Returns:
+            dict[str, int]: The number of comments by post UID. Posts without comments are
+                missing.
+        """
+        if not post_uids:
+            return {}
+        pipeline = [
+            {"$match": {"post_uid": {"$in": post_uids}}},
+            {"$group": {"_id": "$post_uid", "count": {"$sum": 1}}},
+        ]
+        return {
+            group["_id"]: group["count"] for group in self._db_handler.comment.aggregate(pipeline)
+        }
+
+    def fill_comment_counts(self, posts: list[dict]) -> None:
+        """
+        Sets the number of comments on each post of a listing, under the "comments" key.
+
+        The stored comment_count is used where present. Posts written before it was introduced
+        are counted together in one aggregation until the backfill has run.
+
+        Args:
+            posts (list[dict]): The post information, including post_uid and comment_count.
+        """
+        missing = [post.get("post_uid") for post in posts if "comment_count" not in post]
+        counted = self.count_comments(missing)
+        for post in posts:
+            if "comment_count" in post:
+                post["comments"] = post.get("comment_count")
+            else:
+                post["comments"] = counted.get(post.get("post_uid"), 0)
+
+    def backfill_comment_counts(self) -> int:
+        """
+        Stores the number of comments on the posts without a comment_count.
+
+        Posts are counted and written one at a time, only while the field is still missing, so
+        that the counts kept up to date by new comments are never overwritten. A comment posted
+        between the count and the write of its post is left out.
+
+        Returns:
+            int: The number of posts updated.
+        """
+        missing = {"comment_count": {"$exists": False}}
+        posts = self._db_handler.post_info.find(missing, {"post_uid": 1}).as_list()
+        for post in posts:
+            post_uid = post.get("post_uid")
+            num_comments = self._db_handler.comment.count_documents({"post_uid": post_uid})
+            self._db_handler.post_info.update_values(
+                filter={"post_uid": post_uid, **missing}, update={"comment_count": num_comments}
+            )
+        return len(posts)
+
 
 comment_utils = CommentUtils(db_handler=mongodb)
@@ -0,0 +1,326 @@
+import json
+from collections.abc import Iterable, Iterator
+
+from app.config import EXPORT_BATCH_SIZE
+from app.helpers.users import user_utils
+from app.mongo import Database, ExtendedCollection, mongodb
+
+##################################################################################################
+
+# Data Export
+
+##################################################################################################
+
+
+class DataExporter:
+    """
+    Streams the data of an account as JSON or NDJSON, one batch of documents at a time.
+
+    Args:
+        db_handler (Database): The database handler.
+        batch_size (int): The number of documents fetched from the database at a time.
+
+    Methods:
+        iter_json(username: str) -> Iterator[str]:
+            Yields the data of a user as a single indented JSON document.
+        iter_ndjson(username: str) -> Iterator[str]:
+            Yields the data of a user as newline-delimited JSON, one record per line.
+    """
+
+    def __init__(self, db_handler: Database, batch_size: int) -> None:
+        """
+        Initializes a DataExporter instance.
+
+        Args:
+            db_handler (Database): The database handler.
+            batch_size (int): The number of documents fetched from the database at a time.
+        """
+        self._db_handler = db_handler
+        self._batch_size = batch_size
+
+    def _user_record(self, username: str) -> dict:
+        """
+        Builds the exported information of a user.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            dict: The user information.
+        """
+        user_info = user_utils.get_user_info(username)
+        user_about = user_utils.get_user_about(username)
+        user_data = {}
+        user_data["username"] = user_info.username
+        user_data["email"] = user_info.email
+        user_data["blogname"] = user_info.blogname
+        if "static" in user_info.profile_img_url:
+            user_data["profile_img_url"] = ""
+        else:
+            user_data["profile_img_url"] = user_info.profile_img_url
+        if "static" in user_info.cover_url:
+            user_data["cover_url"] = ""
+        else:
+            user_data["cover_url"] = user_info.cover_url
+        user_data["created_at"] = f"{user_info.created_at}"
+        user_data["short_bio"] = user_info.short_bio
+        user_data["about"] = user_about.about
+        for i, link in enumerate(user_info.social_links):
+            if not link:
+                break
+            user_data[f"social_link_{i}"] = (link[0], link[1])
+        user_data["total_views"] = user_info.total_views
+        return user_data
+
+    @staticmethod
+    def _post_record(post: dict, content: str) -> dict:
+        """
+        Builds the exported information of a post.
+
+        Args:
+            post (dict): The post information.
+            content (str): The markdown content of the post.
+
+        Returns:
+            dict: The post information.
+        """
+        return {
+            "title": post.get("title"),
+            "subtitle": post.get("subtitle"),
+            "author": post.get("author"),
+            "content": content,
+            "tags": post.get("tags"),
+            "cover_url": post.get("cover_url"),
+            "custom_slug": post.get("custom_slug"),
+            "created_at": f"{post.get('created_at')}",
+            "last_updated": f"{post.get('last_updated')}",
+            "archived": post.get("archived"),
+            "featured": post.get("featured"),
+            "views": post.get("views"),
+            "reads": post.get("reads"),
+        }
+
+    @staticmethod
+    def _project_record(project: dict, content: str) -> dict:
+        """
+        Builds the exported information of a project.
+
+        Args:
+            project (dict): The project information.
+            content (str): The markdown content of the project.
+
+        Returns:
+            dict: The project information.
+        """
+        record = {
+            "author": project.get("author"),
+            "title": project.get("title"),
+            "short_description": project.get("short_description"),
+            "content": content,
+            "tags": project.get("tags"),
+            "custom_slug": project.get("custom_slug"),
+        }
+        for i, image in enumerate(project.get("images")):
+            if not image:
+                break
+            record[f"image_{i}"] = (image[0], image[1])
+        record["created_at"] = f"{project.get('created_at')}"
+        record["last_updated"] = f"{project.get('last_updated')}"
+        record["archived"] = project.get("archived")
+        record["views"] = project.get("views")
+        record["reads"] = project.get("reads")
+        return record
+
+    @staticmethod
+    def _changelog_record(changelog: dict) -> dict:
+        """
+        Builds the exported information of a changelog.
+
+        Args:
+            changelog (dict): The changelog.
+
+        Returns:
+            dict: The changelog information.
+        """
+        return {
+            "author": changelog.get("author"),
+            "title": changelog.get("title"),
+            "date": changelog.get("date"),
+            "category": changelog.get("category"),
+            "content": changelog.get("content"),
+            "tags": changelog.get("tags"),
+            "link": changelog.get("link"),
+            "link_description": changelog.get("link_description"),
+            "created_at": f"{changelog.get('created_at')}",
+            "last_updated": f"{changelog.get('last_updated')}",
+            "archived": changelog.get("archived"),
+        }
+
+    def _batches(self, collection: ExtendedCollection, username: str) -> Iterator[list[dict]]:
+        """
+        Reads the documents of an author in batches, newest first.
+
+        Args:
+            collection (ExtendedCollection): The collection to read.
+            username (str): The username of the author.
+
+        Yields:
+            list[dict]: The next batch of documents.
+        """
+        cursor = collection.find({"author": username}).sort("created_at", -1)
+        batch = []
+        for document in cursor.batch_size(self._batch_size):
+            batch.append(document)
+            if len(batch) == self._batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _contents(self, collection: ExtendedCollection, uid_field: str, uids: list[str]) -> dict:
+        """
+        Fetches the content of a batch of documents with a single query.
+
+        Args:
+            collection (ExtendedCollection): The content collection.
+            uid_field (str): The UID field shared by the information and content documents.
+            uids (list[str]): The UIDs of the documents.
+
+        Returns:
+            dict: The markdown content by UID.
+        """
+        documents = collection.find({uid_field: {"$in": uids}}, {uid_field: 1, "content": 1})
+        return {document.get(uid_field): document.get("content") for document in documents}
+
+    def _iter_posts(self, username: str) -> Iterator[tuple[str, dict]]:
+        """
+        Yields the exported posts of a user.
+
+        Args:
+            username (str): The username.
+
+        Yields:
+            tuple[str, dict]: The UID and information of each post.
+        """
+        for batch in self._batches(self._db_handler.post_info, username):
+            uids = [post.get("post_uid") for post in batch]
+            contents = self._contents(self._db_handler.post_content, "post_uid", uids)
+            for post in batch:
+                uid = post.get("post_uid")
+                yield uid, self._post_record(post, contents.get(uid))
+
+    def _iter_projects(self, username: str) -> Iterator[tuple[str, dict]]:
+        """
+        Yields the exported projects of a user.
+
+        Args:
+            username (str): The username.
+
+        Yields:
+            tuple[str, dict]: The UID and information of each project.
+        """
+        for batch in self._batches(self._db_handler.project_info, username):
+            uids = [project.get("project_uid") for project in batch]
+            contents = self._contents(self._db_handler.project_content, "project_uid", uids)
+            for project in batch:
+                uid = project.get("project_uid")
+                yield uid, self._project_record(project, contents.get(uid))
+
+    def _iter_changelogs(self, username: str) -> Iterator[tuple[str, dict]]:
+        """
+        Yields the exported changelogs of a user.
+
+        Args:
+            username (str): The username.
+
+        Yields:
+            tuple[str, dict]: The UID and information of each changelog.
+        """
+        for batch in self._batches(self._db_handler.changelog, username):
+            for changelog in batch:
+                yield changelog.get("changelog_uid"), self._changelog_record(changelog)
+
+    def _sections(self, username: str) -> Iterator[tuple[str, dict | Iterable[tuple[str, dict]]]]:
+        """
+        Yields the sections of an export in order.
+
+        Args:
+            username (str): The username.
+
+        Yields:
+            tuple[str, dict | Iterable[tuple[str, dict]]]: The section name, and either the user
+                information or the records of the section.
+        """
+        user_info = user_utils.get_user_info(username)
+        yield "info", self._user_record(username)
+        yield "posts", self._iter_posts(username)
+        if user_info.gallery_enabled:
+            yield "projects", self._iter_projects(username)
+        if user_info.changelog_enabled:
+            yield "changelogs", self._iter_changelogs(username)
+
+    @staticmethod
+    def _dumps(data: dict, level: int) -> str:
+        """
+        Serializes a value as indented JSON, nested at the given level.
+
+        Args:
+            data (dict): The value to serialize.
+            level (int): The nesting level of the value in the document.
+
+        Returns:
+            str: The JSON text.
+        """
+        text = json.dumps(data, indent=4, ensure_ascii=False, default=str)
+        return text.replace("\n", "\n" + " " * 4 * level)
+
+    def iter_json(self, username: str) -> Iterator[str]:
+        """
+        Yields the data of a user as a single indented JSON document.
+
+        Only one batch of documents is held in memory at a time.
+
+        Args:
+            username (str): The username.
+
+        Yields:
+            str: The next chunk of the document.
+        """
+        yield "{"
+        for section_index, (name, section) in enumerate(self._sections(username)):
+            yield ("," if section_index else "") + f'\n    "{name}": '
+            if isinstance(section, dict):
+                yield self._dumps(section, 1)
+                continue
+            empty = True
+            for uid, record in section:
+                yield ("{" if empty else ",") + f"\n        {json.dumps(uid)}: "
+                yield self._dumps(record, 2)
+                empty = False
+            yield "{}" if empty else "\n    }"
+        yield "\n}"
+
+    def iter_ndjson(self, username: str) -> Iterator[str]:
+        """
+        Yields the data of a user as newline-delimited JSON.
+
+        Each line is an object with the record type, the UID where there is one, and the data.
+
+        Args:
+            username (str): The username.
+
+        Yields:
+            str: The next line.
+        """
+        for name, section in self._sections(username):
+            if isinstance(section, dict):
+                line = {"type": name, "data": section}
+                yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+                continue
+            record_type = name.rstrip("s")
+            for uid, record in section:
+                line = {"type": record_type, "uid": uid, "data": record}
+                yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+
+data_exporter = DataExporter(db_handler=mongodb, batch_size=EXPORT_BATCH_SIZE)
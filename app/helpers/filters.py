@@ -0,0 +1,301 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections.abc import Iterable
+
+from flask import has_app_context
+from flask_caching import Cache
+from redis import Redis
+from redis.exceptions import RedisError
+
+from app.cache import cache
+from app.config import KEY_FILTER_ERROR_RATE, KEY_FILTER_REBUILD_INTERVAL
+from app.logging import logger
+from app.mongo import PROJECTIONS, Database, mongodb
+
+##################################################################################################
+
+# Bloom filter
+
+##################################################################################################
+
+
+class BloomFilter:
+    """
+    A Bloom filter of strings. Lookups of added strings are always positive, lookups of other
+    strings are negative but for a false positive rate set at creation.
+
+    Args:
+        capacity (int): The number of strings the false positive rate is sized for.
+        error_rate (float): The false positive rate at capacity.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """
+        Initializes an empty BloomFilter.
+
+        Args:
+            capacity (int): The number of strings the false positive rate is sized for.
+            error_rate (float): The false positive rate at capacity.
+        """
+        self.capacity = max(capacity, 1)
+        self._num_bits = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._num_hashes = max(round(self._num_bits / self.capacity * math.log(2)), 1)
+        self._bits = bytearray((self._num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        """
+        Get the bit positions of a string, by double hashing.
+
+        Args:
+            key (str): The string.
+
+        Returns:
+            Iterable[int]: The positions.
+        """
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self._num_bits for i in range(self._num_hashes))
+
+    def add(self, key: str) -> None:
+        """
+        Adds a string.
+
+        Args:
+            key (str): The string.
+        """
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        """
+        Checks if a string might have been added.
+
+        Args:
+            key (str): The string.
+
+        Returns:
+            bool: False if the string was definitely not added.
+        """
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+##################################################################################################
+
+# Key filters
+
+##################################################################################################
+
+
+class KeyFilters:
+    """
+    Bloom filters of the keys in use, per key space, answering definite misses of usernames,
+    emails and UIDs without a database query.
+
+    Each worker process builds its filters from MongoDB in a background thread, and keeps them
+    up to date with the keys added by every worker, broadcast over a Redis channel. Filters are
+    only consulted once built and while the channel is subscribed, lookups otherwise count as
+    possible hits. Keys are never removed, so deleted keys are possible hits until the filters
+    are rebuilt, which happens periodically and whenever a filter fills up.
+
+    Args:
+        db_handler (Database): The database handler.
+        cache (Cache): The shared cache backend, a RedisCache.
+        error_rate (float): The false positive rate of each filter.
+        rebuild_interval (int): The time between rebuilds of the filters in seconds.
+
+    Methods:
+        might_exist(space: str, key: str) -> bool:
+            Checks if a key might be in use.
+        add(space: str, keys: Iterable[str]) -> None:
+            Adds keys to a key space in every worker.
+        stats() -> dict:
+            Gets the state and counters of the filters in this worker.
+    """
+
+    # the collection and field of each key space
+    KEY_SPACES = {
+        "username": ("user_info", "username"),
+        "email": ("user_info", "email"),
+        "post_uid": ("post_info", "post_uid"),
+        "project_uid": ("project_info", "project_uid"),
+    }
+
+    CHANNEL = "key-filters:additions"
+
+    def __init__(
+        self, db_handler: Database, cache: Cache, error_rate: float, rebuild_interval: int
+    ) -> None:
+        """
+        Initializes a KeyFilters instance.
+
+        Args:
+            db_handler (Database): The database handler.
+            cache (Cache): The shared cache backend, a RedisCache.
+            error_rate (float): The false positive rate of each filter.
+            rebuild_interval (int): The time between rebuilds of the filters in seconds.
+        """
+        self._db_handler = db_handler
+        self._cache = cache
+        self._error_rate = error_rate
+        self._rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._filters = {}
+        self._listener_pid = None
+        self._stats = {"definite_misses": 0, "possible_hits": 0, "unavailable": 0}
+
+    def _client(self) -> Redis | None:
+        """
+        Gets the Redis client of the shared cache backend, starting the listener if needed.
+
+        Returns:
+            Redis | None: The client, or None outside an application context.
+        """
+        if not has_app_context():
+            return None
+        client = self._cache.cache._write_client
+        with self._lock:
+            if self._listener_pid != os.getpid():
+                # the listener thread does not survive a fork, start one per worker process
+                self._listener_pid = os.getpid()
+                self._filters = {}
+                threading.Thread(
+                    target=self._listen, args=(client,), name="key-filters-listener", daemon=True
+                ).start()
+        return client
+
+    def _build(self, space: str) -> BloomFilter:
+        """
+        Builds the filter of a key space from the database.
+
+        Args:
+            space (str): The key space.
+
+        Returns:
+            BloomFilter: The filter, sized for twice the keys in use.
+        """
+        name, field = self.KEY_SPACES[space]
+        collection = getattr(self._db_handler, name)
+        bloom = BloomFilter(2 * collection.count_documents({}) + 1024, self._error_rate)
+        for document in collection.find({}, PROJECTIONS[field]):
+            if document.get(field) is not None:
+                bloom.add(document.get(field))
+        return bloom
+
+    def _listen(self, client: Redis) -> None:
+        """
+        Builds the filters and applies the keys added by every worker, rebuilding the filters
+        when they are due, and starting over whenever Redis goes away.
+
+        Args:
+            client (Redis): The Redis client.
+        """
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                # subscribe first, so that the keys added while building are applied after it
+                pubsub.subscribe(self.CHANNEL)
+                built_at = {}
+                while True:
+                    for space in self.KEY_SPACES:
+                        bloom = self._filters.get(space)
+                        overdue = time.monotonic() - built_at.get(space, 0) > self._rebuild_interval
+                        if bloom is None or overdue or bloom.count > bloom.capacity:
+                            with self._lock:
+                                self._filters.pop(space, None)
+                            bloom = self._build(space)
+                            built_at[space] = time.monotonic()
+                            with self._lock:
+                                self._filters[space] = bloom
+                            logger.debug(f"Key filter {space} built with {bloom.count} keys.")
+                    message = pubsub.get_message(timeout=1.0)
+                    while message is not None:
+                        space, keys = json.loads(message["data"])
+                        with self._lock:
+                            bloom = self._filters.get(space)
+                            for key in keys if bloom is not None else []:
+                                bloom.add(key)
+                        message = pubsub.get_message()
+            except RedisError:
+                logger.warning("Key filter channel is unreachable, retrying.")
+            except Exception as e:
+                logger.error(f"Key filters failed to build: {e}")
+            with self._lock:
+                self._filters = {}
+            time.sleep(1.0)
+
+    def might_exist(self, space: str, key: str) -> bool:
+        """
+        Checks if a key might be in use.
+
+        Args:
+            space (str): The key space, e.g. "username" or "post_uid".
+            key (str): The key.
+
+        Returns:
+            bool: False if the key is definitely not in use, True if it might be, or if the
+                filter of the key space is not available.
+        """
+        self._client()
+        with self._lock:
+            bloom = self._filters.get(space)
+            if bloom is None:
+                self._stats["unavailable"] += 1
+                return True
+            found = key in bloom
+            self._stats["possible_hits" if found else "definite_misses"] += 1
+        return found
+
+    def add(self, space: str, keys: Iterable[str]) -> None:
+        """
+        Adds keys to a key space in every worker.
+
+        Other workers learn of the keys as soon as the broadcast reaches them, usually well
+        within a millisecond of the documents being written.
+
+        Args:
+            space (str): The key space, e.g. "username" or "post_uid".
+            keys (Iterable[str]): The keys.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        client = self._client()
+        with self._lock:
+            bloom = self._filters.get(space)
+            for key in keys if bloom is not None else []:
+                bloom.add(key)
+        if client is None:
+            return
+        try:
+            client.publish(self.CHANNEL, json.dumps([space, keys]))
+        except RedisError:
+            # the listeners of the other workers lose the channel too, and drop their filters
+            logger.warning("Key filter channel is unreachable.")
+
+    def stats(self) -> dict:
+        """
+        Gets the state and counters of the filters in this worker.
+
+        Returns:
+            dict: The lookup counters and the number of keys in each built filter.
+        """
+        with self._lock:
+            sizes = {space: bloom.count for space, bloom in self._filters.items()}
+            return {**self._stats, "keys": sizes}
+
+
+key_filters = KeyFilters(
+    db_handler=mongodb,
+    cache=cache,
+    error_rate=KEY_FILTER_ERROR_RATE,
+    rebuild_interval=KEY_FILTER_REBUILD_INTERVAL,
+)
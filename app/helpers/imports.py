@@ -0,0 +1,733 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import string
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import IO, Any
+
+from pymongo.errors import PyMongoError
+
+from app.config import IMPORT_BATCH_SIZE, IMPORT_WORKERS
+from app.helpers.filters import key_filters
+from app.helpers.posts import render_post_content
+from app.helpers.tags import tag_index
+from app.helpers.users import user_utils
+from app.logging import logger
+from app.models.changelog import Changelog
+from app.models.posts import PostContent, PostInfo
+from app.models.projects import ProjectContent, ProjectInfo
+from app.mongo import Database, ExtendedCollection, mongodb
+from app.renderer import render_post_standalone
+
+# Record types of the NDJSON export, by section of the JSON export.
+SECTION_TYPES = {"posts": "post", "projects": "project", "changelogs": "changelog"}
+
+##################################################################################################
+
+# Reading export files
+
+##################################################################################################
+
+
+class _JsonScanner:
+    def __init__(self, stream: IO[str], chunk_size: int) -> None:
+        """
+        Initialize a scanner reading JSON values one at a time from a text stream.
+
+        Args:
+            stream (IO[str]): The text stream.
+            chunk_size (int): The number of characters read at a time.
+        """
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+
+    def _fill(self) -> bool:
+        """
+        Read more of the stream into the buffer, at least doubling what is left of it so that
+        long values are not parsed again too many times.
+
+        Returns:
+            bool: False at the end of the stream.
+        """
+        remaining = self._buffer[self._position :]
+        chunk = self._stream.read(max(self._chunk_size, len(remaining)))
+        if not chunk:
+            return False
+        self._buffer = remaining + chunk
+        self._position = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Get the next character that is not whitespace, without consuming it.
+
+        Returns:
+            str: The character.
+
+        Raises:
+            ValueError: At the end of the stream.
+        """
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position].isspace():
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                raise ValueError("Unexpected end of file.")
+
+    def expect(self, tokens: str) -> str:
+        """
+        Consume the next character that is not whitespace, which must be one of the tokens.
+
+        Args:
+            tokens (str): The allowed characters.
+
+        Returns:
+            str: The character.
+
+        Raises:
+            ValueError: If another character is found.
+        """
+        char = self.peek()
+        if char not in tokens:
+            raise ValueError(f"Expected one of {tokens!r} but found {char!r}.")
+        self._position += 1
+        return char
+
+    def value(self) -> Any:
+        """
+        Consume the next JSON value.
+
+        Returns:
+            Any: The decoded value.
+
+        Raises:
+            ValueError: If the value is malformed or truncated.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as error:
+                if self._fill():
+                    continue
+                raise ValueError(f"Malformed or truncated JSON ({error.msg}).") from None
+            self._position = end
+            return value
+
+
+def iter_export_records(
+    stream: IO[bytes], ndjson: bool = False, chunk_size: int = 64 * 1024
+) -> Iterator[tuple[str, str | None, dict]]:
+    """
+    Read the records of an export file without loading it whole.
+
+    Args:
+        stream (IO[bytes]): The uploaded file.
+        ndjson (bool): Whether the file is the NDJSON variant of the export. Defaults to False.
+        chunk_size (int): The number of characters read at a time. Defaults to 64 KiB.
+
+    Yields:
+        tuple[str, str | None, dict]: The record type (info, post, project or changelog), the
+            UID if the record has one, and the data.
+
+    Raises:
+        ValueError: If the file is not a valid export.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8")
+    if ndjson:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f"Line {number} is not valid JSON.") from None
+            if not isinstance(record, dict) or not isinstance(record.get("data"), dict):
+                raise ValueError(f"Line {number} is not an export record.")
+            yield record.get("type"), record.get("uid"), record.get("data")
+        return
+
+    scanner = _JsonScanner(text, chunk_size)
+    scanner.expect("{")
+    if scanner.peek() == "}":
+        return
+    while True:
+        name = scanner.value()
+        scanner.expect(":")
+        if name in SECTION_TYPES:
+            scanner.expect("{")
+            if scanner.peek() != "}":
+                while True:
+                    uid = scanner.value()
+                    scanner.expect(":")
+                    data = scanner.value()
+                    if not isinstance(data, dict):
+                        raise ValueError(f"Record {uid} of {name} is not an object.")
+                    yield SECTION_TYPES[name], uid, data
+                    if scanner.expect(",}") == "}":
+                        break
+            else:
+                scanner.expect("}")
+        else:
+            data = scanner.value()
+            if isinstance(data, dict):
+                yield name, None, data
+        if scanner.expect(",}") == "}":
+            return
+
+
+##################################################################################################
+
+# Validating records
+
+##################################################################################################
+
+
+def _text(data: dict, key: str, required: bool = False) -> str:
+    """
+    Read a text field of a record.
+
+    Args:
+        data (dict): The record.
+        key (str): The field name.
+        required (bool): Whether the field must be present and not empty. Defaults to False.
+
+    Returns:
+        str: The value, an empty string if missing.
+
+    Raises:
+        ValueError: If the field is not text, or missing while required.
+    """
+    value = data.get(key)
+    if value is None:
+        value = ""
+    if not isinstance(value, str):
+        raise ValueError(f"{key} must be text.")
+    if required and not value:
+        raise ValueError(f"{key} is missing.")
+    return value
+
+
+def _timestamp(data: dict, key: str, required: bool = False) -> datetime:
+    """
+    Read a timestamp field of a record, as written by the export.
+
+    Args:
+        data (dict): The record.
+        key (str): The field name.
+        required (bool): Whether the field must be present. Defaults to False.
+
+    Returns:
+        datetime: The timestamp in UTC, the current time if missing.
+
+    Raises:
+        ValueError: If the field is not a timestamp, or missing while required.
+    """
+    value = data.get(key)
+    if value in (None, "", "None"):
+        if required:
+            raise ValueError(f"{key} is missing.")
+        return datetime.now(timezone.utc)
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} is not a valid timestamp.") from None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def _tags(data: dict) -> list[str]:
+    """
+    Read the tags of a record.
+
+    Args:
+        data (dict): The record.
+
+    Returns:
+        list[str]: The tags.
+
+    Raises:
+        ValueError: If the tags are not a list of text.
+    """
+    tags = data.get("tags") or []
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("tags must be a list of text.")
+    return tags
+
+
+def _count(data: dict, key: str) -> int:
+    """
+    Read a counter of a record.
+
+    Args:
+        data (dict): The record.
+        key (str): The field name.
+
+    Returns:
+        int: The counter, 0 if missing.
+
+    Raises:
+        ValueError: If the counter is not a non-negative integer.
+    """
+    value = data.get(key) or 0
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"{key} must be a non-negative integer.")
+    return value
+
+
+def validate_post(uid: str, data: dict, username: str) -> tuple[dict, str]:
+    """
+    Validate an exported post and build its information document.
+
+    Args:
+        uid (str): The exported post UID.
+        data (dict): The exported post.
+        username (str): The user importing the post, who becomes its author.
+
+    Returns:
+        tuple[dict, str]: The post information and the markdown content.
+
+    Raises:
+        ValueError: If the record is not valid.
+    """
+    post_info = PostInfo(
+        post_uid=uid,
+        title=_text(data, "title", required=True),
+        subtitle=_text(data, "subtitle"),
+        author=username,
+        tags=_tags(data),
+        cover_url=_text(data, "cover_url"),
+        custom_slug=_text(data, "custom_slug"),
+        created_at=_timestamp(data, "created_at"),
+        last_updated=_timestamp(data, "last_updated"),
+        archived=bool(data.get("archived")),
+        featured=bool(data.get("featured")),
+        views=_count(data, "views"),
+        reads=_count(data, "reads"),
+    )
+    return asdict(post_info), _text(data, "content", required=True)
+
+
+def validate_project(uid: str, data: dict, username: str) -> tuple[dict, str]:
+    """
+    Validate an exported project and build its information document.
+
+    Args:
+        uid (str): The exported project UID.
+        data (dict): The exported project.
+        username (str): The user importing the project, who becomes its author.
+
+    Returns:
+        tuple[dict, str]: The project information and the markdown content.
+
+    Raises:
+        ValueError: If the record is not valid.
+    """
+    images = []
+    for i in range(5):
+        image = data.get(f"image_{i}")
+        if image:
+            if not isinstance(image, list) or len(image) != 2:
+                raise ValueError(f"image_{i} must be a pair of url and caption.")
+            images.append((image[0], image[1]))
+    while len(images) < 5:
+        images.append(tuple())
+
+    project_info = ProjectInfo(
+        project_uid=uid,
+        author=username,
+        title=_text(data, "title", required=True),
+        short_description=_text(data, "short_description"),
+        tags=_tags(data),
+        custom_slug=_text(data, "custom_slug"),
+        images=images,
+        created_at=_timestamp(data, "created_at"),
+        last_updated=_timestamp(data, "last_updated"),
+        archived=bool(data.get("archived")),
+        views=_count(data, "views"),
+        reads=_count(data, "reads"),
+    )
+    return asdict(project_info), _text(data, "content", required=True)
+
+
+def validate_changelog(uid: str, data: dict, username: str) -> dict:
+    """
+    Validate an exported changelog and build its document.
+
+    Args:
+        uid (str): The exported changelog UID.
+        data (dict): The exported changelog.
+        username (str): The user importing the changelog, who becomes its author.
+
+    Returns:
+        dict: The changelog.
+
+    Raises:
+        ValueError: If the record is not valid.
+    """
+    changelog = Changelog(
+        changelog_uid=uid,
+        author=username,
+        title=_text(data, "title", required=True),
+        date=_timestamp(data, "date", required=True),
+        category=_text(data, "category"),
+        content=_text(data, "content"),
+        tags=_tags(data),
+        link=_text(data, "link"),
+        link_description=_text(data, "link_description"),
+        created_at=_timestamp(data, "created_at"),
+        last_updated=_timestamp(data, "last_updated"),
+        archived=bool(data.get("archived")),
+    )
+    return asdict(changelog)
+
+
+##################################################################################################
+
+# Importing
+
+##################################################################################################
+
+
+@dataclass
+class ImportReport:
+    """Class to represent the outcome of an import.
+
+    Attributes:
+        imported (dict[str, int]): Number of records written, by record type.
+        skipped (int): Number of records already imported by an earlier run. Defaults to 0.
+        invalid (list[str]): Reasons why records were rejected. Defaults to an empty list.
+        error (str): Why the import stopped early, if it did. Defaults to an empty string.
+    """
+
+    imported: dict[str, int] = field(
+        default_factory=lambda: {"post": 0, "project": 0, "changelog": 0}
+    )
+    skipped: int = 0
+    invalid: list[str] = field(default_factory=list)
+    error: str = ""
+
+
+class DataImporter:
+    """
+    Imports the records of an export file into an account, in batches.
+
+    Every record keeps its exported UID unless another author already uses it. Records already
+    owned by the importing user are skipped, so an import that stopped halfway is resumed by
+    uploading the same file again. Post content is rendered in a process pool, created once per
+    worker process and kept for later imports, and counters are recomputed from the imported
+    documents at the end.
+
+    Args:
+        db_handler (Database): The database handler.
+        batch_size (int): The number of records written at a time.
+        workers (int): The number of processes rendering post content.
+
+    Methods:
+        import_stream(username: str, stream: IO[bytes], ndjson: bool = False) -> ImportReport:
+            Imports an export file into the account of a user.
+    """
+
+    UID_ALPHABET = string.ascii_lowercase + string.digits
+
+    def __init__(self, db_handler: Database, batch_size: int, workers: int) -> None:
+        """
+        Initializes a DataImporter instance.
+
+        Args:
+            db_handler (Database): The database handler.
+            batch_size (int): The number of records written at a time.
+            workers (int): The number of processes rendering post content.
+        """
+        self._db_handler = db_handler
+        self._batch_size = batch_size
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def _render_pool(self) -> ProcessPoolExecutor | None:
+        """
+        Get the pool rendering post content, creating it on first use.
+
+        The pool processes are forked from a server process that only imports the renderer,
+        which imports nothing of the application.
+
+        Returns:
+            ProcessPoolExecutor | None: The pool, or None to render in this process.
+        """
+        if self._workers <= 1:
+            return None
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                # a pool does not survive a fork, create one per worker process
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["app.renderer"])
+                self._pool = ProcessPoolExecutor(max_workers=self._workers, mp_context=context)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _derived_uid(self, username: str, uid: str, attempt: int) -> str:
+        """
+        Derive a replacement UID deterministically, so that a resumed import picks the same one.
+
+        Args:
+            username (str): The importing user.
+            uid (str): The exported UID.
+            attempt (int): The number of replacements tried so far.
+
+        Returns:
+            str: An 8 character UID.
+        """
+        digest = hashlib.sha256(f"{username}:{uid}:{attempt}".encode("utf-8")).digest()
+        return "".join(self.UID_ALPHABET[byte % len(self.UID_ALPHABET)] for byte in digest[:8])
+
+    def _assign_uids(
+        self,
+        collection: ExtendedCollection,
+        uid_field: str,
+        username: str,
+        documents: list[dict],
+        report: ImportReport,
+    ) -> list[int]:
+        """
+        Set the UID each document is imported under, dropping those imported before.
+
+        Args:
+            collection (ExtendedCollection): The information collection.
+            uid_field (str): The UID field.
+            username (str): The importing user.
+            documents (list[dict]): The documents, updated in place.
+            report (ImportReport): The report counting skipped records.
+
+        Returns:
+            list[int]: The indexes of the documents to write.
+        """
+        uids = [document[uid_field] for document in documents]
+        owners = {
+            document.get(uid_field): document.get("author")
+            for document in collection.find({uid_field: {"$in": uids}}, {uid_field: 1, "author": 1})
+        }
+        kept, taken = [], set()
+        for index, document in enumerate(documents):
+            uid = exported_uid = document[uid_field]
+            attempt = 0
+            while True:
+                if uid in owners:
+                    owner = owners[uid]
+                else:
+                    existing = collection.find_one({uid_field: uid}, {"author": 1})
+                    owner = owners[uid] = existing.get("author") if existing else None
+                if owner == username:
+                    report.skipped += 1
+                    break
+                if owner is None and uid not in taken:
+                    document[uid_field] = uid
+                    taken.add(uid)
+                    kept.append(index)
+                    break
+                attempt += 1
+                uid = self._derived_uid(username, exported_uid, attempt)
+        return kept
+
+    def _render(self, contents: list[str]) -> list[dict]:
+        """
+        Render the content of a batch of posts.
+
+        Args:
+            contents (list[str]): The markdown content of each post.
+
+        Returns:
+            list[dict]: The rendered fields of each post.
+        """
+        pool = self._render_pool()
+        if pool is None:
+            return [render_post_content(content) for content in contents]
+        chunksize = max(1, len(contents) // (self._workers * 4))
+        try:
+            return list(pool.map(render_post_standalone, contents, chunksize=chunksize))
+        except BrokenProcessPool:
+            # a rendering process died, start a new pool for the next batch
+            logger.warning("Import rendering pool broke, rendering the batch in-process.")
+            with self._lock:
+                self._pool_pid = None
+            return [render_post_content(content) for content in contents]
+
+    def _write_posts(
+        self,
+        username: str,
+        batch: list[tuple[dict, str]],
+        report: ImportReport,
+    ) -> None:
+        """
+        Write a batch of posts, content first so that no post is visible without it.
+
+        Args:
+            username (str): The importing user.
+            batch (list[tuple[dict, str]]): The post information and markdown content.
+            report (ImportReport): The report to update.
+        """
+        infos = [post_info for post_info, _ in batch]
+        kept = self._assign_uids(self._db_handler.post_info, "post_uid", username, infos, report)
+        infos = [infos[i] for i in kept]
+        contents = [batch[i][1] for i in kept]
+        rendered = self._render(contents)
+        self._db_handler.post_content.bulk_replace(
+            [
+                (
+                    {"post_uid": post_info["post_uid"]},
+                    asdict(
+                        PostContent(
+                            post_uid=post_info["post_uid"],
+                            author=username,
+                            content=content,
+                            **fields,
+                        )
+                    ),
+                )
+                for post_info, content, fields in zip(infos, contents, rendered)
+            ]
+        )
+        key_filters.add("post_uid", [info["post_uid"] for info in infos])
+        self._db_handler.post_info.insert_many(infos)
+        report.imported["post"] += len(infos)
+
+    def _write_projects(
+        self, username: str, batch: list[tuple[dict, str]], report: ImportReport
+    ) -> None:
+        """
+        Write a batch of projects, content first so that no project is visible without it.
+
+        Args:
+            username (str): The importing user.
+            batch (list[tuple[dict, str]]): The project information and markdown content.
+            report (ImportReport): The report to update.
+        """
+        infos = [project_info for project_info, _ in batch]
+        kept = self._assign_uids(
+            self._db_handler.project_info, "project_uid", username, infos, report
+        )
+        infos = [infos[i] for i in kept]
+        self._db_handler.project_content.bulk_replace(
+            [
+                (
+                    {"project_uid": infos[n]["project_uid"]},
+                    asdict(
+                        ProjectContent(
+                            project_uid=infos[n]["project_uid"],
+                            author=username,
+                            content=batch[i][1],
+                        )
+                    ),
+                )
+                for n, i in enumerate(kept)
+            ]
+        )
+        key_filters.add("project_uid", [info["project_uid"] for info in infos])
+        self._db_handler.project_info.insert_many(infos)
+        report.imported["project"] += len(infos)
+
+    def _write_changelogs(self, username: str, batch: list[dict], report: ImportReport) -> None:
+        """
+        Write a batch of changelogs.
+
+        Args:
+            username (str): The importing user.
+            batch (list[dict]): The changelogs.
+            report (ImportReport): The report to update.
+        """
+        kept = self._assign_uids(
+            self._db_handler.changelog, "changelog_uid", username, batch, report
+        )
+        changelogs = [batch[i] for i in kept]
+        self._db_handler.changelog.insert_many(changelogs)
+        report.imported["changelog"] += len(changelogs)
+
+    def import_stream(self, username: str, stream: IO[bytes], ndjson: bool = False) -> ImportReport:
+        """
+        Import an export file into the account of a user.
+
+        Invalid records are reported and skipped. If the file is malformed or a write fails,
+        the records written so far are kept and the import can be resumed with the same file.
+        The counters of the user are recomputed at the end, unless nothing was written. The
+        account information in the file is not imported.
+
+        Args:
+            username (str): The importing user.
+            stream (IO[bytes]): The uploaded file.
+            ndjson (bool): Whether the file is the NDJSON variant of the export. Defaults to False.
+
+        Returns:
+            ImportReport: The outcome of the import.
+        """
+        report = ImportReport()
+        posts, projects, changelogs = [], [], []
+        # whether a batch went to the database, even if only partly written
+        written = False
+        try:
+            for record_type, uid, data in iter_export_records(stream, ndjson):
+                if record_type not in SECTION_TYPES.values():
+                    continue
+                try:
+                    if not isinstance(uid, str) or not uid:
+                        raise ValueError("the UID is missing.")
+                    if record_type == "post":
+                        posts.append(validate_post(uid, data, username))
+                    elif record_type == "project":
+                        projects.append(validate_project(uid, data, username))
+                    else:
+                        changelogs.append(validate_changelog(uid, data, username))
+                except ValueError as error:
+                    report.invalid.append(f"{record_type} {uid}: {error}")
+                    continue
+
+                if len(posts) >= self._batch_size:
+                    written = True
+                    self._write_posts(username, posts, report)
+                    posts = []
+                if len(projects) >= self._batch_size:
+                    written = True
+                    self._write_projects(username, projects, report)
+                    projects = []
+                if len(changelogs) >= self._batch_size:
+                    written = True
+                    self._write_changelogs(username, changelogs, report)
+                    changelogs = []
+
+            written = written or bool(posts or projects or changelogs)
+            if posts:
+                self._write_posts(username, posts, report)
+            if projects:
+                self._write_projects(username, projects, report)
+            if changelogs:
+                self._write_changelogs(username, changelogs, report)
+        except (ValueError, UnicodeDecodeError, PyMongoError) as error:
+            report.error = str(error)
+            logger.error(f"Import for user {username} stopped early: {error}")
+        finally:
+            if written:
+                user_utils.repair_counts(username)
+                user_utils.repair_tags(username)
+                tag_index.rebuild(username)
+            else:
+                logger.debug(f"Import for user {username} wrote nothing, counters left alone.")
+
+        logger.debug(f"Imported {report.imported} for user {username}, skipped {report.skipped}.")
+        return report
+
+
+data_importer = DataImporter(
+    db_handler=mongodb, batch_size=IMPORT_BATCH_SIZE, workers=IMPORT_WORKERS
+)
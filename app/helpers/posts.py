@@ -2,12 +2,43 @@ from dataclasses import asdict
 from datetime import datetime, timezone
 
 from flask_login import current_user
+from pymongo.client_session import ClientSession
 
-from app.cache import cache, update_user_cache
+from app.cache import user_cache
 from app.forms.posts import EditPostForm, NewPostForm
-from app.helpers.utils import UIDGenerator, process_tags
+from app.helpers.filters import key_filters
+from app.helpers.tags import tag_index
+from app.helpers.users import user_utils
+from app.helpers.utils import (
+    UIDGenerator,
+    convert_post_content,
+    keyset_pagination,
+    process_tags,
+    tag_increments,
+)
 from app.models.posts import PostContent, PostInfo
-from app.mongo import Database, mongodb
+from app.mongo import PROJECTIONS, Database, counter_buffer, mongodb
+from app.renderer import RENDERER_VERSION, post_fields
+
+##################################################################################################
+
+# Rendering post content
+
+##################################################################################################
+
+
+def render_post_content(content: str) -> dict:
+    """
+    Render the markdown content of a post into the fields stored alongside it.
+
+    Args:
+        content (str): The original markdown content.
+
+    Returns:
+        dict: A dictionary with the rendered HTML, the read time and the renderer version.
+    """
+    return post_fields(convert_post_content(content))
+
 
 ##################################################################################################
 
@@ -25,7 +56,8 @@ class NewPostSetup:
             post_uid_generator (UIDGenerator): The UID generator for posts.
             db_handler (Database): The database handler.
         """
-        self._post_uid = post_uid_generator.generate_post_uid()
+        self._uid_generator = post_uid_generator
+        self._post_uid = post_uid_generator.generate()
         self._db_handler = db_handler
 
     def _create_post_info(self, form: NewPostForm, author_name: str) -> dict:
@@ -62,7 +94,10 @@ class NewPostSetup:
             dict: A dictionary containing the post's content.
         """
         new_post_content = PostContent(
-            post_uid=self._post_uid, author=author_name, content=form.editor.data
+            post_uid=self._post_uid,
+            author=author_name,
+            content=form.editor.data,
+            **render_post_content(form.editor.data),
         )
         return asdict(new_post_content)
 
@@ -74,12 +109,16 @@ class NewPostSetup:
             new_post_info (dict): A dictionary containing the post's information.
         """
         username = new_post_info.get("author")
-        tags = new_post_info.get("tags")
-        tags_increments = {f"tags.{tag}": 1 for tag in tags}
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments=tags_increments, upsert=True
+        tags_increments = tag_increments([], new_post_info.get("tags"))
+        if not tags_increments:
+            return
+        user_info = self._db_handler.user_info.increment_and_prune(
+            filter={"username": username},
+            increments={**tags_increments, "version": 1},
+            values={"last_updated": datetime.now(timezone.utc)},
+            upsert=True,
         )
-        update_user_cache(cache, username)
+        user_cache.store(user_info)
 
     def create_post(self, author_name: str, form: NewPostForm) -> str | None:
         """
@@ -95,9 +134,15 @@ class NewPostSetup:
         new_post_info = self._create_post_info(form=form, author_name=author_name)
         new_post_content = self._create_post_content(form=form, author_name=author_name)
 
-        self._db_handler.post_info.insert_one(new_post_info)
+        self._post_uid = self._db_handler.post_info.insert_with_uid(
+            new_post_info, "post_uid", self._uid_generator.generate
+        )
+        new_post_content["post_uid"] = self._post_uid
         self._db_handler.post_content.insert_one(new_post_content)
+        key_filters.add("post_uid", [self._post_uid])
+        user_utils.update_counts(author_name, "post_info", active=1)
         self._increment_tags_for_user(new_post_info)
+        tag_index.refresh(author_name, new_post_info.get("tags"))
 
         return self._post_uid
 
@@ -112,7 +157,7 @@ def create_post(form: NewPostForm) -> str:
     Returns:
         str: The UID of the newly created post.
     """
-    uid_generator = UIDGenerator(db_handler=mongodb)
+    uid_generator = UIDGenerator()
     new_post_setup = NewPostSetup(post_uid_generator=uid_generator, db_handler=mongodb)
     new_post_uid = new_post_setup.create_post(author_name=current_user.username, form=form)
     return new_post_uid
@@ -135,27 +180,33 @@ class PostUpdateSetup:
         """
         self._db_handler = db_handler
 
-    def _update_tags_for_user(self, post_uid: str, new_tags: dict) -> None:
+    def _update_tags_for_user(
+        self, post_info: dict, new_tags: list[str], session: ClientSession | None = None
+    ) -> dict | None:
         """
-        Update the tag counts for the user when a post is updated.
+        Update the tag counts for the user when a post is updated, in a single update holding
+        only the changed tags. Tags of archived posts are not counted.
 
         Args:
-            post_uid (str): The UID of the post being updated.
-            new_tags (dict): The new tags associated with the post.
-        """
-        post_info = self._db_handler.post_info.find_one({"post_uid": post_uid})
-        username = post_info.get("author")
-        old_tags = post_info.get("tags")
+            post_info (dict): The information of the post before the update.
+            new_tags (list[str]): The new tags associated with the post.
+            session (ClientSession | None): The session of a transaction, if any.
 
-        tags_reduction = {f"tags.{tag}": -1 for tag in old_tags}
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments=tags_reduction
-        )
-        tags_increment = {f"tags.{tag}": 1 for tag in new_tags}
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments=tags_increment, upsert=True
+        Returns:
+            dict | None: The updated user information, or None if no count changed.
+        """
+        if post_info.get("archived"):
+            return None
+        tags_increments = tag_increments(post_info.get("tags"), new_tags)
+        if not tags_increments:
+            return None
+        return self._db_handler.user_info.increment_and_prune(
+            filter={"username": post_info.get("author")},
+            increments={**tags_increments, "version": 1},
+            values={"last_updated": datetime.now(timezone.utc)},
+            upsert=True,
+            session=session,
         )
-        update_user_cache(cache, username)
 
     def update_post(self, post_uid: str, form: EditPostForm) -> None:
         """
@@ -174,13 +225,23 @@ class PostUpdateSetup:
             "last_updated": datetime.now(timezone.utc),
         }
         updated_post_content = {"content": form.editor.data}
+        updated_post_content.update(render_post_content(form.editor.data))
+        post_info = self._db_handler.post_info.find_one({"post_uid": post_uid})
 
-        self._update_tags_for_user(post_uid, updated_post_info.get("tags"))
-        self._db_handler.post_info.update_values(
-            filter={"post_uid": post_uid}, update=updated_post_info
-        )
-        self._db_handler.post_content.update_values(
-            filter={"post_uid": post_uid}, update=updated_post_content
+        def write(session: ClientSession | None) -> dict | None:
+            self._db_handler.post_info.update_values(
+                filter={"post_uid": post_uid}, update=updated_post_info, session=session
+            )
+            self._db_handler.post_content.update_values(
+                filter={"post_uid": post_uid}, update=updated_post_content, session=session
+            )
+            return self._update_tags_for_user(post_info, updated_post_info.get("tags"), session)
+
+        user_info = self._db_handler.run_in_transaction(write)
+        if user_info is not None:
+            user_cache.store(user_info)
+        tag_index.refresh(
+            post_info.get("author"), post_info.get("tags") + updated_post_info.get("tags")
         )
 
 
@@ -213,20 +274,24 @@ class PostUtils:
         """
         self._db_handler = db_handler
 
-    def get_all_posts_info(self, include_archive=False) -> list[dict]:
+    def get_all_posts_info(
+        self, include_archive=False, projection: dict[str, int] | None = None
+    ) -> list[dict]:
         """
         Get information about all posts.
 
         Args:
             include_archive (bool, optional): Whether to include archived posts. Defaults to False.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
 
         Returns:
             list[dict]: A list of dictionaries containing post information.
         """
         if include_archive:
-            result = self._db_handler.post_info.find({}).as_list()
+            result = self._db_handler.post_info.find({}, projection).as_list()
         else:
-            result = self._db_handler.post_info.find({"archived": False}).as_list()
+            result = self._db_handler.post_info.find({"archived": False}, projection).as_list()
         return result
 
     def get_featured_posts_info(self, username: str) -> list[dict]:
@@ -241,7 +306,8 @@ class PostUtils:
         """
         result = (
             self._db_handler.post_info.find(
-                {"author": username, "featured": True, "archived": False}
+                {"author": username, "featured": True, "archived": False},
+                PROJECTIONS["post_card"],
             )
             .sort("created_at", -1)
             .limit(10)
@@ -249,39 +315,47 @@ class PostUtils:
         )
         return result
 
-    def get_post_infos(self, username: str, archive="exclude") -> list[dict]:
+    def get_post_infos(
+        self, username: str, archive="exclude", projection: dict[str, int] | None = None
+    ) -> list[dict]:
         """
         Get information about posts for a specific user.
 
         Args:
             username (str): The username of the post author.
             archive (str, optional): Whether to include archived posts. Defaults to "exclude". Possible values: "exclude", "include", "only".
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
 
         Returns:
             list[dict]: A list of dictionaries containing post information.
         """
         if archive == "exclude":
             result = (
-                self._db_handler.post_info.find({"author": username, "archived": False})
+                self._db_handler.post_info.find({"author": username, "archived": False}, projection)
                 .sort("created_at", -1)
                 .as_list()
             )
         elif archive == "include":
             result = (
-                self._db_handler.post_info.find({"author": username})
+                self._db_handler.post_info.find({"author": username}, projection)
                 .sort("created_at", -1)
                 .as_list()
             )
         elif archive == "only":
             result = (
-                self._db_handler.post_info.find({"author": username, "archived": True})
+                self._db_handler.post_info.find({"author": username, "archived": True}, projection)
                 .sort("created_at", -1)
                 .as_list()
             )
         return result
 
     def get_post_infos_with_pagination(
-        self, username: str, page_number: int, posts_per_page: int
+        self,
+        username: str,
+        page_number: int,
+        posts_per_page: int,
+        projection: dict[str, int] | None = None,
     ) -> list[dict]:
         """
         Get paginated information about posts for a specific user.
@@ -290,26 +364,41 @@ class PostUtils:
             username (str): The username of the post author.
             page_number (int): The page number.
             posts_per_page (int): The number of posts per page.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
 
         Returns:
             list[dict]: A list of dictionaries containing post information.
         """
-        if page_number == 1:
-            result = (
-                self._db_handler.post_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .limit(posts_per_page)
-                .as_list()
-            )
-        elif page_number > 1:
-            result = (
-                self._db_handler.post_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .skip((page_number - 1) * posts_per_page)
-                .limit(posts_per_page)
-                .as_list()
-            )
-        return result
+        return keyset_pagination.find_page(
+            "post_info", username, page_number, posts_per_page, projection
+        )
+
+    def get_post_infos_after(
+        self,
+        username: str,
+        cursor: str | None,
+        posts_per_page: int,
+        projection: dict[str, int] | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Get the page of information about posts for a specific user following a cursor.
+
+        Args:
+            username (str): The username of the post author.
+            cursor (str | None): The cursor returned with the previous page, or None for the
+                first page.
+            posts_per_page (int): The number of posts per page.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
+
+        Returns:
+            tuple[list[dict], str | None]: A list of dictionaries containing post information,
+                and the cursor of the next page, or None if this is the last page.
+        """
+        return keyset_pagination.find_after(
+            "post_info", username, cursor, posts_per_page, projection
+        )
 
     def get_full_post(self, post_uid: str) -> dict:
         """
@@ -326,6 +415,33 @@ class PostUtils:
         post["content"] = post_content
         return post
 
+    def get_rendered_post(self, post_uid: str) -> dict:
+        """
+        Get the full information of a post, with its content as rendered HTML.
+
+        The rendered HTML is stored at write time. If it is missing or was produced by an older
+        renderer version, the post is rendered again and the stored copy is refreshed.
+
+        Args:
+            post_uid (str): The UID of the post to retrieve.
+
+        Returns:
+            dict: A dictionary containing the post information, the rendered content and the read time.
+        """
+        post = self._db_handler.post_info.find_one({"post_uid": post_uid})
+        post_content = self._db_handler.post_content.find_one({"post_uid": post_uid})
+
+        if post_content.get("renderer_version") != RENDERER_VERSION:
+            rendered = render_post_content(post_content.get("content"))
+            self._db_handler.post_content.update_values(
+                filter={"post_uid": post_uid}, update=rendered
+            )
+            post_content.update(rendered)
+
+        post["content"] = post_content.get("content_html")
+        post["readtime"] = post_content.get("readtime")
+        return post
+
     def read_increment(self, post_uid: str) -> None:
         """
         Increment the read count for a specific post.
@@ -333,9 +449,7 @@ class PostUtils:
         Args:
             post_uid (str): The UID of the post to increment.
         """
-        self._db_handler.post_info.make_increments(
-            filter={"post_uid": post_uid}, increments={"reads": 1}
-        )
+        counter_buffer.increment(self._db_handler.post_info, "post_uid", post_uid, "reads")
 
     def view_increment(self, post_uid: str) -> None:
         """
@@ -344,9 +458,7 @@ class PostUtils:
         Args:
             post_uid (str): The UID of the post to increment.
         """
-        self._db_handler.post_info.make_increments(
-            filter={"post_uid": post_uid}, increments={"views": 1}
-        )
+        counter_buffer.increment(self._db_handler.post_info, "post_uid", post_uid, "views")
 
 
 post_utils = PostUtils(db_handler=mongodb)
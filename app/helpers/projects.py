@@ -4,9 +4,12 @@ from datetime import datetime, timezone
 from flask_login import current_user
 
 from app.forms.projects import EditProjectForm, NewProjectForm
-from app.helpers.utils import UIDGenerator, process_tags
+from app.helpers.filters import key_filters
+from app.helpers.tags import tag_index
+from app.helpers.users import user_utils
+from app.helpers.utils import UIDGenerator, keyset_pagination, process_tags
 from app.models.projects import ProjectContent, ProjectInfo
-from app.mongo import Database, mongodb
+from app.mongo import Database, counter_buffer, mongodb
 
 
 def process_form_images(form: NewProjectForm | EditProjectForm) -> list[tuple[str, str]]:
@@ -46,7 +49,8 @@ class NewProjectSetup:
             project_uid_generator (UIDGenerator): The UID generator for projects.
             db_handler (Database): The database handler.
         """
-        self._project_uid = project_uid_generator.generate_project_uid()
+        self._uid_generator = project_uid_generator
+        self._project_uid = project_uid_generator.generate()
         self._db_handler = db_handler
 
     def _create_project_info(self, form: NewProjectForm, author_name: str) -> dict:
@@ -103,8 +107,14 @@ class NewProjectSetup:
         new_project_info = self._create_project_info(form, author_name)
         new_project_content = self._create_project_content(form, author_name)
 
-        self._db_handler.project_info.insert_one(new_project_info)
+        self._project_uid = self._db_handler.project_info.insert_with_uid(
+            new_project_info, "project_uid", self._uid_generator.generate
+        )
+        new_project_content["project_uid"] = self._project_uid
         self._db_handler.project_content.insert_one(new_project_content)
+        key_filters.add("project_uid", [self._project_uid])
+        tag_index.refresh(author_name, new_project_info.get("tags"))
+        user_utils.update_counts(author_name, "project_info", active=1)
         return self._project_uid
 
 
@@ -118,7 +128,7 @@ def create_project(form: NewProjectForm) -> str:
     Returns:
         str: The UID of the newly created project.
     """
-    uid_generator = UIDGenerator(db_handler=mongodb)
+    uid_generator = UIDGenerator()
     new_project_setup = NewProjectSetup(project_uid_generator=uid_generator, db_handler=mongodb)
     new_project_uid = new_project_setup.create_project(author_name=current_user.username, form=form)
     return new_project_uid
@@ -158,6 +168,7 @@ class ProjectUpdateSetup:
             "last_updated": datetime.now(timezone.utc),
         }
         updated_project_content = {"content": form.editor.data}
+        project_info = self._db_handler.project_info.find_one({"project_uid": project_uid})
 
         self._db_handler.project_info.update_values(
             filter={"project_uid": project_uid}, update=updated_project_info
@@ -165,6 +176,10 @@ class ProjectUpdateSetup:
         self._db_handler.project_content.update_values(
             filter={"project_uid": project_uid}, update=updated_project_content
         )
+        tag_index.refresh(
+            project_info.get("author"),
+            project_info.get("tags") + updated_project_info.get("tags"),
+        )
 
 
 def update_project(project_uid: str, form: EditProjectForm) -> None:
@@ -196,47 +211,60 @@ class ProjectsUtils:
         """
         self._db_handler = db_handler
 
-    def get_all_projects_info(self, include_archive=False) -> list[dict]:
+    def get_all_projects_info(
+        self, include_archive=False, projection: dict[str, int] | None = None
+    ) -> list[dict]:
         """
         Get information about all projects.
 
         Args:
             include_archive (bool, optional): Whether to include archived projects. Defaults to False.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
 
         Returns:
             list[dict]: A list of dictionaries containing project information.
         """
         if include_archive:
-            result = self._db_handler.project_info.find({}).as_list()
+            result = self._db_handler.project_info.find({}, projection).as_list()
         else:
-            result = self._db_handler.project_info.find({"archived": False}).as_list()
+            result = self._db_handler.project_info.find({"archived": False}, projection).as_list()
         return result
 
-    def get_project_infos(self, username: str, archive="include") -> list[dict]:
+    def get_project_infos(
+        self, username: str, archive="include", projection: dict[str, int] | None = None
+    ) -> list[dict]:
         """
         Get information about projects for a specific user.
 
         Args:
             username (str): The username of the project author.
+            archive (str, optional): Whether to include archived projects. Defaults to "include". Possible values: "exclude", "include", "only".
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
 
         Returns:
             list[dict]: A list of dictionaries containing project information.
         """
         if archive == "include":
             result = (
-                self._db_handler.project_info.find({"author": username})
+                self._db_handler.project_info.find({"author": username}, projection)
                 .sort("created_at", -1)
                 .as_list()
             )
         elif archive == "exclude":
             result = (
-                self._db_handler.project_info.find({"author": username, "archived": False})
+                self._db_handler.project_info.find(
+                    {"author": username, "archived": False}, projection
+                )
                 .sort("created_at", -1)
                 .as_list()
             )
         elif archive == "only":
             result = (
-                self._db_handler.project_info.find({"author": username, "archived": True})
+                self._db_handler.project_info.find(
+                    {"author": username, "archived": True}, projection
+                )
                 .sort("created_at", -1)
                 .as_list()
             )
@@ -260,7 +288,11 @@ class ProjectsUtils:
         return result
 
     def get_project_infos_with_pagination(
-        self, username: str, page_number: int, projects_per_page: int
+        self,
+        username: str,
+        page_number: int,
+        projects_per_page: int,
+        projection: dict[str, int] | None = None,
     ) -> list[dict]:
         """
         Get paginated information about projects for a specific user.
@@ -269,26 +301,15 @@ class ProjectsUtils:
             username (str): The username of the project author.
             page_number (int): The page number.
             projects_per_page (int): The number of projects per page.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
 
         Returns:
             list[dict]: A list of dictionaries containing project information.
         """
-        if page_number == 1:
-            result = (
-                self._db_handler.project_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .limit(projects_per_page)
-                .as_list()
-            )
-        elif page_number > 1:
-            result = (
-                self._db_handler.project_info.find({"author": username, "archived": False})
-                .sort("created_at", -1)
-                .skip((page_number - 1) * projects_per_page)
-                .limit(projects_per_page)
-                .as_list()
-            )
-        return result
+        return keyset_pagination.find_page(
+            "project_info", username, page_number, projects_per_page, projection
+        )
 
     def get_full_project(self, project_uid: str) -> dict:
         """
@@ -325,9 +346,7 @@ class ProjectsUtils:
         Args:
             project_uid (str): The UID of the project.
         """
-        self._db_handler.project_info.make_increments(
-            filter={"project_uid": project_uid}, increments={"views": 1}
-        )
+        counter_buffer.increment(self._db_handler.project_info, "project_uid", project_uid, "views")
 
 
 projects_utils = ProjectsUtils(mongodb)
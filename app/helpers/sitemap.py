@@ -0,0 +1,347 @@
+import math
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+
+from flask_caching import Cache
+from redis.exceptions import RedisError
+
+from app.cache import cache
+from app.config import DOMAIN, SITEMAP_INDEX_TIMEOUT, SITEMAP_SHARD_SIZE, SITEMAP_TIMEOUT
+from app.helpers.users import user_utils
+from app.logging import logger
+from app.mongo import PROJECTIONS, Database, mongodb
+
+##################################################################################################
+
+# Sitemap shards
+
+##################################################################################################
+
+
+def format_lastmod(last_updated: datetime | None) -> str | None:
+    """
+    Format a modification time as a W3C datetime, as sitemaps expect.
+
+    Args:
+        last_updated (datetime | None): The modification time, naive times being UTC.
+
+    Returns:
+        str | None: The formatted time, or None if there is none.
+    """
+    if last_updated is None:
+        return None
+    return last_updated.replace(tzinfo=timezone.utc).isoformat(timespec="seconds")
+
+
+class Sitemap:
+    """
+    Serves the sitemap as an index of shards, one or more per user, so that no file comes near
+    the limit of 50,000 URLs.
+
+    A user shard lists the pages of the user, then the posts and projects that are not archived.
+    Shards are streamed from projected cursors and cached while they are sent. A cached shard is
+    served as long as the user version and the newest last_updated of the posts and projects of
+    the user are unchanged. The index is cached for a shorter time.
+
+    Args:
+        db_handler (Database): The database handler.
+        cache (Cache): The shared cache backend.
+        base_url (str): The URL of the website, without a trailing slash.
+        shard_size (int): The maximum number of URLs per shard.
+        timeout (int): The timeout of cached shards in seconds.
+        index_timeout (int): The timeout of the cached index in seconds.
+
+    Methods:
+        static_urls() -> Iterator[dict]:
+            Iterates over the URLs of the pages shared by every user.
+        shard_count(username: str) -> int:
+            Gets the number of shards of a user.
+        shards() -> Iterator[dict]:
+            Iterates over the shards of every user, with their modification time.
+        shard_fingerprint(username: str) -> list | None:
+            Gets what the shard of a user is derived from.
+        shard_urls(username: str, page: int) -> Iterator[dict]:
+            Iterates over the URLs of a shard.
+        cached(key: str, fingerprint: list | None, render: Callable[[], Iterator[str]],
+               timeout: int) -> Iterator[str]:
+            Serves a rendered file from the cache, or renders and caches it while it is sent.
+    """
+
+    # the kinds of documents listed in a user shard, with their UID field, URL segment and
+    # projection
+    DOCUMENTS = {
+        "post_info": ("post_uid", "posts", "post_sitemap"),
+        "project_info": ("project_uid", "project", "project_sitemap"),
+    }
+
+    def __init__(
+        self,
+        db_handler: Database,
+        cache: Cache,
+        base_url: str,
+        shard_size: int,
+        timeout: int,
+        index_timeout: int,
+    ) -> None:
+        """
+        Initializes a Sitemap instance.
+
+        Args:
+            db_handler (Database): The database handler.
+            cache (Cache): The shared cache backend.
+            base_url (str): The URL of the website, without a trailing slash.
+            shard_size (int): The maximum number of URLs per shard.
+            timeout (int): The timeout of cached shards in seconds.
+            index_timeout (int): The timeout of the cached index in seconds.
+        """
+        self._db_handler = db_handler
+        self._cache = cache
+        self.base_url = base_url
+        self._shard_size = shard_size
+        self._timeout = timeout
+        self.index_timeout = index_timeout
+
+    def _url(self, path: str, last_updated: datetime | None = None) -> dict:
+        """
+        Build a sitemap entry.
+
+        Args:
+            path (str): The path of the page, starting with a slash.
+            last_updated (datetime | None): When the page was last modified, if known.
+
+        Returns:
+            dict: The entry, with the location and the modification time.
+        """
+        return {"loc": f"{self.base_url}{path}", "lastmod": format_lastmod(last_updated)}
+
+    def static_urls(self) -> Iterator[dict]:
+        """
+        Iterates over the URLs of the pages shared by every user.
+
+        Yields:
+            dict: A sitemap entry.
+        """
+        for path in ("/", "/login", "/signup"):
+            yield self._url(path)
+
+    def _user_paths(self, user_info: dict) -> list[str]:
+        """
+        Get the paths of the pages of a user.
+
+        Args:
+            user_info (dict): The user information, with the feature flags.
+
+        Returns:
+            list[str]: The paths.
+        """
+        username = user_info.get("username")
+        paths = [f"/@{username}", f"/@{username}/blog", f"/@{username}/about"]
+        if user_info.get("gallery_enabled"):
+            paths.append(f"/@{username}/gallery")
+        if user_info.get("changelog_enabled"):
+            paths.append(f"/@{username}/changelog")
+        return paths
+
+    def _active_count(self, user_info: dict, database: str) -> int:
+        """
+        Get the number of documents of a user that are not archived.
+
+        Args:
+            user_info (dict): The user information, with the counters.
+            database (str): The name of the database.
+
+        Returns:
+            int: The number of documents.
+        """
+        active = user_info.get("counts", {}).get(database, {}).get("active")
+        if active is None:
+            # counters not computed yet
+            filter = {"author": user_info.get("username"), "archived": False}
+            active = getattr(self._db_handler, database).count_documents(filter)
+        return active
+
+    def _last_updated(self, username: str) -> list[datetime | None]:
+        """
+        Get the newest last_updated of the posts and projects of a user that are not archived.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            list[datetime | None]: The time for each kind of document, None if there is none.
+        """
+        times = []
+        for database in self.DOCUMENTS:
+            newest = (
+                getattr(self._db_handler, database)
+                .find({"author": username, "archived": False}, PROJECTIONS["last_updated"])
+                .sort("last_updated", -1)
+                .limit(1)
+                .as_list()
+            )
+            times.append(newest[0].get("last_updated") if newest else None)
+        return times
+
+    def _num_shards(self, user_info: dict) -> int:
+        """
+        Get the number of shards of a user.
+
+        Args:
+            user_info (dict): The user information, with the feature flags and the counters.
+
+        Returns:
+            int: The number of shards, at least 1.
+        """
+        num_urls = len(self._user_paths(user_info)) + sum(
+            self._active_count(user_info, database) for database in self.DOCUMENTS
+        )
+        return math.ceil(num_urls / self._shard_size)
+
+    def shard_count(self, username: str) -> int:
+        """
+        Gets the number of shards of a user.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            int: The number of shards, or 0 if there is no such user.
+        """
+        user_info = self._db_handler.user_info.find_one(
+            {"username": username}, PROJECTIONS["user_sitemap"]
+        )
+        return self._num_shards(user_info) if user_info is not None else 0
+
+    def shards(self) -> Iterator[dict]:
+        """
+        Iterates over the shards of every user, with their modification time.
+
+        Yields:
+            dict: The username, the page number of the shard starting from 1, and the newest
+                last_updated of the posts and projects of the user, or None if there is none.
+        """
+        users = self._db_handler.user_info.find({}, PROJECTIONS["user_sitemap"]).sort("username", 1)
+        for user_info in users:
+            username = user_info.get("username")
+            last_updated = max(filter(None, self._last_updated(username)), default=None)
+            for page in range(1, self._num_shards(user_info) + 1):
+                yield {"username": username, "page": page, "lastmod": format_lastmod(last_updated)}
+
+    def shard_fingerprint(self, username: str) -> list | None:
+        """
+        Gets what the shard of a user is derived from.
+
+        The user version changes with the feature flags and whenever a post or project is
+        created, archived or deleted, and the newest last_updated whenever one is edited.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            list | None: The fingerprint, or None if there is no such user.
+        """
+        user = user_utils.get_cached_user_info(username)
+        if user is None:
+            return None
+        return [user.version, *self._last_updated(username)]
+
+    def shard_urls(self, username: str, page: int) -> Iterator[dict]:
+        """
+        Iterates over the URLs of a shard.
+
+        Args:
+            username (str): The username.
+            page (int): The page number of the shard, starting from 1.
+
+        Yields:
+            dict: A sitemap entry.
+        """
+        user_info = self._db_handler.user_info.find_one(
+            {"username": username}, PROJECTIONS["user_sitemap"]
+        )
+        if user_info is None:
+            return
+        skip = (page - 1) * self._shard_size
+        remaining = self._shard_size
+
+        user_paths = self._user_paths(user_info)
+        for path in user_paths[skip : skip + remaining]:
+            yield self._url(path)
+            remaining -= 1
+        skip = max(skip - len(user_paths), 0)
+
+        for database, (uid_field, segment, projection) in self.DOCUMENTS.items():
+            if remaining <= 0:
+                return
+            num_active = self._active_count(user_info, database)
+            if skip >= num_active:
+                skip -= num_active
+                continue
+            documents = (
+                getattr(self._db_handler, database)
+                .find({"author": username, "archived": False}, PROJECTIONS[projection])
+                .sort([("created_at", -1), (uid_field, -1)])
+                .skip(skip)
+                .limit(remaining)
+            )
+            for document in documents:
+                path = f"/@{username}/{segment}/{document.get(uid_field)}"
+                if document.get("custom_slug"):
+                    path += f"/{document.get('custom_slug')}"
+                yield self._url(path, document.get("last_updated"))
+                remaining -= 1
+            skip = 0
+
+    def cached(
+        self,
+        key: str,
+        fingerprint: list | None,
+        render: Callable[[], Iterator[str]],
+        timeout: int | None = None,
+    ) -> Iterator[str]:
+        """
+        Serves a rendered file from the cache, or renders and caches it while it is sent.
+
+        A file is only cached once it was sent whole, so an aborted download is not cached.
+
+        Args:
+            key (str): The cache key.
+            fingerprint (list | None): What the file is derived from. A cached file is only
+                served while it matches.
+            render (Callable[[], Iterator[str]]): Renders the file in chunks.
+            timeout (int | None): The timeout of the cached file in seconds. Defaults to the
+                timeout of shards.
+
+        Yields:
+            str: The chunks of the file.
+        """
+        try:
+            entry = self._cache.get(key)
+        except RedisError:
+            logger.warning("Sitemap cache backend is unreachable.")
+            yield from render()
+            return
+        if entry is not None and entry.get("fingerprint") == fingerprint:
+            yield entry.get("xml")
+            return
+
+        chunks = []
+        for chunk in render():
+            chunks.append(chunk)
+            yield chunk
+        entry = {"fingerprint": fingerprint, "xml": "".join(chunks)}
+        try:
+            self._cache.set(key, entry, timeout=timeout or self._timeout)
+        except RedisError:
+            logger.warning("Sitemap cache backend is unreachable.")
+        logger.debug(f"Sitemap {key} generated successfully.")
+
+
+sitemap_builder = Sitemap(
+    db_handler=mongodb,
+    cache=cache,
+    base_url=f"https://{DOMAIN}",
+    shard_size=SITEMAP_SHARD_SIZE,
+    timeout=SITEMAP_TIMEOUT,
+    index_timeout=SITEMAP_INDEX_TIMEOUT,
+)
@@ -0,0 +1,210 @@
+from collections.abc import Iterable
+from datetime import datetime, timezone
+
+from app.config import TAG_RECENT_UIDS
+from app.helpers.utils import keyset_pagination
+from app.mongo import PROJECTIONS, Database, mongodb
+
+##################################################################################################
+
+# Tag Index
+
+##################################################################################################
+
+
+class TagIndex:
+    """
+    Maintains one document per author and tag, with the number of posts and projects that are
+    not archived and carry the tag, and the UIDs of the newest of them.
+
+    Entries are recomputed from the multikey tag indexes whenever the tags or the archive status
+    of a document change, so they never drift from the documents themselves.
+
+    Args:
+        db_handler (Database): The database handler.
+        recent_size (int): The number of newest UIDs kept per tag.
+
+    Methods:
+        refresh(username: str, tags: Iterable[str]) -> None:
+            Recomputes the entries of some tags of an author.
+        get_entry(username: str, tag: str) -> dict:
+            Gets the entry of a tag, computing it if none is stored.
+        find_tagged(database: str, entry: dict, page_number: int, num_per_page: int,
+                    projection: dict[str, int] | None) -> list[dict]:
+            Finds a page of the documents with a tag, newest first.
+        rebuild(username: str | None) -> int:
+            Recomputes every entry of an author, or of every author.
+    """
+
+    # the field identifying a document of each database
+    UID_FIELDS = {"post_info": "post_uid", "project_info": "project_uid"}
+
+    def __init__(self, db_handler: Database, recent_size: int) -> None:
+        """
+        Initializes a TagIndex instance.
+
+        Args:
+            db_handler (Database): The database handler.
+            recent_size (int): The number of newest UIDs kept per tag.
+        """
+        self._db_handler = db_handler
+        self._recent_size = recent_size
+
+    def _compute(self, username: str, tag: str) -> dict:
+        """
+        Computes the entry of a tag from the posts and projects of an author.
+
+        Args:
+            username (str): The username of the author.
+            tag (str): The tag.
+
+        Returns:
+            dict: The entry, with the counts in the layout of the user counters.
+        """
+        entry = {"author": username, "tag": tag, "counts": {}, "recent": {}}
+        filter = {"author": username, "tags": tag, "archived": False}
+        for database, uid_field in self.UID_FIELDS.items():
+            collection = getattr(self._db_handler, database)
+            newest = (
+                collection.find(filter, {uid_field: 1})
+                .sort([("created_at", -1), (uid_field, -1)])
+                .limit(self._recent_size)
+                .as_list()
+            )
+            if len(newest) < self._recent_size:
+                count = len(newest)
+            else:
+                count = collection.count_documents(filter)
+            entry["counts"][database] = {"active": count}
+            entry["recent"][database] = [document.get(uid_field) for document in newest]
+        entry["last_updated"] = datetime.now(timezone.utc)
+        return entry
+
+    def _store(self, entry: dict) -> None:
+        """
+        Writes an entry, or removes it if no document carries the tag any more.
+
+        Args:
+            entry (dict): The entry.
+        """
+        filter = {"author": entry["author"], "tag": entry["tag"]}
+        if any(counts["active"] for counts in entry["counts"].values()):
+            self._db_handler.tag_index.update_one(filter, {"$set": entry}, upsert=True)
+        else:
+            self._db_handler.tag_index.delete_one(filter)
+
+    def refresh(self, username: str, tags: Iterable[str]) -> None:
+        """
+        Recomputes the entries of some tags of an author.
+
+        Call after the tags or the archive status of a post or project change, with both the
+        old and the new tags.
+
+        Args:
+            username (str): The username of the author.
+            tags (Iterable[str]): The tags.
+        """
+        for tag in set(tags):
+            self._store(self._compute(username, tag))
+
+    def get_entry(self, username: str, tag: str) -> dict:
+        """
+        Gets the entry of a tag, computing it if none is stored.
+
+        The computed entry is not written, so lookups of unknown tags never touch the
+        collection, which is kept by refresh and rebuild alone.
+
+        Args:
+            username (str): The username of the author.
+            tag (str): The tag.
+
+        Returns:
+            dict: The entry, with zero counts if no document carries the tag.
+        """
+        entry = self._db_handler.tag_index.find_one({"author": username, "tag": tag})
+        if entry is None:
+            entry = self._compute(username, tag)
+        return entry
+
+    def find_tagged(
+        self,
+        database: str,
+        entry: dict,
+        page_number: int,
+        num_per_page: int,
+        projection: dict[str, int] | None = None,
+    ) -> list[dict]:
+        """
+        Finds a page of the documents with a tag, newest first.
+
+        The first page is looked up by the UIDs kept in the entry, later pages are read from
+        the multikey tag index.
+
+        Args:
+            database (str): The name of the database, "post_info" or "project_info".
+            entry (dict): The entry of the tag.
+            page_number (int): The page number, starting from 1.
+            num_per_page (int): The number of documents per page.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
+
+        Returns:
+            list[dict]: A list of documents.
+        """
+        count = entry["counts"][database]["active"]
+        if not count:
+            return []
+        recent = entry["recent"][database]
+        if page_number == 1 and (len(recent) >= num_per_page or len(recent) == count):
+            uid_field = self.UID_FIELDS[database]
+            if projection is not None:
+                projection = {**projection, "created_at": 1, uid_field: 1}
+            return (
+                getattr(self._db_handler, database)
+                .find({uid_field: {"$in": recent[:num_per_page]}}, projection)
+                .sort([("created_at", -1), (uid_field, -1)])
+                .as_list()
+            )
+        return keyset_pagination.find_page(
+            database, entry["author"], page_number, num_per_page, projection, tag=entry["tag"]
+        )
+
+    def rebuild(self, username: str | None = None) -> int:
+        """
+        Recomputes every entry of an author, or of every author, and drops the stale ones.
+
+        Args:
+            username (str | None): The username of the author. Defaults to every author.
+
+        Returns:
+            int: The number of entries kept.
+        """
+        if username is None:
+            users = self._db_handler.user_info.find({}, PROJECTIONS["username"])
+            entries = self._db_handler.tag_index.find({}, {"author": 1})
+            usernames = {user.get("username") for user in users}
+            usernames.update(entry.get("author") for entry in entries)
+        else:
+            usernames = [username]
+
+        kept = 0
+        for name in usernames:
+            pipeline = [
+                {"$match": {"author": name, "archived": False}},
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags"}},
+            ]
+            tags = set()
+            for database in self.UID_FIELDS:
+                groups = getattr(self._db_handler, database).aggregate(pipeline)
+                tags.update(group["_id"] for group in groups)
+            stale = {
+                entry.get("tag")
+                for entry in self._db_handler.tag_index.find({"author": name}, {"tag": 1})
+            }
+            self.refresh(name, tags | stale)
+            kept += len(tags)
+        return kept
+
+
+tag_index = TagIndex(db_handler=mongodb, recent_size=TAG_RECENT_UIDS)
@@ -1,12 +1,16 @@
 import logging
 from dataclasses import asdict
+from datetime import datetime, timezone
 
 import bcrypt
+from pymongo.client_session import ClientSession
 
+from app.cache import user_cache
 from app.forms.users import SignUpForm
+from app.helpers.filters import key_filters
 from app.logging import Logger, logger, logger_utils
-from app.models.users import UserAbout, UserCreds, UserInfo
-from app.mongo import Database, mongodb
+from app.models.users import UserAbout, UserCreds, UserInfo, empty_counts
+from app.mongo import PROJECTIONS, Database, counter_buffer, mongodb
 
 ##################################################################################################
 
@@ -56,7 +60,9 @@ class NewUserSetup:
         Returns:
             dict: A dictionary containing the user's information.
         """
-        new_user_info = UserInfo(username=username, email=email, blogname=blogname)
+        new_user_info = UserInfo(
+            username=username, email=email, blogname=blogname, counts=empty_counts()
+        )
         return asdict(new_user_info)
 
     def _create_user_about(self, username: str) -> dict:
@@ -107,6 +113,8 @@ class NewUserSetup:
         self._db_handler.user_creds.insert_one(new_user_creds)
         self._db_handler.user_info.insert_one(new_user_info)
         self._db_handler.user_about.insert_one(new_user_about)
+        key_filters.add("username", [self._regist_form.username.data])
+        key_filters.add("email", [self._regist_form.email.data])
 
         logger_utils.registration_succeeded(self._regist_form.username.data)
 
@@ -170,6 +178,7 @@ class UserDeletionSetup:
         self._db_handler.user_creds.delete_one({"username": self._user_to_be_deleted})
         self._db_handler.user_info.delete_one({"username": self._user_to_be_deleted})
         self._db_handler.user_about.delete_one({"username": self._user_to_be_deleted})
+        self._db_handler.tag_index.delete_many({"author": self._user_to_be_deleted})
 
         self._logger.debug(f"Deleted user information for user {self._user_to_be_deleted}.")
 
@@ -209,7 +218,7 @@ class UserUtils:
         Returns:
             list[str]: A list of all usernames.
         """
-        all_user_info = self._db_handler.user_info.find({})
+        all_user_info = self._db_handler.user_info.find({}, PROJECTIONS["username"])
         return [user_info.get("username") for user_info in all_user_info]
 
     def get_all_username_gallery_enabled(self) -> list[str]:
@@ -219,7 +228,9 @@ class UserUtils:
         Returns:
             list[str]: A list of usernames with gallery enabled.
         """
-        all_user_info = self._db_handler.user_info.find({"gallery_enabled": True})
+        all_user_info = self._db_handler.user_info.find(
+            {"gallery_enabled": True}, PROJECTIONS["username"]
+        )
         return [user_info.get("username") for user_info in all_user_info]
 
     def get_all_username_changelog_enabled(self) -> list[str]:
@@ -229,7 +240,9 @@ class UserUtils:
         Returns:
             list[str]: A list of usernames with changelog enabled.
         """
-        all_user_info = self._db_handler.user_info.find({"changelog_enabled": True})
+        all_user_info = self._db_handler.user_info.find(
+            {"changelog_enabled": True}, PROJECTIONS["username"]
+        )
         return [user_info.get("username") for user_info in all_user_info]
 
     def get_user_info(self, username: str) -> UserInfo:
@@ -248,6 +261,35 @@ class UserUtils:
         user_info.pop("_id", None)
         return UserInfo(**user_info)
 
+    def get_cached_user_info(self, username: str) -> UserInfo:
+        """
+        Get user information by username, from the user cache when possible.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            UserInfo: The user information, or None if there is no such user.
+        """
+        if not key_filters.might_exist("username", username):
+            return None
+        return user_cache.load(username, self.get_user_info)
+
+    def user_exists(self, username: str) -> bool:
+        """
+        Check if a user exists, without a database query when the username is definitely not
+        in use.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            bool: True if the user exists, False otherwise.
+        """
+        if not key_filters.might_exist("username", username):
+            return False
+        return self._db_handler.user_info.exists("username", username)
+
     def get_user_about(self, username: str) -> UserAbout:
         """
         Get user about information by username.
@@ -291,6 +333,7 @@ class UserUtils:
             username=username, db_handler=self._db_handler, logger=self._logger
         )
         user_deletion.start_deletion_process()
+        user_cache.discard(username)
 
     def create_user(self, form: SignUpForm) -> str:
         """
@@ -305,16 +348,173 @@ class UserUtils:
         user_registration = NewUserSetup(form, self._db_handler, self._logger)
         return user_registration.create_user()
 
+    def _update_and_patch(
+        self,
+        filter: dict,
+        update: dict,
+        fields: list[str],
+        session: ClientSession | None = None,
+    ) -> dict | None:
+        """
+        Apply an update to the information of a user, bumping its version and its last update
+        time, and patch the changed fields onto the cached user.
+
+        Args:
+            filter (dict): The filter criteria, including the username.
+            update (dict): The update operations.
+            fields (list[str]): The top-level fields changed by the update.
+            session (ClientSession | None): The session of a transaction, if any. The cached
+                user is then left to the caller, to be updated once the transaction commits.
+
+        Returns:
+            dict | None: The changed fields and the version after the update, or None if no
+                user matches the filter.
+        """
+        update = {
+            **update,
+            "$inc": {**update.get("$inc", {}), "version": 1},
+            "$set": {**update.get("$set", {}), "last_updated": datetime.now(timezone.utc)},
+        }
+        fields = [*fields, "last_updated"]
+        projection = {**{field: 1 for field in fields}, "version": 1}
+        user_info = self._db_handler.user_info.find_one_and_update(
+            filter, update, projection, session=session
+        )
+        if user_info is not None and session is None:
+            user_cache.update_fields(
+                filter["username"],
+                user_info["version"],
+                {field: user_info.get(field) for field in fields},
+            )
+        return user_info
+
+    def update_user_info(self, username: str, fields: dict) -> dict | None:
+        """
+        Set fields of the information of a user, and cache the updated user.
+
+        Args:
+            username (str): The username.
+            fields (dict): The fields to set.
+
+        Returns:
+            dict | None: The updated user information, or None if there is no such user.
+        """
+        user_info = self._db_handler.user_info.find_one_and_update(
+            {"username": username},
+            {
+                "$set": {**fields, "last_updated": datetime.now(timezone.utc)},
+                "$inc": {"version": 1},
+            },
+        )
+        if user_info is not None:
+            user_cache.store(user_info)
+        return user_info
+
+    def update_counts(
+        self,
+        username: str,
+        database: str,
+        active: int = 0,
+        archived: int = 0,
+        session: ClientSession | None = None,
+    ) -> dict | None:
+        """
+        Adjust the counters of active and archived documents of a user in a single update.
+
+        Users whose counters have not been computed yet are left alone, Paging counts their
+        documents instead until repair_counts is run.
+
+        Args:
+            username (str): The username.
+            database (str): The name of the database, e.g. post_info.
+            active (int): The change in active documents. Defaults to 0.
+            archived (int): The change in archived documents. Defaults to 0.
+            session (ClientSession | None): The session of a transaction, if any. The cached
+                user is then left to the caller, to be updated once the transaction commits.
+
+        Returns:
+            dict | None: The updated counters and version, or None if they were left alone.
+        """
+        return self._update_and_patch(
+            filter={"username": username, f"counts.{database}": {"$exists": True}},
+            update={
+                "$inc": {
+                    f"counts.{database}.active": active,
+                    f"counts.{database}.archived": archived,
+                }
+            },
+            fields=["counts"],
+            session=session,
+        )
+
+    def repair_counts(self, username: str | None = None) -> int:
+        """
+        Recompute the counters of active and archived documents by aggregation.
+
+        Args:
+            username (str | None): The user to repair. Defaults to every user.
+
+        Returns:
+            int: The number of users repaired.
+        """
+        usernames = [username] if username else self.get_all_username()
+        counts = {name: empty_counts() for name in usernames}
+        match = {"author": username} if username else {}
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {"author": "$author", "archived": "$archived"},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+        for database in ("post_info", "project_info", "changelog"):
+            for group in getattr(self._db_handler, database).aggregate(pipeline):
+                author = group["_id"].get("author")
+                if author in counts:
+                    status = "archived" if group["_id"].get("archived") else "active"
+                    counts[author][database][status] = group["count"]
+
+        for name, user_counts in counts.items():
+            self._update_and_patch(
+                filter={"username": name},
+                update={"$set": {"counts": user_counts}},
+                fields=["counts"],
+            )
+        self._logger.info(f"Repaired content counters of {len(counts)} users.")
+        return len(counts)
+
+    def repair_tags(self, username: str) -> None:
+        """
+        Recompute the tag counts of a user from the posts that are not archived.
+
+        Args:
+            username (str): The username.
+        """
+        pipeline = [
+            {"$match": {"author": username, "archived": False}},
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        ]
+        tags = {
+            group["_id"]: group["count"] for group in self._db_handler.post_info.aggregate(pipeline)
+        }
+        self._update_and_patch(
+            filter={"username": username}, update={"$set": {"tags": tags}}, fields=["tags"]
+        )
+
     def total_view_increment(self, username: str) -> None:
         """
         Increment the total view count for a user.
 
+        The count is buffered and written without a new version, cached copies of the user
+        pick it up when they are next loaded from the database.
+
         Args:
             username (str): The username.
         """
-        self._db_handler.user_info.make_increments(
-            filter={"username": username}, increments={"total_views": 1}
-        )
+        counter_buffer.increment(self._db_handler.user_info, "username", username, "total_views")
 
 
 user_utils = UserUtils(db_handler=mongodb, logger=logger)
@@ -1,13 +1,23 @@
 import random
 import string
+from collections import Counter
+from datetime import datetime
 from math import ceil
 
-from bs4 import BeautifulSoup
 from flask import abort
-from markdown import Markdown
+from itsdangerous import BadSignature, URLSafeSerializer
 from typing_extensions import Self
 
-from app.mongo import Database
+from app.cache import RenderCache, cache, page_cache, stampede_guard
+from app.config import (
+    APP_SECRET,
+    MARKDOWN_POOL_SIZE,
+    PAGE_ANCHORS_TIMEOUT,
+    RENDER_CACHE_SIZE,
+    RENDER_CACHE_TIMEOUT,
+)
+from app.mongo import Database, mongodb
+from app.renderer import MARKDOWN_PROFILES, POST_PREAMBLE, RENDERER_VERSION, MarkdownPool
 
 ##################################################################################################
 
@@ -17,60 +27,21 @@ from app.mongo import Database
 
 
 class UIDGenerator:
-    def __init__(self, db_handler: Database) -> None:
-        """
-        Initialize the UIDGenerator with a database handler.
+    ALPHABET = string.ascii_lowercase + string.digits
+    LENGTH = 8
 
-        Args:
-            db_handler (Database): The database handler.
+    def generate(self) -> str:
         """
-        self._db_handler = db_handler
+        Generate a random UID without looking into the database.
 
-    def generate_comment_uid(self) -> str:
-        """
-        Look into the comment database and generate a unique ID for a new comment.
+        There are 36^8 (about 2.8e12) possible UIDs, so a new UID collides with one of 10 million
+        existing documents with a probability of about 3.6e-6. Such collisions are caught by the
+        unique index on the UID field at insert time, see ExtendedCollection.insert_with_uid.
 
         Returns:
-            str: A unique comment UID string.
-        """
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            comment_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.comment.exists("comment_uid", comment_uid):
-                return comment_uid
-
-    def generate_post_uid(self) -> str:
+            str: A UID string.
         """
-        Look into the post database and generate a unique ID for a new post.
-
-        Returns:
-            str: A unique post UID string.
-        """
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            post_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.post_info.exists("post_uid", post_uid):
-                return post_uid
-
-    def generate_project_uid(self) -> str:
-        """
-        Look into the project database and generate a unique ID for a new project.
-
-        Returns:
-            str: A unique project UID string.
-        """
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            project_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.project_info.exists("project_uid", project_uid):
-                return project_uid
-
-    def generate_changelog_uid(self) -> str:
-        alphabet = string.ascii_lowercase + string.digits
-        while True:
-            changelog_uid = "".join(random.choices(alphabet, k=8))
-            if not self._db_handler.changelog.exists("changelog_uid", changelog_uid):
-                return changelog_uid
+        return "".join(random.choices(self.ALPHABET, k=self.LENGTH))
 
 
 ##################################################################################################
@@ -79,109 +50,28 @@ class UIDGenerator:
 
 ##################################################################################################
 
+markdown_pool = MarkdownPool(profiles=MARKDOWN_PROFILES, max_size=MARKDOWN_POOL_SIZE)
+render_cache = RenderCache(
+    cache=cache,
+    guard=stampede_guard,
+    version=RENDERER_VERSION,
+    max_entries=RENDER_CACHE_SIZE,
+    timeout=RENDER_CACHE_TIMEOUT,
+)
 
-class HTMLFormatter:
-    def __init__(self, html: str) -> None:
-        """
-        Initialize the HTMLFormatter.
-
-        Args:
-            html (str): A string that is already HTML.
-        """
-        self._soup = BeautifulSoup(html, "html.parser")
-
-    def add_padding(self) -> Self:
-        """
-        Add padding to HTML elements except 'figure' and 'img'.
-
-        Returns:
-            HTMLFormatter: The formatter instance.
-        """
-        blocks = self._soup.find_all(lambda tag: tag.name not in ["figure", "img"], recursive=False)
-        for block in blocks:
-            current_class = block.get("class", [])
-            current_class.append("py-1")
-            block["class"] = current_class
-
-        return self
-
-    def change_headings(self) -> Self:
-        """
-        Change the heading levels in the HTML.
-
-        Returns:
-            HTMLFormatter: The formatter instance.
-        """
-        small_headings = self._soup.find_all("h3")
-        for heading in small_headings:
-            heading.name = "h6"
-            heading["class"] = "pt-2 pb-1 fw-bold"
-
-        medium_headings = self._soup.find_all("h2")
-        for heading in medium_headings:
-            heading.name = "h5"
-            heading["class"] = "pt-3 pb-1 fw-bold"
-
-        big_headings = self._soup.find_all("h1")
-        for heading in big_headings:
-            heading.name = "h2"
-            heading["class"] = "pt-4 pb-1 fw-bold"
-
-        return self
-
-    def modify_figure(self) -> Self:
-        """
-        Modify figure and image elements to center them and adjust their sizes.
-
-        Returns:
-            HTMLFormatter: The formatter instance.
-        """
-        figures = self._soup.find_all("figure")
-        for figure in figures:
-            current_class = figure.get("class", [])
-            current_class.extend(["figure", "w-100", "mx-auto"])
-            figure["class"] = current_class
-
-        imgs = self._soup.find_all(["img"])
-        for img in imgs:
-            img_src = img["src"]
-            img["src"] = ""
-            img["data-src"] = img_src
-            current_class = img.get("class", [])
-            current_class.extend(["lazyload", "figure-img", "img-fluid", "rounded", "w-100"])
-            img["class"] = current_class
-
-        captions = self._soup.find_all(["figcaption"])
-        for caption in captions:
-            current_class = caption.get("class", [])
-            current_class.extend(["figure-caption", "text-center", "py-2"])
-            caption["class"] = current_class
 
-        return self
-
-    def modify_hyperlink(self) -> Self:
-        """
-        Apply color theme to hyperlinks in the post.
-
-        Returns:
-            HTMLFormatter: The formatter instance.
-        """
-        links = self._soup.find_all("a")
-        for link in links:
-            current_class = link.get("class", [])
-            current_class.extend(["in-content-link"])
-            link["class"] = current_class
-
-        return self
+def _render(profile: str, text: str) -> str:
+    """
+    Convert markdown text with a profile, going through the render cache.
 
-    def to_string(self) -> str:
-        """
-        Convert the formatted HTML back to a string.
+    Args:
+        profile (str): The profile name.
+        text (str): The original markdown content.
 
-        Returns:
-            str: The formatted HTML string.
-        """
-        return str(self._soup)
+    Returns:
+        str: The converted HTML content.
+    """
+    return render_cache.fetch(profile, text, lambda text: markdown_pool.convert(profile, text))
 
 
 def convert_post_content(content: str) -> str:
@@ -194,10 +84,7 @@ def convert_post_content(content: str) -> str:
     Returns:
         str: The converted HTML content.
     """
-    md = Markdown(extensions=["markdown_captions", "fenced_code", "footnotes", "toc"])
-    html = md.convert("[TOC]\r\n\r\n" + content)
-    formatter = HTMLFormatter(html)
-    html = formatter.add_padding().change_headings().modify_figure().modify_hyperlink().to_string()
+    html = _render("post", POST_PREAMBLE + content)
 
     return html
 
@@ -212,10 +99,7 @@ def convert_about(about: str) -> str:
     Returns:
         str: The converted HTML content.
     """
-    md = Markdown(extensions=["markdown_captions", "fenced_code"])
-    html = md.convert(about)
-    formatter = HTMLFormatter(html)
-    html = formatter.add_padding().change_headings().modify_figure().to_string()
+    html = _render("about", about)
 
     return html
 
@@ -230,20 +114,13 @@ def convert_project_content(content: str) -> str:
     Returns:
         str: The converted HTML content.
     """
-    md = Markdown(extensions=["markdown_captions", "fenced_code", "footnotes", "toc"])
-    html = md.convert(content)
-    formatter = HTMLFormatter(html)
-    html = formatter.add_padding().change_headings().modify_figure().to_string()
+    html = _render("project", content)
 
     return html
 
 
 def convert_changelog_content(content: str) -> str:
-
-    md = Markdown(extensions=["markdown_captions", "fenced_code", "footnotes"])
-    html = md.convert(content)
-    formatter = HTMLFormatter(html)
-    html = formatter.add_padding().change_headings().modify_figure().to_string()
+    html = _render("changelog", content)
 
     return html
 
@@ -269,7 +146,14 @@ class Paging:
         self._allow_next_page = None
         self._current_page = None
 
-    def setup(self, username: str, database: str, current_page: int, num_per_page: int) -> Self:
+    def setup(
+        self,
+        username: str,
+        database: str,
+        current_page: int,
+        num_per_page: int,
+        counts: dict[str, dict[str, int]] | None = None,
+    ) -> Self:
         """
         Set up pagination for a user and database.
 
@@ -278,6 +162,8 @@ class Paging:
             database (str): The name of the database.
             current_page (int): The current page number.
             num_per_page (int): The number of items per page.
+            counts (dict[str, dict[str, int]] | None): The counters of the user, as stored with
+                the user information. Documents are counted in the database if not given.
 
         Returns:
             Paging: The paging instance.
@@ -293,8 +179,11 @@ class Paging:
         self._current_page = current_page
 
         # set up for pagination
+        # use the counters stored with the user if they have been computed
+        if counts and self._database in counts:
+            num_not_archived = counts[self._database].get("active", 0)
         # factory mode
-        if self._database == "post_info":
+        elif self._database == "post_info":
             num_not_archived = self._db_handler.post_info.count_documents(
                 {"author": username, "archived": False}
             )
@@ -372,6 +261,214 @@ class Paging:
         return self._current_page
 
 
+class KeysetPagination:
+    # the field identifying a document of each database, used to break ties on created_at
+    UID_FIELDS = {
+        "post_info": "post_uid",
+        "project_info": "project_uid",
+        "changelog": "changelog_uid",
+    }
+
+    def __init__(self, db_handler: Database, secret: str) -> None:
+        """
+        Initialize the KeysetPagination class with a database handler.
+
+        Args:
+            db_handler (Database): The database handler.
+            secret (str): The key signing page tokens.
+        """
+        self._db_handler = db_handler
+        self._secret = secret
+
+    @property
+    def _serializer(self) -> URLSafeSerializer:
+        """
+        Get the serializer signing page tokens.
+
+        Returns:
+            URLSafeSerializer: The serializer.
+        """
+        return URLSafeSerializer(self._secret, salt="page-token")
+
+    def _seek(
+        self,
+        database: str,
+        username: str,
+        anchor: tuple[datetime, str] | None,
+        skip: int,
+        limit: int,
+        projection: dict[str, int] | None = None,
+        tag: str | None = None,
+    ) -> list[dict]:
+        """
+        Find the documents of an author that come after an anchor, newest first.
+
+        Args:
+            database (str): The name of the database.
+            username (str): The username of the author.
+            anchor (tuple[datetime, str] | None): The creation time and UID of the last document
+                before the wanted ones, or None to start from the newest document.
+            skip (int): The number of documents to skip after the anchor.
+            limit (int): The maximum number of documents to return.
+            projection (dict[str, int] | None): The fields to include. The fields of the sort
+                order are always included. Defaults to the whole document.
+            tag (str | None): Only find the documents with this tag. Defaults to all documents.
+
+        Returns:
+            list[dict]: A list of documents.
+        """
+        uid_field = self.UID_FIELDS[database]
+        if projection is not None:
+            projection = {**projection, "created_at": 1, uid_field: 1}
+        filter = {"author": username, "archived": False}
+        if tag is not None:
+            filter["tags"] = tag
+        if anchor is not None:
+            created_at, uid = anchor
+            filter["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, uid_field: {"$lt": uid}},
+            ]
+        cursor = (
+            getattr(self._db_handler, database)
+            .find(filter, projection)
+            .sort([("created_at", -1), (uid_field, -1)])
+        )
+        if skip:
+            cursor = cursor.skip(skip)
+        return cursor.limit(limit).as_list()
+
+    def _anchor_of(self, database: str, document: dict) -> tuple[datetime, str]:
+        """
+        Get the position of a document in the sort order.
+
+        Args:
+            database (str): The name of the database.
+            document (dict): The document.
+
+        Returns:
+            tuple[datetime, str]: The creation time and UID of the document.
+        """
+        return document.get("created_at"), document.get(self.UID_FIELDS[database])
+
+    def find_page(
+        self,
+        database: str,
+        username: str,
+        page_number: int,
+        num_per_page: int,
+        projection: dict[str, int] | None = None,
+        tag: str | None = None,
+    ) -> list[dict]:
+        """
+        Find a numbered page of an author's documents, newest first.
+
+        The last document of every page served is remembered per author as the anchor of the
+        next page, so that sequential page numbers seek instead of skipping. Anchors are
+        dropped along with the author's cached pages.
+
+        Args:
+            database (str): The name of the database.
+            username (str): The username of the author.
+            page_number (int): The page number, starting from 1.
+            num_per_page (int): The number of documents per page.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
+            tag (str | None): Only find the documents with this tag. Defaults to all documents.
+
+        Returns:
+            list[dict]: A list of documents.
+        """
+        cache_key = f"page-anchors:{database}:{username}:{num_per_page}"
+        if tag is not None:
+            cache_key += f":tag:{tag}"
+        token = page_cache.tag_token(f"user:{username}")
+        anchors = {}
+        if token is not None:
+            cached = cache.get(cache_key)
+            if cached is not None and cached.get("token") == token:
+                anchors = cached.get("anchors")
+
+        known = max((page for page in anchors if page < page_number), default=0)
+        anchor = anchors.get(known)
+        skip = (page_number - 1 - known) * num_per_page
+        result = self._seek(database, username, anchor, skip, num_per_page, projection, tag)
+
+        if token is not None and result and page_number not in anchors:
+            anchors[page_number] = self._anchor_of(database, result[-1])
+            cache.set(cache_key, {"token": token, "anchors": anchors}, timeout=PAGE_ANCHORS_TIMEOUT)
+        return result
+
+    def find_after(
+        self,
+        database: str,
+        username: str,
+        page_token: str | None,
+        num_per_page: int,
+        projection: dict[str, int] | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Find the page of an author's documents following a page token, newest first.
+
+        Args:
+            database (str): The name of the database.
+            username (str): The username of the author.
+            page_token (str | None): The token returned with the previous page, or None for
+                the first page.
+            num_per_page (int): The number of documents per page.
+            projection (dict[str, int] | None): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
+
+        Returns:
+            tuple[list[dict], str | None]: A list of documents and the token of the next page,
+                or None if this is the last page.
+
+        Raises:
+            abort: If the page token is not valid.
+        """
+        anchor = self.decode_token(page_token) if page_token else None
+        result = self._seek(database, username, anchor, 0, num_per_page + 1, projection)
+        if len(result) <= num_per_page:
+            return result, None
+        result = result[:num_per_page]
+        return result, self.encode_token(self._anchor_of(database, result[-1]))
+
+    def encode_token(self, anchor: tuple[datetime, str]) -> str:
+        """
+        Encode a position in the sort order as an opaque, signed page token.
+
+        Args:
+            anchor (tuple[datetime, str]): The creation time and UID of a document.
+
+        Returns:
+            str: The page token.
+        """
+        created_at, uid = anchor
+        return self._serializer.dumps([created_at.isoformat(), uid])
+
+    def decode_token(self, page_token: str) -> tuple[datetime, str]:
+        """
+        Decode a page token.
+
+        Args:
+            page_token (str): The page token.
+
+        Returns:
+            tuple[datetime, str]: The creation time and UID of a document.
+
+        Raises:
+            abort: If the page token is not valid.
+        """
+        try:
+            created_at, uid = self._serializer.loads(page_token)
+            return datetime.fromisoformat(created_at), uid
+        except (BadSignature, TypeError, ValueError):
+            abort(404)
+
+
+keyset_pagination = KeysetPagination(db_handler=mongodb, secret=APP_SECRET)
+
+
 ##################################################################################################
 
 # some other utility functions
@@ -425,3 +522,22 @@ def process_tags(tag_string: str) -> list[str]:
     if tag_string == "":
         return []
     return [tag.strip(" ") for tag in tag_string.split(",")]
+
+
+def tag_increments(old_tags: list[str], new_tags: list[str]) -> dict[str, int]:
+    """
+    Compute the changes to the tag counts of a user when the tags of a post change.
+
+    Tags found in both lists cancel out, so that only the changed tags are updated.
+
+    Args:
+        old_tags (list[str]): The tags counted before the change.
+        new_tags (list[str]): The tags counted after the change.
+
+    Returns:
+        dict[str, int]: The increments of the changed tags, keyed by their path in the user
+            information.
+    """
+    deltas = Counter(new_tags)
+    deltas.subtract(old_tags)
+    return {f"tags.{tag}": delta for tag, delta in deltas.items() if delta}
@@ -19,6 +19,7 @@ class PostInfo:
         featured (bool): Flag indicating if the post is featured. Defaults to False.
         views (int): Number of views the post has received. Defaults to 0.
         reads (int): Number of reads the post has received. Defaults to 0.
+        comment_count (int): Number of comments under the post. Defaults to 0.
     """
 
     post_uid: str
@@ -34,6 +35,7 @@ class PostInfo:
     featured: bool = False
     views: int = 0
     reads: int = 0
+    comment_count: int = 0
 
 
 @dataclass
@@ -44,8 +46,14 @@ class PostContent:
         post_uid (str): Unique identifier for the post.
         author (str): Author of the post.
         content (str): Content of the post.
+        content_html (str): Rendered HTML of the content. Defaults to an empty string.
+        readtime (str): Estimated read time of the rendered content. Defaults to an empty string.
+        renderer_version (int): Renderer version that produced content_html. Defaults to 0.
     """
 
     post_uid: str
     author: str
     content: str
+    content_html: str = ""
+    readtime: str = ""
+    renderer_version: int = 0
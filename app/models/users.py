@@ -17,6 +17,18 @@ def select_profile_img() -> str:
     return url_for("static", filename=f"img/profile{idx}.png")
 
 
+def empty_counts() -> dict[str, dict[str, int]]:
+    """Returns zeroed counters of active and archived documents for each counted database.
+
+    Returns:
+        dict[str, dict[str, int]]: The counters, keyed by database name.
+    """
+    return {
+        database: {"active": 0, "archived": 0}
+        for database in ("post_info", "project_info", "changelog")
+    }
+
+
 @dataclass
 class UserInfo(UserMixin):
     """Class to represent user information.
@@ -34,6 +46,9 @@ class UserInfo(UserMixin):
         gallery_enabled (bool): Flag indicating if the gallery feature is enabled. Defaults to False.
         total_views (int): Total number of views. Defaults to 0.
         tags (dict[str, int]): Dictionary of tags and their associated counts. Defaults to an empty dictionary.
+        counts (dict[str, dict[str, int]]): Number of active and archived documents per database. Defaults to an empty dictionary, meaning not yet computed.
+        version (int): Incremented by every update of the user information, so that cached copies can be ordered. Defaults to 0.
+        last_updated (datetime): Timestamp of the last update incrementing the version. Defaults to None, meaning not updated since creation.
     """
 
     username: str
@@ -48,6 +63,9 @@ class UserInfo(UserMixin):
     gallery_enabled: bool = False
     total_views: int = 0
     tags: dict[str, int] = field(default_factory=dict)
+    counts: dict[str, dict[str, int]] = field(default_factory=dict)
+    version: int = 0
+    last_updated: Optional[datetime] = None
 
     def __post_init__(self):
         if not self.profile_img_url:
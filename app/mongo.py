@@ -1,11 +1,207 @@
-from typing import Any, Optional
-
-from pymongo import MongoClient
+import atexit
+import os
+import threading
+from collections import Counter, defaultdict
+from copy import deepcopy
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, TypeVar
+
+from flask import g, has_request_context
+from pymongo import (
+    ASCENDING,
+    DESCENDING,
+    IndexModel,
+    MongoClient,
+    ReplaceOne,
+    ReturnDocument,
+    UpdateOne,
+)
+from pymongo.client_session import ClientSession
 from pymongo.collection import Collection
 from pymongo.cursor import Cursor
+from pymongo.errors import (
+    DuplicateKeyError,
+    OperationFailure,
+    PyMongoError,
+    ServerSelectionTimeoutError,
+)
 from typing_extensions import Self
 
-from app.config import MONGO_URL
+from app.config import COUNTER_FLUSH_INTERVAL, MONGO_URL, UID_INSERT_ATTEMPTS
+from app.logging import logger
+
+T = TypeVar("T")
+
+# error code of a transaction started on a standalone server
+ILLEGAL_OPERATION = 20
+
+# Named field projections, one per kind of call site. Only top-level inclusions are used, so
+# that the identity map can derive them from whole documents.
+PROJECTIONS: dict[str, dict[str, int]] = {
+    "exists": {"_id": 1},
+    "username": {"username": 1},
+    "email": {"email": 1},
+    "post_uid": {"post_uid": 1},
+    "project_uid": {"project_uid": 1},
+    "user_sitemap": {
+        "username": 1,
+        "gallery_enabled": 1,
+        "changelog_enabled": 1,
+        "counts": 1,
+    },
+    "last_updated": {"last_updated": 1},
+    "post_card": {
+        "post_uid": 1,
+        "author": 1,
+        "title": 1,
+        "subtitle": 1,
+        "tags": 1,
+        "created_at": 1,
+    },
+    "post_row": {
+        "post_uid": 1,
+        "author": 1,
+        "title": 1,
+        "created_at": 1,
+        "last_updated": 1,
+        "archived": 1,
+        "featured": 1,
+        "views": 1,
+        "reads": 1,
+        "comment_count": 1,
+    },
+    "post_sitemap": {"post_uid": 1, "author": 1, "custom_slug": 1, "last_updated": 1},
+    "post_owner": {"post_uid": 1, "author": 1, "custom_slug": 1},
+    "post_validators": {
+        "post_uid": 1,
+        "author": 1,
+        "custom_slug": 1,
+        "last_updated": 1,
+        "comment_count": 1,
+    },
+    "project_card": {
+        "project_uid": 1,
+        "author": 1,
+        "title": 1,
+        "short_description": 1,
+        "tags": 1,
+        "images": 1,
+        "created_at": 1,
+    },
+    "project_row": {
+        "project_uid": 1,
+        "author": 1,
+        "title": 1,
+        "created_at": 1,
+        "last_updated": 1,
+        "archived": 1,
+        "views": 1,
+        "reads": 1,
+    },
+    "project_sitemap": {"project_uid": 1, "author": 1, "custom_slug": 1, "last_updated": 1},
+    "project_owner": {"project_uid": 1, "author": 1, "custom_slug": 1},
+    "project_validators": {
+        "project_uid": 1,
+        "author": 1,
+        "custom_slug": 1,
+        "last_updated": 1,
+    },
+    "changelog_validators": {"changelog_uid": 1, "last_updated": 1},
+    "title": {"title": 1},
+}
+
+
+class IdentityMap:
+    def __init__(self) -> None:
+        """Initialize an empty identity map.
+
+        The map memoizes single document lookups for the duration of a request, keyed by
+        collection and filter, so that repeated lookups of the same document hit the database
+        once. Writes to a collection drop what is known about it.
+        """
+        self._documents: dict[str, dict[str, Optional[dict[str, Any]]]] = defaultdict(dict)
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        namespace: str,
+        filter: dict[str, Any],
+        projection: Optional[dict[str, int]],
+        fetch: Callable[[], Optional[dict[str, Any]]],
+    ) -> Optional[dict[str, Any]]:
+        """Get a document from the map, fetching it on the first lookup.
+
+        A projected lookup is also answered from the whole document, if that is already known.
+
+        Args:
+            namespace (str): The full name of the collection.
+            filter (dict[str, Any]): The filter criteria.
+            projection (Optional[dict[str, int]]): The top-level fields to include, if any.
+            fetch (Callable[[], Optional[dict[str, Any]]]): Fetches the document from the database.
+
+        Returns:
+            Optional[dict[str, Any]]: A copy of the document, so that callers may modify it, or
+                None if not found.
+        """
+        documents = self._documents[namespace]
+        key = repr((filter, projection))
+        whole_key = repr((filter, None))
+        if key in documents:
+            self.hits += 1
+            document = documents[key]
+        elif projection is not None and whole_key in documents:
+            self.hits += 1
+            document = documents[whole_key]
+            if document is not None:
+                document = {
+                    field: value
+                    for field, value in document.items()
+                    if field == "_id" or projection.get(field)
+                }
+        else:
+            self.misses += 1
+            document = documents[key] = fetch()
+        return deepcopy(document)
+
+    def invalidate(self, namespace: str) -> None:
+        """Forget every document of a collection.
+
+        Args:
+            namespace (str): The full name of the collection.
+        """
+        self._documents.pop(namespace, None)
+
+
+def _path_value(document: dict[str, Any], path: str) -> Any:
+    """Read a field of a document by its dotted path.
+
+    Args:
+        document (dict[str, Any]): The document.
+        path (str): The dotted path of the field.
+
+    Returns:
+        Any: The value of the field, or 0 if it is missing.
+    """
+    value = document
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return 0
+        value = value[key]
+    return value
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    """Get the identity map of the current request, creating it on first use.
+
+    Returns:
+        Optional[IdentityMap]: The identity map, or None outside of a request.
+    """
+    if not has_request_context():
+        return None
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
 
 
 class ExtendedCollection:
@@ -17,16 +213,20 @@ class ExtendedCollection:
         """
         self._col = collection
 
-    def find(self, filter: dict[str, Any]) -> "ExtendedCursor":
+    def find(
+        self, filter: dict[str, Any], projection: Optional[dict[str, int]] = None
+    ) -> "ExtendedCursor":
         """Find documents in the collection based on a filter.
 
         Args:
             filter (dict[str, Any]): The filter criteria.
+            projection (Optional[dict[str, int]]): The fields to include, e.g. a profile from
+                PROJECTIONS. Defaults to the whole document.
 
         Returns:
             ExtendedCursor: Custom cursor for further operations.
         """
-        return ExtendedCursor(self._col, filter)
+        return ExtendedCursor(self._col, filter, projection)
 
     def insert_one(self, document: dict[str, Any]) -> None:
         """Insert a single document into the collection.
@@ -35,6 +235,56 @@ class ExtendedCollection:
             document (dict[str, Any]): The document to insert.
         """
         self._col.insert_one(document)
+        self._invalidate()
+
+    def insert_with_uid(
+        self,
+        document: dict[str, Any],
+        uid_field: str,
+        generate_uid: Callable[[], str],
+        attempts: int = UID_INSERT_ATTEMPTS,
+    ) -> str:
+        """Insert a document, drawing a new UID whenever its UID is already taken.
+
+        Relies on the unique index on the UID field instead of checking the UID beforehand.
+
+        Args:
+            document (dict[str, Any]): The document to insert, updated with the UID it got.
+            uid_field (str): The UID field.
+            generate_uid (Callable[[], str]): Generates a new UID.
+            attempts (int): The number of UIDs to try before giving up.
+
+        Returns:
+            str: The UID of the inserted document.
+
+        Raises:
+            DuplicateKeyError: If all attempts collide, or another unique index is violated.
+        """
+        for attempt in range(attempts):
+            try:
+                self._col.insert_one(document)
+            except DuplicateKeyError as error:
+                key_pattern = (error.details or {}).get("keyPattern") or {}
+                if attempt == attempts - 1 or (key_pattern and uid_field not in key_pattern):
+                    raise
+                document.pop("_id", None)
+                document[uid_field] = generate_uid()
+            else:
+                break
+        self._invalidate()
+        return document[uid_field]
+
+    def insert_many(self, documents: list[dict[str, Any]]) -> None:
+        """Insert documents into the collection in a single unordered batch.
+
+        Args:
+            documents (list[dict[str, Any]]): The documents to insert.
+        """
+        if documents:
+            try:
+                self._col.insert_many(documents, ordered=False)
+            finally:
+                self._invalidate()
 
     def count_documents(self, filter: dict[str, Any]) -> int:
         """Count documents in the collection matching the filter.
@@ -54,6 +304,7 @@ class ExtendedCollection:
             filter (dict[str, Any]): The filter criteria.
         """
         self._col.delete_one(filter)
+        self._invalidate()
 
     def delete_many(self, filter: dict[str, Any]) -> None:
         """Delete multiple documents matching the filter.
@@ -62,19 +313,49 @@ class ExtendedCollection:
             filter (dict[str, Any]): The filter criteria.
         """
         self._col.delete_many(filter)
+        self._invalidate()
 
-    def find_one(self, filter: dict[str, Any]) -> Optional[dict[str, Any]]:
+    def find_one(
+        self, filter: dict[str, Any], projection: Optional[dict[str, int]] = None
+    ) -> Optional[dict[str, Any]]:
         """Find a single document matching the filter.
 
         Args:
             filter (dict[str, Any]): The filter criteria.
+            projection (Optional[dict[str, int]]): The top-level fields to include, e.g. a
+                profile from PROJECTIONS. Defaults to the whole document.
 
         Returns:
             Optional[dict[str, Any]]: The found document or None if not found.
         """
-        result = self._col.find_one(filter)
+        identity_map = current_identity_map()
+        if identity_map is None:
+            return self._fetch_one(filter, projection)
+        return identity_map.get(
+            self._col.full_name, filter, projection, lambda: self._fetch_one(filter, projection)
+        )
+
+    def _fetch_one(
+        self, filter: dict[str, Any], projection: Optional[dict[str, int]] = None
+    ) -> Optional[dict[str, Any]]:
+        """Find a single document matching the filter in the database.
+
+        Args:
+            filter (dict[str, Any]): The filter criteria.
+            projection (Optional[dict[str, int]]): The fields to include, if any.
+
+        Returns:
+            Optional[dict[str, Any]]: The found document or None if not found.
+        """
+        result = self._col.find_one(filter, projection)
         return dict(result) if result else None
 
+    def _invalidate(self) -> None:
+        """Drop the documents of this collection from the identity map after a write."""
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.invalidate(self._col.full_name)
+
     def exists(self, key: str, value: Any) -> bool:
         """Check if a value exists for a given key in the collection.
 
@@ -85,10 +366,14 @@ class ExtendedCollection:
         Returns:
             bool: True if the value exists, False otherwise.
         """
-        return self.find_one({key: value}) is not None
+        return self.find_one({key: value}, projection=PROJECTIONS["exists"]) is not None
 
     def update_one(
-        self, filter: dict[str, Any], update: dict[str, Any], upsert: bool = False
+        self,
+        filter: dict[str, Any],
+        update: dict[str, Any],
+        upsert: bool = False,
+        session: Optional[ClientSession] = None,
     ) -> None:
         """Update a single document matching the filter.
 
@@ -96,17 +381,64 @@ class ExtendedCollection:
             filter (dict[str, Any]): The filter criteria.
             update (dict[str, Any]): The update operations.
             upsert (bool): If True, create a new document if no document matches the filter.
+            session (Optional[ClientSession]): The session of a transaction, if any.
         """
-        self._col.update_one(filter, update, upsert=upsert)
-
-    def update_values(self, filter: dict[str, Any], update: dict[str, Any]) -> None:
+        self._col.update_one(filter, update, upsert=upsert, session=session)
+        self._invalidate()
+
+    def update_values(
+        self,
+        filter: dict[str, Any],
+        update: dict[str, Any],
+        session: Optional[ClientSession] = None,
+    ) -> None:
         """Update fields in a document using the $set operator.
 
         Args:
             filter (dict[str, Any]): The filter criteria.
             update (dict[str, Any]): The fields to update.
+            session (Optional[ClientSession]): The session of a transaction, if any.
+        """
+        self.update_one(filter=filter, update={"$set": update}, session=session)
+
+    def aggregate(self, pipeline: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Run an aggregation pipeline on the collection.
+
+        Args:
+            pipeline (list[dict[str, Any]]): The aggregation stages.
+
+        Returns:
+            list[dict[str, Any]]: The resulting documents.
+        """
+        return list(self._col.aggregate(pipeline))
+
+    def create_indexes(self, indexes: list[IndexModel]) -> list[str]:
+        """Create indexes on the collection. Existing identical indexes are left untouched.
+
+        Args:
+            indexes (list[IndexModel]): The indexes to create.
+
+        Returns:
+            list[str]: The names of the indexes.
         """
-        self.update_one(filter=filter, update={"$set": update})
+        return self._col.create_indexes(indexes)
+
+    def explain(
+        self, filter: dict[str, Any], sort: Optional[list[tuple[str, int]]] = None
+    ) -> dict[str, Any]:
+        """Explain the query plan chosen for a find with an optional sort.
+
+        Args:
+            filter (dict[str, Any]): The filter criteria.
+            sort (Optional[list[tuple[str, int]]]): The (key, direction) pairs to sort by, if any.
+
+        Returns:
+            dict[str, Any]: The explain output of the server.
+        """
+        cursor = self._col.find(filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor.explain()
 
     def make_increments(
         self, filter: dict[str, Any], increments: dict[str, int], upsert: bool = False
@@ -120,23 +452,149 @@ class ExtendedCollection:
         """
         self.update_one(filter=filter, update={"$inc": increments}, upsert=upsert)
 
+    def find_one_and_update(
+        self,
+        filter: dict[str, Any],
+        update: dict[str, Any],
+        projection: Optional[dict[str, int]] = None,
+        upsert: bool = False,
+        session: Optional[ClientSession] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Update a single document matching the filter and return it as updated.
+
+        Args:
+            filter (dict[str, Any]): The filter criteria.
+            update (dict[str, Any]): The update operations.
+            projection (Optional[dict[str, int]]): The fields to return. Defaults to the whole
+                document.
+            upsert (bool): If True, create a new document if no document matches the filter.
+            session (Optional[ClientSession]): The session of a transaction, if any.
+
+        Returns:
+            Optional[dict[str, Any]]: The updated document, or None if no document matches the
+                filter.
+        """
+        document = self._col.find_one_and_update(
+            filter,
+            update,
+            projection=projection,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        self._invalidate()
+        return dict(document) if document else None
+
+    def increment_and_prune(
+        self,
+        filter: dict[str, Any],
+        increments: dict[str, int],
+        values: Optional[dict[str, Any]] = None,
+        upsert: bool = False,
+        session: Optional[ClientSession] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Increment fields in one update and return the updated document.
+
+        Fields brought down to zero or below are then unset, guarded by their values so that a
+        concurrent increment keeps them. This costs a second update only when a count runs out.
+
+        Args:
+            filter (dict[str, Any]): The filter criteria.
+            increments (dict[str, int]): The fields to increment, by dotted path.
+            values (Optional[dict[str, Any]]): The fields to set in the same update, if any.
+            upsert (bool): If True, create a new document if no document matches the filter.
+            session (Optional[ClientSession]): The session of a transaction, if any.
+
+        Returns:
+            Optional[dict[str, Any]]: The updated document without the unset fields, or None if
+                no document matches the filter.
+        """
+        update = {"$inc": increments, **({"$set": values} if values else {})}
+        document = self.find_one_and_update(filter, update, upsert=upsert, session=session)
+        if document is None:
+            return None
+        spent = [
+            path
+            for path, amount in increments.items()
+            if amount < 0 and _path_value(document, path) <= 0
+        ]
+        if spent:
+            self.update_one(
+                filter={**filter, **{path: {"$lte": 0} for path in spent}},
+                update={"$unset": {path: "" for path in spent}},
+                session=session,
+            )
+            for path in spent:
+                parent, _, field = path.rpartition(".")
+                (_path_value(document, parent) if parent else document).pop(field, None)
+        return document
+
+    def bulk_increments(self, increments: list[tuple[dict[str, Any], dict[str, int]]]) -> None:
+        """Apply many $inc updates in a single unordered bulk write.
+
+        Args:
+            increments (list[tuple[dict[str, Any], dict[str, int]]]): Pairs of filter criteria
+                and the fields to increment in the matching document.
+        """
+        if increments:
+            self._col.bulk_write(
+                [UpdateOne(filter, {"$inc": fields}) for filter, fields in increments],
+                ordered=False,
+            )
+            self._invalidate()
+
+    def bulk_update_values(self, updates: list[tuple[dict[str, Any], dict[str, Any]]]) -> None:
+        """Apply many $set updates in a single unordered bulk write.
+
+        Args:
+            updates (list[tuple[dict[str, Any], dict[str, Any]]]): Pairs of filter criteria and
+                the fields to set in the matching document.
+        """
+        if updates:
+            self._col.bulk_write(
+                [UpdateOne(filter, {"$set": fields}) for filter, fields in updates],
+                ordered=False,
+            )
+            self._invalidate()
+
+    def bulk_replace(self, replacements: list[tuple[dict[str, Any], dict[str, Any]]]) -> None:
+        """Replace or insert many documents in a single unordered bulk write.
+
+        Args:
+            replacements (list[tuple[dict[str, Any], dict[str, Any]]]): Pairs of filter criteria
+                and the document replacing the matching one, inserted if none matches.
+        """
+        if replacements:
+            self._col.bulk_write(
+                [ReplaceOne(filter, document, upsert=True) for filter, document in replacements],
+                ordered=False,
+            )
+            self._invalidate()
+
 
 class ExtendedCursor(Cursor):
-    def __init__(self, collection: ExtendedCollection, filter: Optional[dict[str, Any]] = None) -> None:
+    def __init__(
+        self,
+        collection: ExtendedCollection,
+        filter: Optional[dict[str, Any]] = None,
+        projection: Optional[dict[str, int]] = None,
+    ) -> None:
         """Initialize the ExtendedCursor with a MongoDB collection and filter.
 
         Args:
             collection (Collection): The MongoDB collection instance.
             filter (Optional[dict[str, Any]]): The filter criteria, if any.
+            projection (Optional[dict[str, int]]): The fields to include, if any.
         """
-        super().__init__(collection, filter)
+        super().__init__(collection, filter, projection)
 
-    def sort(self, key_or_list: Any, direction: int) -> Self:
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> Self:
         """Sort the cursor results.
 
         Args:
-            key_or_list (Any): The key or list of keys to sort by.
-            direction (int): The sort direction (1 for ascending, -1 for descending).
+            key_or_list (Any): The key or list of (key, direction) pairs to sort by.
+            direction (Optional[int]): The sort direction (1 for ascending, -1 for descending),
+                when sorting by a single key.
 
         Returns:
             ExtendedCursor: Self for method chaining.
@@ -176,12 +634,233 @@ class ExtendedCursor(Cursor):
         """
         self.__check_okay_to_chain()
         return list(self)
-    
+
     def __check_okay_to_chain(self) -> None:
         """Check if chaining operations is allowed."""
         return super(ExtendedCursor, self)._Cursor__check_okay_to_chain()
 
 
+def _keyset_indexes(uid_field: str) -> list[IndexModel]:
+    """Indexes shared by the collections listed per author, newest first.
+
+    Args:
+        uid_field (str): The UID field, which also breaks ties in the keyset order.
+
+    Returns:
+        list[IndexModel]: The indexes.
+    """
+    return [
+        IndexModel([(uid_field, ASCENDING)], unique=True),
+        IndexModel(
+            [
+                ("author", ASCENDING),
+                ("archived", ASCENDING),
+                ("created_at", DESCENDING),
+                (uid_field, DESCENDING),
+            ]
+        ),
+    ]
+
+
+def _sitemap_index() -> IndexModel:
+    """Build the index finding the last update of the documents of an author.
+
+    Returns:
+        IndexModel: The index.
+    """
+    return IndexModel(
+        [("author", ASCENDING), ("archived", ASCENDING), ("last_updated", DESCENDING)]
+    )
+
+
+def _tagged_index(uid_field: str) -> IndexModel:
+    """Build the multikey index serving the tag pages of an author, newest first.
+
+    Args:
+        uid_field (str): The UID field, which also breaks ties in the keyset order.
+
+    Returns:
+        IndexModel: The index.
+    """
+    return IndexModel(
+        [
+            ("author", ASCENDING),
+            ("tags", ASCENDING),
+            ("archived", ASCENDING),
+            ("created_at", DESCENDING),
+            (uid_field, DESCENDING),
+        ]
+    )
+
+
+# Indexes of every collection, keyed by the Database property name.
+INDEXES: dict[str, list[IndexModel]] = {
+    "user_creds": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "user_info": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "user_about": [IndexModel([("username", ASCENDING)], unique=True)],
+    "post_info": _keyset_indexes("post_uid")
+    + [
+        _tagged_index("post_uid"),
+        _sitemap_index(),
+        IndexModel(
+            [
+                ("author", ASCENDING),
+                ("featured", ASCENDING),
+                ("archived", ASCENDING),
+                ("created_at", DESCENDING),
+            ]
+        ),
+    ],
+    "post_content": [
+        IndexModel([("post_uid", ASCENDING)], unique=True),
+        IndexModel([("author", ASCENDING)]),
+    ],
+    "comment": [
+        IndexModel([("comment_uid", ASCENDING)], unique=True),
+        IndexModel([("post_uid", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "project_info": _keyset_indexes("project_uid")
+    + [_tagged_index("project_uid"), _sitemap_index()],
+    "project_content": [
+        IndexModel([("project_uid", ASCENDING)], unique=True),
+        IndexModel([("author", ASCENDING)]),
+    ],
+    "changelog": _keyset_indexes("changelog_uid")
+    + [IndexModel([("author", ASCENDING), ("archived", ASCENDING), ("date", DESCENDING)])],
+    "tag_index": [IndexModel([("author", ASCENDING), ("tag", ASCENDING)], unique=True)],
+}
+
+# Query shapes issued by the helpers and views, as (collection, filter, sort, scan expected).
+# Values are placeholders, only the shape matters to the planner.
+_NOW = datetime(2000, 1, 1, tzinfo=timezone.utc)
+QUERY_SHAPES: list[tuple[str, dict[str, Any], Optional[list[tuple[str, int]]], bool]] = [
+    ("user_creds", {"username": ""}, None, False),
+    ("user_creds", {"email": ""}, None, False),
+    ("user_info", {"username": ""}, None, False),
+    ("user_info", {"email": ""}, None, False),
+    ("user_info", {}, None, True),
+    ("user_info", {}, [("username", ASCENDING)], False),
+    ("user_info", {"gallery_enabled": True}, None, True),
+    ("user_info", {"changelog_enabled": True}, None, True),
+    ("user_about", {"username": ""}, None, False),
+    ("post_info", {"post_uid": ""}, None, False),
+    ("post_info", {"author": ""}, [("created_at", DESCENDING)], False),
+    ("post_info", {"author": "", "archived": False}, [("created_at", DESCENDING)], False),
+    ("post_info", {"author": "", "archived": True}, [("created_at", DESCENDING)], False),
+    ("post_info", {"author": "", "archived": False}, [("last_updated", DESCENDING)], False),
+    (
+        "post_info",
+        {"author": "", "featured": True, "archived": False},
+        [("created_at", DESCENDING)],
+        False,
+    ),
+    (
+        "post_info",
+        {
+            "author": "",
+            "archived": False,
+            "$or": [{"created_at": {"$lt": _NOW}}, {"created_at": _NOW, "post_uid": {"$lt": ""}}],
+        },
+        [("created_at", DESCENDING), ("post_uid", DESCENDING)],
+        False,
+    ),
+    (
+        "post_info",
+        {"author": "", "tags": "", "archived": False},
+        [("created_at", DESCENDING), ("post_uid", DESCENDING)],
+        False,
+    ),
+    (
+        "post_info",
+        {
+            "author": "",
+            "tags": "",
+            "archived": False,
+            "$or": [{"created_at": {"$lt": _NOW}}, {"created_at": _NOW, "post_uid": {"$lt": ""}}],
+        },
+        [("created_at", DESCENDING), ("post_uid", DESCENDING)],
+        False,
+    ),
+    ("post_info", {"post_uid": {"$in": [""]}}, None, False),
+    ("post_info", {}, None, True),
+    ("post_info", {"archived": False}, None, True),
+    ("post_content", {"post_uid": ""}, None, False),
+    ("post_content", {"author": ""}, None, False),
+    ("comment", {"comment_uid": ""}, None, False),
+    ("comment", {"post_uid": ""}, [("created_at", ASCENDING)], False),
+    ("project_info", {"project_uid": ""}, None, False),
+    ("project_info", {"author": ""}, [("created_at", DESCENDING)], False),
+    ("project_info", {"author": "", "archived": False}, [("created_at", DESCENDING)], False),
+    ("project_info", {"author": "", "archived": True}, [("created_at", DESCENDING)], False),
+    ("project_info", {"author": "", "archived": False}, [("last_updated", DESCENDING)], False),
+    (
+        "project_info",
+        {
+            "author": "",
+            "archived": False,
+            "$or": [
+                {"created_at": {"$lt": _NOW}},
+                {"created_at": _NOW, "project_uid": {"$lt": ""}},
+            ],
+        },
+        [("created_at", DESCENDING), ("project_uid", DESCENDING)],
+        False,
+    ),
+    (
+        "project_info",
+        {"author": "", "tags": "", "archived": False},
+        [("created_at", DESCENDING), ("project_uid", DESCENDING)],
+        False,
+    ),
+    ("project_info", {"project_uid": {"$in": [""]}}, None, False),
+    ("project_info", {}, None, True),
+    ("project_info", {"archived": False}, None, True),
+    ("project_content", {"project_uid": ""}, None, False),
+    ("changelog", {"changelog_uid": ""}, None, False),
+    ("changelog", {"author": "", "archived": False}, [("created_at", DESCENDING)], False),
+    ("changelog", {"author": "", "archived": False}, [("date", DESCENDING)], False),
+    ("changelog", {"author": "", "archived": True}, [("created_at", DESCENDING)], False),
+    (
+        "changelog",
+        {
+            "author": "",
+            "archived": False,
+            "$or": [
+                {"created_at": {"$lt": _NOW}},
+                {"created_at": _NOW, "changelog_uid": {"$lt": ""}},
+            ],
+        },
+        [("created_at", DESCENDING), ("changelog_uid", DESCENDING)],
+        False,
+    ),
+    ("tag_index", {"author": "", "tag": ""}, None, False),
+    ("tag_index", {"author": ""}, None, False),
+]
+
+
+def _plan_stages(plan: dict[str, Any]) -> list[str]:
+    """Collect the stage names of a query plan tree.
+
+    Args:
+        plan (dict[str, Any]): A winning plan, as found in the explain output.
+
+    Returns:
+        list[str]: The stage names, from the root down.
+    """
+    stages = [plan["stage"]] if "stage" in plan else []
+    children = [plan[key] for key in ("queryPlan", "inputStage") if key in plan]
+    children.extend(plan.get("inputStages", []))
+    for child in children:
+        stages.extend(_plan_stages(child))
+    return stages
+
+
 class Database:
     def __init__(self, client: MongoClient) -> None:
         """Initialize the Database object with MongoDB client.
@@ -195,6 +874,7 @@ class Database:
         comments_db = client["comments"]
         project_db = client["projects"]
         changelog_db = client["changelog"]
+        tags_db = client["tags"]
 
         self._user_creds = ExtendedCollection(users_db["user-creds"])
         self._user_info = ExtendedCollection(users_db["user-info"])
@@ -205,6 +885,76 @@ class Database:
         self._project_info = ExtendedCollection(project_db["project-info"])
         self._project_content = ExtendedCollection(project_db["project-content"])
         self._changelog = ExtendedCollection(changelog_db["changelog-entry"])
+        self._tag_index = ExtendedCollection(tags_db["tag-index"])
+        # unknown until the first transaction is attempted
+        self._transactions_supported: Optional[bool] = None
+
+    def ensure_indexes(self) -> int:
+        """Create the indexes declared in INDEXES. Safe to run on every startup.
+
+        A collection whose indexes cannot be built, e.g. because existing documents violate a
+        unique index, is logged and skipped so the others are still indexed.
+
+        Returns:
+            int: The number of collections whose indexes could not be built.
+        """
+        failures = 0
+        for name, indexes in INDEXES.items():
+            try:
+                getattr(self, name).create_indexes(indexes)
+            except OperationFailure as error:
+                failures += 1
+                logger.error(f"Failed to build indexes of {name}: {error}")
+        logger.debug(f"Indexes ensured on {len(INDEXES) - failures} collections.")
+        return failures
+
+    def run_in_transaction(self, callback: Callable[[Optional[ClientSession]], T]) -> T:
+        """Run a group of writes in a transaction, retried on transient errors.
+
+        Transactions need a replica set or a sharded cluster. On a standalone server the
+        callback runs without a session instead, and the writes are applied one by one.
+
+        Args:
+            callback (Callable[[Optional[ClientSession]], T]): Issues the writes, passing the
+                given session, if any, to each of them. It may be called more than once.
+
+        Returns:
+            T: The return value of the callback.
+        """
+        if self._transactions_supported is not False:
+            try:
+                with self._client.start_session() as session:
+                    result = session.with_transaction(callback)
+                self._transactions_supported = True
+                return result
+            except OperationFailure as error:
+                if error.code != ILLEGAL_OPERATION or self._transactions_supported:
+                    raise
+                self._transactions_supported = False
+                logger.warning("Transactions are not supported by the server, writing without.")
+        return callback(None)
+
+    def audit_indexes(self) -> list[dict[str, Any]]:
+        """Explain every query shape in QUERY_SHAPES and flag unexpected collection scans.
+
+        Returns:
+            list[dict[str, Any]]: One report per query shape, with the collection, filter, sort,
+                the stages of the winning plan and whether it is flagged.
+        """
+        reports = []
+        for name, filter, sort, scan_expected in QUERY_SHAPES:
+            explain = getattr(self, name).explain(filter, sort)
+            stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+            reports.append(
+                {
+                    "collection": name,
+                    "filter": filter,
+                    "sort": sort,
+                    "stages": stages,
+                    "flagged": "COLLSCAN" in stages and not scan_expected,
+                }
+            )
+        return reports
 
     @property
     def client(self) -> MongoClient:
@@ -286,11 +1036,94 @@ class Database:
             ExtendedCollection: The collection for project content.
         """
         return self._project_content
-    
+
     @property
     def changelog(self) -> ExtendedCollection:
         return self._changelog
 
+    @property
+    def tag_index(self) -> ExtendedCollection:
+        """Get the ExtendedCollection for the tag index.
+
+        Returns:
+            ExtendedCollection: The collection holding the tag counts of every author.
+        """
+        return self._tag_index
+
+
+class CounterBuffer:
+    def __init__(self, flush_interval: float) -> None:
+        """Initialize the CounterBuffer.
+
+        Increments are accumulated in memory and written by a background thread every
+        flush_interval seconds, as one bulk write per collection. Pending counts are flushed
+        when the process exits.
+
+        Counts are kept for the next flush only when no server could be reached, so that none
+        of them were written. A bulk write failing after it was sent may have applied part of
+        its increments, which are dropped rather than retried, so that no count is written
+        twice at the cost of possibly losing some.
+
+        Args:
+            flush_interval (float): The number of seconds between flushes.
+        """
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(Counter))
+        self._flusher_pid = None
+        self._stopped = threading.Event()
+        atexit.register(self.close)
+
+    def increment(
+        self, collection: ExtendedCollection, key: str, value: Any, field: str, amount: int = 1
+    ) -> None:
+        """Buffer an increment of a field in the document where key equals value.
+
+        Args:
+            collection (ExtendedCollection): The collection holding the document.
+            key (str): The key identifying the document.
+            value (Any): The value of the key.
+            field (str): The field to increment.
+            amount (int): The amount to add. Defaults to 1.
+        """
+        with self._lock:
+            self._pending[collection][(key, value)][field] += amount
+            if self._flusher_pid != os.getpid():
+                # the flusher thread does not survive a fork, start one per worker process
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._run, name="counter-flusher", daemon=True).start()
+
+    def _run(self) -> None:
+        """Flush the buffer on an interval until the buffer is closed."""
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all pending increments to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(Counter))
+
+        for collection, documents in pending.items():
+            increments = [
+                ({key: value}, dict(fields)) for (key, value), fields in documents.items()
+            ]
+            try:
+                collection.bulk_increments(increments)
+            except ServerSelectionTimeoutError:
+                # raised before anything was sent, keep the counts for the next flush
+                logger.warning("Counter flush failed, no server is reachable. Retrying later.")
+                with self._lock:
+                    for (key, value), fields in documents.items():
+                        self._pending[collection][(key, value)].update(fields)
+            except PyMongoError as error:
+                logger.error(f"Counter flush failed, dropped {len(increments)} increments: {error}")
+
+    def close(self) -> None:
+        """Stop the flusher thread and write the pending increments."""
+        self._stopped.set()
+        self.flush()
+
 
 client = MongoClient(MONGO_URL, connect=False)
 mongodb = Database(client=client)
+counter_buffer = CounterBuffer(flush_interval=COUNTER_FLUSH_INTERVAL)
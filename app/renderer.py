@@ -0,0 +1,752 @@
+import html
+import re
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from typing import Callable
+from xml.etree.ElementTree import Element
+
+import readtime
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+from markdown import Markdown, util
+from markdown.extensions import Extension
+from markdown.extensions.footnotes import FN_BACKLINK_TEXT, NBSP_PLACEHOLDER
+from markdown.serializers import RE_AMP, to_xhtml_string
+from markdown.treeprocessors import Treeprocessor
+from typing_extensions import Self
+
+##################################################################################################
+
+# formatter tool
+
+##################################################################################################
+
+# Bump whenever the HTML produced by the convert_* functions changes, so that
+# stored renders are refreshed lazily on their next read.
+RENDERER_VERSION = 1
+
+
+class HTMLFormatter:
+    def __init__(self, html: str) -> None:
+        """
+        Initialize the HTMLFormatter.
+
+        Args:
+            html (str): A string that is already HTML.
+        """
+        self._soup = BeautifulSoup(html, "html.parser")
+
+    def add_padding(self) -> Self:
+        """
+        Add padding to HTML elements except 'figure' and 'img'.
+
+        Returns:
+            HTMLFormatter: The formatter instance.
+        """
+        blocks = self._soup.find_all(lambda tag: tag.name not in ["figure", "img"], recursive=False)
+        for block in blocks:
+            current_class = block.get("class", [])
+            current_class.append("py-1")
+            block["class"] = current_class
+
+        return self
+
+    def change_headings(self) -> Self:
+        """
+        Change the heading levels in the HTML.
+
+        Returns:
+            HTMLFormatter: The formatter instance.
+        """
+        small_headings = self._soup.find_all("h3")
+        for heading in small_headings:
+            heading.name = "h6"
+            heading["class"] = "pt-2 pb-1 fw-bold"
+
+        medium_headings = self._soup.find_all("h2")
+        for heading in medium_headings:
+            heading.name = "h5"
+            heading["class"] = "pt-3 pb-1 fw-bold"
+
+        big_headings = self._soup.find_all("h1")
+        for heading in big_headings:
+            heading.name = "h2"
+            heading["class"] = "pt-4 pb-1 fw-bold"
+
+        return self
+
+    def modify_figure(self) -> Self:
+        """
+        Modify figure and image elements to center them and adjust their sizes.
+
+        Returns:
+            HTMLFormatter: The formatter instance.
+        """
+        figures = self._soup.find_all("figure")
+        for figure in figures:
+            current_class = figure.get("class", [])
+            current_class.extend(["figure", "w-100", "mx-auto"])
+            figure["class"] = current_class
+
+        imgs = self._soup.find_all(["img"])
+        for img in imgs:
+            img_src = img["src"]
+            img["src"] = ""
+            img["data-src"] = img_src
+            current_class = img.get("class", [])
+            current_class.extend(["lazyload", "figure-img", "img-fluid", "rounded", "w-100"])
+            img["class"] = current_class
+
+        captions = self._soup.find_all(["figcaption"])
+        for caption in captions:
+            current_class = caption.get("class", [])
+            current_class.extend(["figure-caption", "text-center", "py-2"])
+            caption["class"] = current_class
+
+        return self
+
+    def modify_hyperlink(self) -> Self:
+        """
+        Apply color theme to hyperlinks in the post.
+
+        Returns:
+            HTMLFormatter: The formatter instance.
+        """
+        links = self._soup.find_all("a")
+        for link in links:
+            current_class = link.get("class", [])
+            current_class.extend(["in-content-link"])
+            link["class"] = current_class
+
+        return self
+
+    def to_string(self) -> str:
+        """
+        Convert the formatted HTML back to a string.
+
+        Returns:
+            str: The formatted HTML string.
+        """
+        return str(self._soup)
+
+
+_SOUP_PASSES = ("add_padding", "change_headings", "modify_figure", "modify_hyperlink")
+
+# Parsing and serialization rules of BeautifulSoup's html.parser builder with the "minimal"
+# formatter, mirrored so that the treeprocessor output matches what HTMLFormatter produced.
+_SOUP_VOID_ELEMENTS = frozenset(HTMLTreeBuilder.empty_element_tags)
+_SOUP_LIST_ATTRIBUTES = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+_SOUP_PRESERVE_WHITESPACE = frozenset(HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS)
+_SOUP_SPACES = " \n\t\x0c\r"
+_SOUP_ENTITY_RE = re.compile(r"&(?:#([0-9]+)|#[xX]([0-9a-fA-F]+)|([a-zA-Z][a-zA-Z0-9]*));")
+
+
+def _soup_entity(match: re.Match) -> str:
+    """
+    Decode a character reference the way BeautifulSoup's html.parser builder does.
+
+    Args:
+        match (re.Match): A match of _SOUP_ENTITY_RE.
+
+    Returns:
+        str: The decoded text.
+    """
+    decimal, hexadecimal, name = match.groups()
+    if name is not None:
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        return character if character is not None else f"&{name}"
+
+    codepoint = int(decimal) if decimal is not None else int(hexadecimal, 16)
+    if codepoint < 256:
+        try:
+            return bytes([codepoint]).decode("windows-1252")
+        except UnicodeDecodeError:
+            pass
+    try:
+        return chr(codepoint)
+    except (ValueError, OverflowError):
+        return "\N{REPLACEMENT CHARACTER}"
+
+
+def _soup_escape(text: str) -> str:
+    """
+    Escape text the way BeautifulSoup's "minimal" formatter does.
+
+    Args:
+        text (str): The raw text.
+
+    Returns:
+        str: The escaped text.
+    """
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _format_with_soup(html: str, passes: tuple[str, ...]) -> str:
+    """
+    Run the given HTMLFormatter passes over a piece of HTML.
+
+    Args:
+        html (str): A string that is already HTML.
+        passes (tuple[str, ...]): Names of the HTMLFormatter methods to apply, in order.
+
+    Returns:
+        str: The formatted HTML string.
+    """
+    formatter = HTMLFormatter(html)
+    for name in passes:
+        getattr(formatter, name)()
+    return formatter.to_string()
+
+
+class _SelfContainedChecker(HTMLParser):
+    def __init__(self) -> None:
+        """
+        Initialize the checker.
+        """
+        super().__init__(convert_charrefs=False)
+        self._stack = []
+        self.self_contained = True
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        # BeautifulSoup remembers void elements written without a closing slash and then
+        # swallows the end of the next self-closing one, wherever it is in the document.
+        if tag in _SOUP_VOID_ELEMENTS:
+            self.self_contained = False
+        else:
+            self._stack.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        pass
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self._stack:
+            del self._stack[len(self._stack) - self._stack[::-1].index(tag) - 1 :]
+        else:
+            self.self_contained = False
+
+    def close(self) -> None:
+        super().close()
+        if self._stack:
+            self.self_contained = False
+
+
+def _is_self_contained(html: str) -> bool:
+    """
+    Check if a piece of HTML parses the same on its own as inside a larger document.
+
+    Args:
+        html (str): A string that is already HTML.
+
+    Returns:
+        bool: True if every tag opened in the HTML is closed in it, and vice versa.
+    """
+    checker = _SelfContainedChecker()
+    checker.feed(html)
+    checker.close()
+    return checker.self_contained
+
+
+class HTMLFormatterTreeprocessor(Treeprocessor):
+    def __init__(self, md: Markdown, passes: tuple[str, ...]) -> None:
+        """
+        Initialize the HTMLFormatterTreeprocessor.
+
+        Args:
+            md (Markdown): The Markdown instance.
+            passes (tuple[str, ...]): Names of the HTMLFormatter passes to apply, in order.
+        """
+        super().__init__(md)
+        self.passes = passes
+        self.handled = False
+        self._placeholders = {}
+
+    def reset(self) -> None:
+        """
+        Forget the outcome of the previous conversion.
+        """
+        self.handled = False
+
+    def run(self, root: Element) -> None:
+        """
+        Apply the formatter passes to the element tree in a single walk.
+
+        Raw HTML stashed by Markdown is not part of the tree, so stashed blocks are formatted
+        on their own. If some raw HTML cannot be formatted in isolation, the tree is left as is
+        and HTMLFormatterExtension.format_output formats the whole document instead.
+
+        Args:
+            root (Element): The root of the element tree.
+        """
+        self.handled = False
+        located = self._locate_stashed_html(root)
+        if located is None:
+            return
+        stashed, blocks = located
+
+        padding = "add_padding" in self.passes
+        headings = "change_headings" in self.passes
+        figures = "modify_figure" in self.passes
+        hyperlinks = "modify_hyperlink" in self.passes
+
+        # the table of contents is inserted as the same element wherever its marker appears
+        seen = set(blocks.values())
+        if padding:
+            for block in root:
+                if block.tag not in ("figure", "img") and block not in seen:
+                    self._extend_class(block, ["py-1"])
+                seen.add(block)
+
+        seen = set()
+        for element in root.iter():
+            if element in seen:
+                continue
+            seen.add(element)
+            tag = element.tag
+            if headings and tag in ("h1", "h2", "h3"):
+                element.tag, element.attrib["class"] = {
+                    "h3": ("h6", "pt-2 pb-1 fw-bold"),
+                    "h2": ("h5", "pt-3 pb-1 fw-bold"),
+                    "h1": ("h2", "pt-4 pb-1 fw-bold"),
+                }[tag]
+            elif figures and tag == "figure":
+                self._extend_class(element, ["figure", "w-100", "mx-auto"])
+            elif figures and tag == "img":
+                element.set("data-src", element.get("src"))
+                element.set("src", "")
+                self._extend_class(
+                    element, ["lazyload", "figure-img", "img-fluid", "rounded", "w-100"]
+                )
+            elif figures and tag == "figcaption":
+                self._extend_class(element, ["figure-caption", "text-center", "py-2"])
+            elif hyperlinks and tag == "a":
+                self._extend_class(element, ["in-content-link"])
+
+        nested_passes = tuple(name for name in self.passes if name != "add_padding")
+        for index, is_top_level in stashed.items():
+            fragment = self._stashed_fragment(index)
+            if index in blocks:
+                # whitespace after a block joins the text that follows the paragraph it replaces
+                core = fragment.rstrip(_SOUP_SPACES)
+                paragraph = blocks[index]
+                paragraph.tail = fragment[len(core) :] + (paragraph.tail or "")
+                fragment = _format_with_soup(core, self.passes if is_top_level else nested_passes)
+            else:
+                fragment = _soup_escape(_SOUP_ENTITY_RE.sub(_soup_entity, fragment))
+            self.md.htmlStash.rawHtmlBlocks[index] = fragment
+
+        self._placeholders = {util.AMP_SUBSTITUTE: "&"}
+        if "footnote" in self.md.postprocessors:
+            footnotes = self.md.postprocessors["footnote"].footnotes
+            self._placeholders[FN_BACKLINK_TEXT] = footnotes.getConfig("BACKLINK_TEXT")
+            self._placeholders[NBSP_PLACEHOLDER] = "&#160;"
+        self.handled = True
+
+    @staticmethod
+    def _extend_class(element: Element, classes: list[str]) -> None:
+        """
+        Append classes to an element, keeping its existing ones.
+
+        Args:
+            element (Element): The element to modify.
+            classes (list[str]): The classes to append.
+        """
+        current_class = element.get("class", "").split()
+        current_class.extend(classes)
+        element.set("class", " ".join(current_class))
+
+    @staticmethod
+    def _standalone_placeholder(element: Element) -> int | None:
+        """
+        Get the stash index of a paragraph that holds nothing but a placeholder.
+
+        Args:
+            element (Element): The element to check.
+
+        Returns:
+            int | None: The stash index, or None if the element is not such a paragraph.
+        """
+        if element.tag != "p" or len(element) or element.attrib or not element.text:
+            return None
+        match = util.HTML_PLACEHOLDER_RE.fullmatch(element.text)
+        return int(match.group(1)) if match else None
+
+    def _stashed_fragment(self, index: int) -> str:
+        """
+        Get a piece of stashed raw HTML as a string.
+
+        Args:
+            index (int): The stash index.
+
+        Returns:
+            str: The stashed HTML.
+        """
+        raw_html = self.md.postprocessors["raw_html"]
+        return raw_html.stash_to_string(self.md.htmlStash.rawHtmlBlocks[index])
+
+    def _locate_stashed_html(
+        self, root: Element
+    ) -> tuple[dict[int, bool], dict[int, Element]] | None:
+        """
+        Find where each piece of stashed raw HTML ends up in the document.
+
+        A paragraph holding only the placeholder of a block of HTML is replaced by the block,
+        any other placeholder is replaced in place.
+
+        Args:
+            root (Element): The root of the element tree.
+
+        Returns:
+            tuple[dict[int, bool], dict[int, Element]] | None: Whether each located stash index
+                ends up at the top level, and the paragraphs replaced by blocks. None if some raw
+                HTML cannot be formatted on its own.
+        """
+        raw_html = self.md.postprocessors["raw_html"]
+        stashed = {}
+        blocks = {}
+
+        for parent in root.iter():
+            if not isinstance(parent.tag, str):
+                return None
+            for value in parent.attrib.values():
+                if util.HTML_PLACEHOLDER_RE.search(value):
+                    return None
+            for child in parent:
+                index = self._standalone_placeholder(child)
+                if index is None or index >= self.md.htmlStash.html_counter:
+                    continue
+                fragment = self._stashed_fragment(index)
+                if not raw_html.isblocklevel(fragment):
+                    continue
+                if index in stashed or util.STX in fragment:
+                    return None
+                if not fragment.rstrip(_SOUP_SPACES).endswith(">"):
+                    return None
+                if not _is_self_contained(fragment):
+                    return None
+                stashed[index] = parent is root
+                blocks[index] = child
+
+        paragraphs = set(blocks.values())
+        for element in root.iter():
+            texts = (element.tail,) if element in paragraphs else (element.text, element.tail)
+            for text in texts:
+                if not text or util.STX not in text:
+                    continue
+                for match in util.HTML_PLACEHOLDER_RE.finditer(text):
+                    index = int(match.group(1))
+                    if index in stashed or index >= self.md.htmlStash.html_counter:
+                        return None
+                    fragment = self._stashed_fragment(index)
+                    if "<" in fragment or util.STX in fragment:
+                        return None
+                    if not _SOUP_ENTITY_RE.sub(_soup_entity, fragment).strip(_SOUP_SPACES):
+                        return None
+                    stashed[index] = False
+
+        return stashed, blocks
+
+    def _text(self, text: str, preserve_whitespace: bool) -> str:
+        """
+        Escape a text node as it would read after a BeautifulSoup round trip.
+
+        Args:
+            text (str): The text of an element.
+            preserve_whitespace (bool): Whether the text sits inside a pre or textarea element.
+
+        Returns:
+            str: The escaped text.
+        """
+        if util.STX in text:
+            for placeholder, value in self._placeholders.items():
+                text = text.replace(placeholder, value)
+        if "&" in text:
+            text = _SOUP_ENTITY_RE.sub(_soup_entity, RE_AMP.sub("&amp;", text))
+        if not preserve_whitespace and not text.strip(_SOUP_SPACES):
+            return "\n" if "\n" in text else " "
+        return _soup_escape(text)
+
+    def _attribute(self, tag: str, key: str, value: str) -> str:
+        """
+        Serialize an attribute as it would read after a BeautifulSoup round trip.
+
+        Args:
+            tag (str): The tag of the element.
+            key (str): The attribute name.
+            value (str): The attribute value.
+
+        Returns:
+            str: The serialized attribute.
+        """
+        if util.STX in value:
+            for placeholder, replacement in self._placeholders.items():
+                value = value.replace(placeholder, replacement)
+        if "&" in value:
+            value = html.unescape(RE_AMP.sub("&amp;", value))
+        if key in _SOUP_LIST_ATTRIBUTES["*"] or key in _SOUP_LIST_ATTRIBUTES.get(tag, ()):
+            value = " ".join(value.split())
+        value = _soup_escape(value)
+        quote = '"'
+        if '"' in value:
+            if "'" in value:
+                value = value.replace('"', "&quot;")
+            else:
+                quote = "'"
+        return f"{key}={quote}{value}{quote}"
+
+    def _serialize(
+        self, write: Callable[[str], None], element: Element, preserve_whitespace: bool
+    ) -> None:
+        """
+        Write an element and its children the way BeautifulSoup would.
+
+        Args:
+            write (Callable[[str], None]): The function receiving the output.
+            element (Element): The element to serialize.
+            preserve_whitespace (bool): Whether the element sits inside a pre or textarea element.
+        """
+        tag = element.tag
+        write("<" + tag)
+        for key, value in sorted(element.items()):
+            write(" " + self._attribute(tag, key, value))
+        if tag in _SOUP_VOID_ELEMENTS and not len(element) and not element.text:
+            write("/>")
+        else:
+            write(">")
+            inner_preserve_whitespace = preserve_whitespace or tag in _SOUP_PRESERVE_WHITESPACE
+            if element.text:
+                if tag in ("script", "style"):
+                    write(element.text)
+                else:
+                    write(self._text(element.text, inner_preserve_whitespace))
+            for child in element:
+                self._serialize(write, child, inner_preserve_whitespace)
+            write("</" + tag + ">")
+        if element.tail:
+            write(self._text(element.tail, preserve_whitespace))
+
+    def serialize(self, root: Element) -> str:
+        """
+        Serialize the element tree.
+
+        Trees formatted by this treeprocessor are written the way HTMLFormatter.to_string would
+        write them, anything else goes through Markdown's own XHTML serializer.
+
+        Args:
+            root (Element): The element to serialize.
+
+        Returns:
+            str: The HTML string.
+        """
+        if not self.handled:
+            return to_xhtml_string(root)
+        data = []
+        self._serialize(data.append, root, False)
+        return "".join(data)
+
+
+class HTMLFormatterExtension(Extension):
+    def __init__(self, **kwargs) -> None:
+        """
+        Initialize the HTMLFormatterExtension.
+
+        Keyword Args:
+            add_padding (bool): Pad top-level blocks. Defaults to True.
+            change_headings (bool): Shift heading levels. Defaults to True.
+            modify_figure (bool): Style figures and lazy-load images. Defaults to True.
+            modify_hyperlink (bool): Apply the link color theme. Defaults to False.
+        """
+        self.config = {
+            "add_padding": [True, "Pad top-level blocks."],
+            "change_headings": [True, "Shift heading levels."],
+            "modify_figure": [True, "Style figures and lazy-load images."],
+            "modify_hyperlink": [False, "Apply the link color theme."],
+        }
+        super().__init__(**kwargs)
+        self._treeprocessor = None
+
+    def extendMarkdown(self, md: Markdown) -> None:
+        """
+        Register the formatter with a Markdown instance.
+
+        The treeprocessor runs after the table of contents is built, and replaces the XHTML
+        serializer of this instance.
+
+        Args:
+            md (Markdown): The Markdown instance.
+        """
+        passes = tuple(name for name in _SOUP_PASSES if self.getConfig(name))
+        self._treeprocessor = HTMLFormatterTreeprocessor(md, passes)
+        md.treeprocessors.register(self._treeprocessor, "html_formatter", 1)
+        md.output_formats = dict(md.output_formats, xhtml=self._treeprocessor.serialize)
+        md.registerExtension(self)
+
+    def reset(self) -> None:
+        """
+        Reset the formatter between conversions.
+        """
+        if self._treeprocessor is not None:
+            self._treeprocessor.reset()
+
+    def format_output(self, html: str) -> str:
+        """
+        Finish formatting the output of the last conversion.
+
+        Documents the treeprocessor could not handle are formatted with HTMLFormatter here, after
+        Markdown has stripped its output.
+
+        Args:
+            html (str): The converted HTML.
+
+        Returns:
+            str: The formatted HTML string.
+        """
+        if self._treeprocessor.handled:
+            return html
+        return _format_with_soup(html, self._treeprocessor.passes)
+
+
+# Markdown extensions and HTMLFormatterExtension options of each rendering profile
+MARKDOWN_PROFILES = {
+    "post": (
+        ["markdown_captions", "fenced_code", "footnotes", "toc"],
+        {"modify_hyperlink": True},
+    ),
+    "about": (["markdown_captions", "fenced_code"], {}),
+    "project": (["markdown_captions", "fenced_code", "footnotes", "toc"], {}),
+    "changelog": (["markdown_captions", "fenced_code", "footnotes"], {}),
+}
+
+
+class MarkdownPool:
+    def __init__(self, profiles: dict[str, tuple[list[str], dict]], max_size: int) -> None:
+        """
+        Initialize the MarkdownPool.
+
+        Args:
+            profiles (dict[str, tuple[list[str], dict]]): The Markdown extensions and
+                HTMLFormatterExtension options of each profile.
+            max_size (int): The maximum number of idle engines kept per profile.
+        """
+        self._profiles = profiles
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._idle = {profile: [] for profile in profiles}
+        self._stats = {profile: {"hits": 0, "misses": 0, "discards": 0} for profile in profiles}
+
+    def _build(self, profile: str) -> tuple[Markdown, HTMLFormatterExtension]:
+        """
+        Build a Markdown engine for a profile.
+
+        Args:
+            profile (str): The profile name.
+
+        Returns:
+            tuple[Markdown, HTMLFormatterExtension]: The engine and its formatter extension.
+        """
+        extensions, options = self._profiles[profile]
+        formatter = HTMLFormatterExtension(**options)
+        return Markdown(extensions=[*extensions, formatter]), formatter
+
+    @contextmanager
+    def engine(self, profile: str) -> Iterator[tuple[Markdown, HTMLFormatterExtension]]:
+        """
+        Borrow a Markdown engine for a profile, building one if none is idle.
+
+        The engine is reset and returned to the pool on exit, or dropped if the pool is full.
+
+        Args:
+            profile (str): The profile name.
+
+        Yields:
+            tuple[Markdown, HTMLFormatterExtension]: The engine and its formatter extension.
+        """
+        with self._lock:
+            idle = self._idle[profile]
+            engine = idle.pop() if idle else None
+            self._stats[profile]["hits" if engine else "misses"] += 1
+        if engine is None:
+            engine = self._build(profile)
+
+        try:
+            yield engine
+        finally:
+            engine[0].reset()
+            with self._lock:
+                if len(self._idle[profile]) < self._max_size:
+                    self._idle[profile].append(engine)
+                else:
+                    self._stats[profile]["discards"] += 1
+
+    def convert(self, profile: str, text: str) -> str:
+        """
+        Convert markdown text to formatted HTML with an engine of the profile.
+
+        Args:
+            profile (str): The profile name.
+            text (str): The original markdown content.
+
+        Returns:
+            str: The converted HTML content.
+        """
+        with self.engine(profile) as (md, formatter):
+            return formatter.format_output(md.convert(text))
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        Get the usage counters of each profile.
+
+        Returns:
+            dict[str, dict[str, int]]: Hits, misses, discards and idle engines per profile.
+        """
+        with self._lock:
+            return {
+                profile: {**counters, "idle": len(self._idle[profile])}
+                for profile, counters in self._stats.items()
+            }
+
+
+##################################################################################################
+
+# post rendering
+
+##################################################################################################
+
+# prepended to the content of every post, for its table of contents
+POST_PREAMBLE = "[TOC]\r\n\r\n"
+
+# engines of the processes rendering without the application, e.g. for imports
+_standalone_pool = MarkdownPool(profiles=MARKDOWN_PROFILES, max_size=1)
+
+
+def post_fields(content_html: str) -> dict:
+    """
+    Build the fields stored alongside the markdown content of a post from its HTML.
+
+    Args:
+        content_html (str): The rendered HTML.
+
+    Returns:
+        dict: A dictionary with the rendered HTML, the read time and the renderer version.
+    """
+    return {
+        "content_html": content_html,
+        "readtime": str(readtime.of_html(content_html)),
+        "renderer_version": RENDERER_VERSION,
+    }
+
+
+def render_post_standalone(content: str) -> dict:
+    """
+    Render the markdown content of a post without the render cache, in a process that has
+    not imported the application.
+
+    Args:
+        content (str): The original markdown content.
+
+    Returns:
+        dict: A dictionary with the rendered HTML, the read time and the renderer version.
+    """
+    return post_fields(_standalone_pool.convert("post", POST_PREAMBLE + content))
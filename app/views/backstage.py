@@ -1,27 +1,35 @@
-import io
-import json
+import os
+from datetime import datetime, timezone
 
 from bcrypt import checkpw, gensalt, hashpw
-from flask import (Blueprint, Response, flash, redirect, render_template,
-                   request, send_file, session, url_for)
+from flask import (Blueprint, Response, abort, flash, jsonify, redirect,
+                   render_template, request, session, stream_with_context,
+                   url_for)
 from flask_login import current_user, login_required, logout_user
+from pymongo.client_session import ClientSession
 
-from app.cache import cache, update_user_cache
-from app.config import TEMPLATE_FOLDER
+from app.cache import cache_serializer, page_cache, stampede_guard, user_cache
+from app.config import CACHE_STATS_ENABLED, TEMPLATE_FOLDER
 from app.forms.changelog import EditChangelogForm, NewChangelogForm
 from app.forms.posts import EditPostForm, NewPostForm
 from app.forms.projects import EditProjectForm, NewProjectForm
 from app.forms.users import (EditAboutForm, GeneralSettingsForm,
-                             UpdatePasswordForm, UpdateSocialLinksForm,
-                             UserDeletionForm)
+                             ImportDataForm, UpdatePasswordForm,
+                             UpdateSocialLinksForm, UserDeletionForm)
 from app.helpers.changelog import (changelog_utils, create_changelog,
                                    update_changelog)
+from app.helpers.comments import comment_utils
+from app.helpers.export import data_exporter
+from app.helpers.filters import key_filters
+from app.helpers.imports import data_importer
 from app.helpers.posts import create_post, post_utils, update_post
 from app.helpers.projects import create_project, projects_utils, update_project
+from app.helpers.tags import tag_index
 from app.helpers.users import user_utils
-from app.helpers.utils import Paging, slicing_title
+from app.helpers.utils import (Paging, render_cache, slicing_title,
+                               tag_increments)
 from app.logging import logger, logger_utils
-from app.mongo import mongodb
+from app.mongo import PROJECTIONS, mongodb
 from app.views.main import flashing_if_errors
 
 backstage = Blueprint("backstage", __name__, template_folder=TEMPLATE_FOLDER)
@@ -46,6 +54,8 @@ def posts_panel() -> str:
 
     Manages the display of posts and allows for the creation of new posts.
     It includes pagination for posts and error handling for form submissions.
+    Posts are listed by page number, or after the cursor of the previous page
+    when a ``cursor`` argument is given, empty for the first page.
 
     Returns:
         str: Rendered template of the posts panel with context.
@@ -55,33 +65,58 @@ def posts_panel() -> str:
     logger_utils.backstage(username=current_user.username, panel="posts")
 
     current_page = request.args.get("page", default=1, type=int)
-    user = mongodb.user_info.find_one({"username": current_user.username})
+    cursor = request.args.get("cursor")
 
     form = NewPostForm()
 
     if form.validate_on_submit():
         post_uid = create_post(form)
         if post_uid is not None:
+            page_cache.purge(f"user:{current_user.username}")
             logger.debug(f"Post {post_uid} has been created.")
             flash("New post published successfully!", category="success")
     flashing_if_errors(form.errors)
 
+    user = mongodb.user_info.find_one({"username": current_user.username})
     POSTS_EACH_PAGE = 20
-    paging = Paging(db_handler=mongodb)
-    pagination = paging.setup(current_user.username, "post_info", current_page, POSTS_EACH_PAGE)
-    posts = post_utils.get_post_infos_with_pagination(
-        username=current_user.username,
-        page_number=current_page,
-        posts_per_page=POSTS_EACH_PAGE,
-    )
+    if cursor is None:
+        paging = Paging(db_handler=mongodb)
+        pagination = paging.setup(
+            current_user.username,
+            "post_info",
+            current_page,
+            POSTS_EACH_PAGE,
+            counts=user.get("counts"),
+        )
+        posts = post_utils.get_post_infos_with_pagination(
+            username=current_user.username,
+            page_number=current_page,
+            posts_per_page=POSTS_EACH_PAGE,
+            projection=PROJECTIONS["post_row"],
+        )
+        next_cursor = None
+    else:
+        pagination = None
+        posts, next_cursor = post_utils.get_post_infos_after(
+            username=current_user.username,
+            cursor=cursor or None,
+            posts_per_page=POSTS_EACH_PAGE,
+            projection=PROJECTIONS["post_row"],
+        )
+    comment_utils.fill_comment_counts(posts)
     for post in posts:
         post["title"] = slicing_title(post.get("title"), 25)
-        post["comments"] = mongodb.comment.count_documents({"post_uid": post.get("post_uid")})
 
     logger_utils.pagination(panel="posts", num=len(posts))
 
     return render_template(
-        "backstage/posts.html", user=user, posts=posts, pagination=pagination, form=form
+        "backstage/posts.html",
+        user=user,
+        posts=posts,
+        pagination=pagination,
+        cursor=cursor,
+        next_cursor=next_cursor,
+        form=form,
     )
 
 
@@ -106,6 +141,7 @@ def projects_panel() -> str:
     if form.validate_on_submit():
         project_uid = create_project(form)
         if project_uid is not None:
+            page_cache.purge(f"user:{current_user.username}")
             logger.debug(f"Project {project_uid} has been created.")
             flash("New project published successfully!", category="success")
     flashing_if_errors(form.errors)
@@ -113,10 +149,16 @@ def projects_panel() -> str:
     user = mongodb.user_info.find_one({"username": current_user.username})
     PROJECTS_PER_PAGE = 10
     projects = projects_utils.get_project_infos_with_pagination(
-        current_user.username, current_page, PROJECTS_PER_PAGE
+        current_user.username, current_page, PROJECTS_PER_PAGE, PROJECTIONS["project_row"]
     )
     paging = Paging(mongodb)
-    paging.setup(current_user.username, "project_info", current_page, PROJECTS_PER_PAGE)
+    paging.setup(
+        current_user.username,
+        "project_info",
+        current_page,
+        PROJECTS_PER_PAGE,
+        counts=user.get("counts"),
+    )
 
     for project in projects:
         project["title"] = slicing_title(project.get("title"), 40)
@@ -145,11 +187,15 @@ def archive_panel() -> str:
     logger_utils.backstage(username=current_user.username, panel="archive")
 
     user = mongodb.user_info.find_one({"username": current_user.username})
-    posts = post_utils.get_post_infos(current_user.username, archive="only")
+    posts = post_utils.get_post_infos(
+        current_user.username, archive="only", projection=PROJECTIONS["post_row"]
+    )
+    comment_utils.fill_comment_counts(posts)
     for post in posts:
         post["views"] = format(post.get("views"), ",")
-        post["comments"] = mongodb.comment.count_documents({"post_uid": post.get("post_uid")})
-    projects = projects_utils.get_project_infos(current_user.username, archive="only")
+    projects = projects_utils.get_project_infos(
+        current_user.username, archive="only", projection=PROJECTIONS["project_row"]
+    )
     changelogs = changelog_utils.get_archived_changelogs(current_user.username)
 
     logger_utils.pagination(panel="archive", num=(len(posts) + len(projects)))
@@ -182,6 +228,7 @@ def changelog_panel() -> str:
     if form.validate_on_submit():
         changelog_uid = create_changelog(form)
         if changelog_uid is not None:
+            page_cache.purge(f"user:{current_user.username}")
             logger.debug(f"Changelog {changelog_uid} has been created.")
             flash("New changelog published successfully!", category="success")
     flashing_if_errors(form.errors)
@@ -192,7 +239,13 @@ def changelog_panel() -> str:
         current_user.username, current_page, CHANGELOGS_PER_PAGE
     )
     paging = Paging(mongodb)
-    paging.setup(current_user.username, "changelog", current_page, CHANGELOGS_PER_PAGE)
+    paging.setup(
+        current_user.username,
+        "changelog",
+        current_page,
+        CHANGELOGS_PER_PAGE,
+        counts=user.get("counts"),
+    )
 
     for changelog in changelogs:
         changelog["title"] = slicing_title(changelog.get("title"), 40)
@@ -243,14 +296,15 @@ def settings_panel() -> str:
     form_social = UpdateSocialLinksForm(prefix="social")
     form_update_pw = UpdatePasswordForm(prefix="pw")
     form_deletion = UserDeletionForm(prefix="deletion")
+    form_import = ImportDataForm(prefix="import")
 
     if form_general.submit_settings.data and form_general.validate_on_submit():
         cover_url = (
             form_general.cover_url.data if form_general.cover_url.data else user.get("cover_url")
         )
-        mongodb.user_info.update_values(
-            filter={"username": current_user.username},
-            update={
+        user = user_utils.update_user_info(
+            current_user.username,
+            {
                 "cover_url": cover_url,
                 "blogname": form_general.blogname.data,
                 "gallery_enabled": form_general.gallery_enabled.data,
@@ -259,8 +313,7 @@ def settings_panel() -> str:
         )
         logger.debug(f"General settings for {current_user.username} have been updated.")
         flash("Update succeeded!", category="success")
-        update_user_cache(cache, current_user.username)
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        page_cache.purge(f"user:{current_user.username}")
 
     if request.method == "GET":
         for i in range(len(user.get("social_links"))):
@@ -278,14 +331,10 @@ def settings_panel() -> str:
         while len(updated_links) < 5:
             updated_links.append(tuple())
 
-        mongodb.user_info.update_values(
-            filter={"username": current_user.username},
-            update={"social_links": updated_links},
-        )
+        user = user_utils.update_user_info(current_user.username, {"social_links": updated_links})
         logger.debug(f"Social links for {current_user.username} have been updated.")
         flash("Social Links updated!", category="success")
-        update_user_cache(cache, current_user.username)
-        user = mongodb.user_info.find_one({"username": current_user.username})
+        page_cache.purge(f"user:{current_user.username}")
 
     if form_update_pw.submit_pw.data and form_update_pw.validate_on_submit():
         current_pw = form_update_pw.current_pw.data
@@ -302,6 +351,7 @@ def settings_panel() -> str:
                 form_social=form_social,
                 form_update_pw=form_update_pw,
                 form_deletion=form_deletion,
+                form_import=form_import,
             )
 
         new_pw = form_update_pw.new_pw.data
@@ -329,6 +379,7 @@ def settings_panel() -> str:
                 form_social=form_social,
                 form_update_pw=form_update_pw,
                 form_deletion=form_deletion,
+                form_import=form_import,
             )
 
         # Deletion procedure
@@ -336,7 +387,7 @@ def settings_panel() -> str:
         logout_user()
         logger_utils.logout(request=request, username=username)
         user_utils.delete_user(username)
-        cache.delete(username)
+        page_cache.purge(f"user:{username}")
         flash("Account deleted successfully!", category="success")
         logger.debug(f"User {username} has been deleted.")
         return redirect(url_for("main.signup"))
@@ -353,6 +404,7 @@ def settings_panel() -> str:
         form_social=form_social,
         form_update_pw=form_update_pw,
         form_deletion=form_deletion,
+        form_import=form_import,
     )
 
 
@@ -376,8 +428,11 @@ def edit_post(post_uid: str) -> str:
 
     if form.validate_on_submit():
         update_post(post_uid, form)
+        page_cache.purge(f"user:{current_user.username}", f"post:{post_uid}")
         logger.debug(f"Post {post_uid} is updated.")
-        title = mongodb.post_info.find_one({"post_uid": post_uid}).get("title")
+        title = mongodb.post_info.find_one({"post_uid": post_uid}, PROJECTIONS["title"]).get(
+            "title"
+        )
         title_sliced = slicing_title(title, max_len=20)
         flash(f'Your post "{title_sliced}" has been updated!', category="success")
 
@@ -419,13 +474,12 @@ def about_panel() -> str:
             "short_bio": form.short_bio.data,
         }
         updated_about = {"about": form.editor.data}
-        mongodb.user_info.update_values(
-            filter={"username": user.get("username")}, update=updated_info
-        )
+        # the about page is validated by the user version, bumped once the about is written
         mongodb.user_about.update_values(
             filter={"username": user.get("username")}, update=updated_about
         )
-        update_user_cache(cache, current_user.username)
+        user = user_utils.update_user_info(user.get("username"), updated_info)
+        page_cache.purge(f"user:{current_user.username}")
         about = updated_about.get("about")
         logger.debug(f"Information for user {current_user.username} has been updated.")
         flash("Information updated!", category="success")
@@ -460,9 +514,12 @@ def edit_project(project_uid: str) -> str:
     form = EditProjectForm()
     if form.validate_on_submit():
         update_project(project_uid, form)
+        page_cache.purge(f"user:{current_user.username}", f"project:{project_uid}")
         logger.debug(f"Project {project_uid} is updated.")
         title_sliced = slicing_title(
-            mongodb.project_info.find_one({"project_uid": project_uid}).get("title"),
+            mongodb.project_info.find_one(
+                {"project_uid": project_uid}, PROJECTIONS["title"]
+            ).get("title"),
             max_len=20,
         )
         flash(f'Your project "{title_sliced}" has been updated!', category="success")
@@ -488,9 +545,12 @@ def edit_changelog(changelog_uid: str) -> str:
     form = EditChangelogForm()
     if form.validate_on_submit():
         update_changelog(changelog_uid, form)
+        page_cache.purge(f"user:{current_user.username}")
         logger.debug(f"Changelog {changelog_uid} is updated.")
         title_sliced = slicing_title(
-            mongodb.changelog.find_one({"changelog_uid": changelog_uid}).get("title"),
+            mongodb.changelog.find_one(
+                {"changelog_uid": changelog_uid}, PROJECTIONS["title"]
+            ).get("title"),
             max_len=20,
         )
         flash(f'Your changelog "{title_sliced}" has been updated!', category="success")
@@ -536,6 +596,7 @@ def toggle_featured() -> Response:
     mongodb.post_info.update_values(
         filter={"post_uid": post_uid}, update={"featured": updated_featured_status}
     )
+    page_cache.purge(f"user:{current_user.username}", f"post:{post_uid}")
     logger.debug(f"Featuring status for post {post_uid} is now set to {updated_featured_status}.")
 
     return redirect(url_for("backstage.posts_panel"))
@@ -564,23 +625,50 @@ def toggle_archived() -> Response:
 
         if request.args.get("archived") == "to_true":
             updated_archived_status = True
-            tags_increment = {f"tags.{tag}": -1 for tag in tags}
+            tags_increment = tag_increments(tags, [])
             flash(f'Your post "{title_sliced}" is now archived!', category="success")
         else:
             updated_archived_status = False
-            tags_increment = {f"tags.{tag}": 1 for tag in tags}
+            tags_increment = tag_increments([], tags)
             flash(
                 f'Your post "{title_sliced}" is now restored from the archive!',
                 category="success",
             )
 
-        mongodb.post_info.update_values(
-            filter={"post_uid": post_uid}, update={"archived": updated_archived_status}
-        )
-        mongodb.user_info.make_increments(
-            filter={"username": author}, increments=tags_increment, upsert=True
-        )
-        update_user_cache(cache, current_user.username)
+        if post_info.get("archived") != updated_archived_status:
+            change = 1 if updated_archived_status else -1
+
+            def archive(session: ClientSession | None) -> tuple[dict | None, dict | None]:
+                mongodb.post_info.update_values(
+                    filter={"post_uid": post_uid},
+                    update={"archived": updated_archived_status},
+                    session=session,
+                )
+                counts = user_utils.update_counts(
+                    author, "post_info", active=-change, archived=change, session=session
+                )
+                if not tags_increment:
+                    return None, counts
+                user_info = mongodb.user_info.increment_and_prune(
+                    filter={"username": author},
+                    increments={**tags_increment, "version": 1},
+                    values={"last_updated": datetime.now(timezone.utc)},
+                    upsert=True,
+                    session=session,
+                )
+                return user_info, counts
+
+            user_info, counts = mongodb.run_in_transaction(archive)
+            if user_info is not None:
+                user_cache.store(user_info)
+            elif counts is not None:
+                user_cache.update_fields(
+                    author,
+                    counts.get("version"),
+                    {"counts": counts.get("counts"), "last_updated": counts.get("last_updated")},
+                )
+            tag_index.refresh(author, tags)
+        page_cache.purge(f"user:{current_user.username}", f"post:{post_uid}")
         logger.debug(f"Archive status for post {post_uid} is now set to {updated_archived_status}.")
 
     elif content_type == "project":
@@ -598,10 +686,17 @@ def toggle_archived() -> Response:
                 category="success",
             )
 
-        mongodb.project_info.update_values(
-            filter={"project_uid": project_uid},
-            update={"archived": updated_archived_status},
-        )
+        if project_info.get("archived") != updated_archived_status:
+            mongodb.project_info.update_values(
+                filter={"project_uid": project_uid},
+                update={"archived": updated_archived_status},
+            )
+            change = 1 if updated_archived_status else -1
+            user_utils.update_counts(
+                project_info.get("author"), "project_info", active=-change, archived=change
+            )
+            tag_index.refresh(project_info.get("author"), project_info.get("tags"))
+        page_cache.purge(f"user:{current_user.username}", f"project:{project_uid}")
         logger.debug(
             f"Archive status for project {project_uid} is now set to {updated_archived_status}."
         )
@@ -621,10 +716,16 @@ def toggle_archived() -> Response:
                 category="success",
             )
 
-        mongodb.changelog.update_values(
-            filter={"changelog_uid": changelog_uid},
-            update={"archived": updated_archived_status},
-        )
+        if changelog.get("archived") != updated_archived_status:
+            mongodb.changelog.update_values(
+                filter={"changelog_uid": changelog_uid},
+                update={"archived": updated_archived_status},
+            )
+            change = 1 if updated_archived_status else -1
+            user_utils.update_counts(
+                changelog.get("author"), "changelog", active=-change, archived=change
+            )
+        page_cache.purge(f"user:{current_user.username}")
         logger.debug(
             f"Archive status for changelog {changelog_uid} is now set to {updated_archived_status}."
         )
@@ -654,6 +755,10 @@ def delete_post() -> Response:
     title_sliced = slicing_title(post_info.get("title"), max_len=20)
     mongodb.post_info.delete_one({"post_uid": post_uid})
     mongodb.post_content.delete_one({"post_uid": post_uid})
+    status = "archived" if post_info.get("archived") else "active"
+    user_utils.update_counts(post_info.get("author"), "post_info", **{status: -1})
+    tag_index.refresh(post_info.get("author"), post_info.get("tags"))
+    page_cache.purge(f"user:{current_user.username}", f"post:{post_uid}")
     logger.debug(f"Post {post_uid} has been deleted.")
     flash(f'Your post "{title_sliced}" has been deleted!', category="success")
 
@@ -676,6 +781,10 @@ def delete_project() -> Response:
     title_sliced = slicing_title(project_info.get("title"), max_len=20)
     mongodb.project_info.delete_one({"project_uid": project_uid})
     mongodb.project_content.delete_one({"project_uid": project_uid})
+    status = "archived" if project_info.get("archived") else "active"
+    user_utils.update_counts(project_info.get("author"), "project_info", **{status: -1})
+    tag_index.refresh(project_info.get("author"), project_info.get("tags"))
+    page_cache.purge(f"user:{current_user.username}", f"project:{project_uid}")
     logger.debug(f"Project {project_uid} has been deleted.")
     flash(f'Your project "{title_sliced}" has been deleted!', category="success")
 
@@ -697,6 +806,9 @@ def delete_changelog() -> Response:
     changelog = mongodb.changelog.find_one({"changelog_uid": changelog_uid})
     title_sliced = slicing_title(changelog.get("title"), max_len=20)
     mongodb.changelog.delete_one({"changelog_uid": changelog_uid})
+    status = "archived" if changelog.get("archived") else "active"
+    user_utils.update_counts(changelog.get("author"), "changelog", **{status: -1})
+    page_cache.purge(f"user:{current_user.username}")
     logger.debug(f"Changelog {changelog_uid} has been deleted.")
     flash(f'Your changelog "{title_sliced}" has been deleted!', category="success")
 
@@ -721,116 +833,96 @@ def logout() -> Response:
     return redirect(url_for("frontstage.home", username=username))
 
 
+@backstage.route("/cache-stats", methods=["GET"])
+@login_required
+def cache_stats() -> Response:
+    """Reports the counters of the caches held by the worker serving the request.
+
+    The counters reveal how many users and posts exist, so the route is only served when
+    enabled by the CACHE_STATS_ENABLED environment variable, which is off by default.
+
+    Args:
+        None
+
+    Returns:
+        Response: The counters of each cache tier, of the key filters and of the serializer,
+            as JSON.
+    """
+    if not CACHE_STATS_ENABLED:
+        abort(404)
+    return jsonify(
+        pid=os.getpid(),
+        user_cache=user_cache.stats(),
+        render_cache=render_cache.stats(),
+        stampede_guard=stampede_guard.stats(),
+        key_filters=key_filters.stats(),
+        serializer=cache_serializer.stats(),
+    )
+
+
 @backstage.route("/export", methods=["GET"])
 @login_required
-def export_data():
-
-    result = {}
-
-    # export user data
-    user_data = {}
-    user_info = user_utils.get_user_info(current_user.username)
-    user_about = user_utils.get_user_about(current_user.username)
-    user_data["username"] = user_info.username
-    user_data["email"] = user_info.email
-    user_data["blogname"] = user_info.blogname
-    if "static" in user_info.profile_img_url:
-        user_data["profile_img_url"] = ""
-    else:
-        user_data["profile_img_url"] = user_info.profile_img_url
-    if "static" in user_info.cover_url:
-        user_data["cover_url"] = ""
+def export_data() -> Response:
+    """Streams the data of the current user as a JSON or NDJSON download.
+
+    Args:
+        None
+
+    Returns:
+        Response: The export as an attachment, NDJSON if the format query argument is ndjson.
+    """
+    username = current_user.username
+    if request.args.get("format") == "ndjson":
+        chunks = data_exporter.iter_ndjson(username)
+        mimetype = "application/x-ndjson"
+        file_name = f"{username}_data.ndjson"
     else:
-        user_data["cover_url"] = user_info.cover_url
-    user_data["created_at"] = f"{user_info.created_at}"
-    user_data["short_bio"] = user_info.short_bio
-    user_data["about"] = user_about.about
-    i = 0
-    while user_info.social_links[i]:
-        user_data[f"social_link_{i}"] = (user_info.social_links[i][0], user_info.social_links[i][1])
-        i += 1
-    user_data["total_views"] = user_info.total_views
-    result["info"] = user_data
-
-    # export posts
-    post_data = {}
-    posts = post_utils.get_post_infos(current_user.username, archive="include")
-    for post in posts:
-        uid = post.get("post_uid")
-        post_data[uid] = {}
-        post_data[uid]["title"] = post.get("title")
-        post_data[uid]["subtitle"] = post.get("subtitle")
-        post_data[uid]["author"] = post.get("author")
-        post_data[uid]["content"] = mongodb.post_content.find_one({"post_uid": uid}).get("content")
-        post_data[uid]["tags"] = post.get("tags")
-        post_data[uid]["cover_url"] = post.get("cover_url")
-        post_data[uid]["custom_slug"] = post.get("custom_slug")
-        post_data[uid]["created_at"] = f"{post.get('created_at')}"
-        post_data[uid]["last_updated"] = f"{post.get('last_updated')}"
-        post_data[uid]["archived"] = post.get("archived")
-        post_data[uid]["featured"] = post.get("featured")
-        post_data[uid]["views"] = post.get("views")
-        post_data[uid]["reads"] = post.get("reads")
-    result["posts"] = post_data
-
-    # export projects
-    if user_info.gallery_enabled:
-        project_data = {}
-        projects = projects_utils.get_project_infos(current_user.username, archive="include")
-        for project in projects:
-            uid = project.get("project_uid")
-            project_data[uid] = {}
-            project_data[uid]["author"] = project.get("author")
-            project_data[uid]["title"] = project.get("title")
-            project_data[uid]["short_description"] = project.get("short_description")
-            project_data[uid]["content"] = mongodb.project_content.find_one(
-                {"project_uid": uid}
-            ).get("content")
-            project_data[uid]["tags"] = project.get("tags")
-            project_data[uid]["custom_slug"] = project.get("custom_slug")
-            i = 0
-            while project.get("images")[i]:
-                project_data[uid][f"image_{i}"] = (
-                    project.get("images")[i][0],
-                    project.get("images")[i][1],
-                )
-                i += 1
-            project_data[uid]["created_at"] = f"{project.get('created_at')}"
-            project_data[uid]["last_updated"] = f"{project.get('last_updated')}"
-            project_data[uid]["archived"] = project.get("archived")
-            project_data[uid]["views"] = project.get("views")
-            project_data[uid]["reads"] = project.get("reads")
-        result["projects"] = project_data
-
-    # export changelogs
-    if user_info.changelog_enabled:
-        changelog_data = {}
-        changelogs = changelog_utils.get_changelogs(current_user.username)
-        for changelog in changelogs:
-            uid = changelog.get("changelog_uid")
-            changelog_data[uid] = {}
-            changelog_data[uid]["author"] = changelog.get("author")
-            changelog_data[uid]["title"] = changelog.get("title")
-            changelog_data[uid]["date"] = changelog.get("date")
-            changelog_data[uid]["category"] = changelog.get("category")
-            changelog_data[uid]["content"] = changelog.get("content")
-            changelog_data[uid]["tags"] = changelog.get("tags")
-            changelog_data[uid]["link"] = changelog.get("link")
-            changelog_data[uid]["link_description"] = changelog.get("link_description")
-            changelog_data[uid]["created_at"] = f"{changelog.get('created_at')}"
-            changelog_data[uid]["last_updated"] = f"{changelog.get('last_updated')}"
-            changelog_data[uid]["archived"] = changelog.get("archived")
-        result["changelogs"] = changelog_data
-
-    json_data = json.dumps(result, indent=4, ensure_ascii=False)
-
-    # Create a virtual file to serve as a download
-    buffer = io.BytesIO()
-    buffer.write(json_data.encode("utf-8"))
-    buffer.seek(0)
-
-    # Serve the JSON file as an attachment
-    file_name = f"{current_user.username}_data.json"
-    return send_file(
-        buffer, mimetype="application/json", as_attachment=True, download_name=file_name
+        chunks = data_exporter.iter_json(username)
+        mimetype = "application/json"
+        file_name = f"{username}_data.json"
+
+    # Stream the export so that only one batch of documents is held in memory at a time
+    logger.debug(f"Exporting data of user {username}.")
+    return Response(
+        stream_with_context(chunk.encode("utf-8") for chunk in chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
     )
+
+
+@backstage.route("/import", methods=["POST"])
+@login_required
+def import_data() -> Response:
+    """Imports an export file into the account of the current user.
+
+    Args:
+        None
+
+    Returns:
+        Response: Redirects to the settings panel.
+    """
+    form = ImportDataForm(prefix="import")
+    if form.validate_on_submit():
+        username = current_user.username
+        upload = form.file.data
+        report = data_importer.import_stream(
+            username, upload.stream, ndjson=upload.filename.endswith(".ndjson")
+        )
+        page_cache.purge(f"user:{username}")
+
+        imported = ", ".join(f"{num} {kind}(s)" for kind, num in report.imported.items())
+        flash(f"Imported {imported}.", category="success")
+        if report.skipped:
+            flash(f"Skipped {report.skipped} record(s) imported before.", category="success")
+        for reason in report.invalid[:5]:
+            flash(f"Invalid record {reason}", category="error")
+        if len(report.invalid) > 5:
+            flash(f"{len(report.invalid) - 5} more invalid record(s).", category="error")
+        if report.error:
+            flash(
+                f"Import stopped early: {report.error} Upload the same file again to resume.",
+                category="error",
+            )
+    flashing_if_errors(form.errors)
+
+    return redirect(url_for("backstage.settings_panel"))
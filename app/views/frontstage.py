@@ -1,6 +1,6 @@
+from datetime import datetime, timezone
 from urllib.parse import unquote
 
-import readtime
 from flask import (
     Blueprint,
     Request,
@@ -13,29 +13,228 @@ from flask import (
     url_for,
 )
 
+from app.cache import conditional_get, page_cache
 from app.config import TEMPLATE_FOLDER
 from app.forms.comments import CommentForm
 from app.helpers.changelog import changelog_utils
 from app.helpers.comments import comment_utils, create_comment
+from app.helpers.filters import key_filters
 from app.helpers.posts import post_utils
 from app.helpers.projects import projects_utils
+from app.helpers.tags import tag_index
 from app.helpers.users import user_utils
 from app.helpers.utils import (
     Paging,
     convert_about,
-    convert_post_content,
-    convert_project_content,
     convert_changelog_content,
+    convert_project_content,
     sort_dict,
 )
 from app.logging import logger, logger_utils
-from app.mongo import mongodb
+from app.models.users import UserInfo
+from app.mongo import PROJECTIONS, mongodb
+from app.renderer import RENDERER_VERSION
 from app.views.main import flashing_if_errors
 
 frontstage = Blueprint("frontstage", __name__, template_folder=TEMPLATE_FOLDER)
 
 
+def user_page_tags(username: str, **kwargs) -> list[str]:
+    """Surrogate tags of a page showing a user's content.
+
+    Args:
+        username (str): The username of the user.
+
+    Returns:
+        list[str]: The page cache tags.
+    """
+    return [f"user:{username}"]
+
+
+def post_page_tags(username: str, post_uid: str, **kwargs) -> list[str]:
+    """Surrogate tags of a blog post page.
+
+    Args:
+        username (str): The username of the post author.
+        post_uid (str): The unique identifier of the post.
+
+    Returns:
+        list[str]: The page cache tags.
+    """
+    return [f"user:{username}", f"post:{post_uid}"]
+
+
+def project_page_tags(username: str, project_uid: str, **kwargs) -> list[str]:
+    """Surrogate tags of a project page.
+
+    Args:
+        username (str): The username of the project author.
+        project_uid (str): The unique identifier of the project.
+
+    Returns:
+        list[str]: The page cache tags.
+    """
+    return [f"user:{username}", f"project:{project_uid}"]
+
+
+def count_visit(username: str, **kwargs) -> None:
+    """Record a visit to a page served from the page cache.
+
+    Args:
+        username (str): The username of the user whose page was visited.
+    """
+    logger_utils.page_visited(request)
+    user_utils.total_view_increment(username)
+
+
+def count_post_visit(username: str, post_uid: str, **kwargs) -> None:
+    """Record a visit to a blog post page served from the page cache.
+
+    Args:
+        username (str): The username of the post author.
+        post_uid (str): The unique identifier of the post.
+    """
+    count_visit(username)
+    post_utils.view_increment(post_uid)
+
+
+def count_project_visit(username: str, project_uid: str, **kwargs) -> None:
+    """Record a visit to a project page served from the page cache.
+
+    Args:
+        username (str): The username of the project author.
+        project_uid (str): The unique identifier of the project.
+    """
+    count_visit(username)
+    projects_utils.view_increment(project_uid)
+
+
+def last_modified(user: UserInfo, *times: datetime | None) -> datetime:
+    """The latest of the last update of a user and the given times.
+
+    Args:
+        user (UserInfo): The user.
+        *times (datetime | None): The last updates of the other documents a page is derived from.
+
+    Returns:
+        datetime: The latest time, in UTC.
+    """
+    times = [user.last_updated or user.created_at, *times]
+    return max(
+        time if time.tzinfo is not None else time.replace(tzinfo=timezone.utc)
+        for time in times
+        if time is not None
+    )
+
+
+def post_validators(
+    username: str, post_uid: str, slug: str | None = None, **kwargs
+) -> tuple[list, None] | None:
+    """Versions a blog post page is derived from.
+
+    The page embeds the comment form, so it is validated by its ETag only.
+
+    Args:
+        username (str): The username of the post author.
+        post_uid (str): The unique identifier of the post.
+        slug (str | None): The slug in the URL, if any.
+
+    Returns:
+        tuple[list, None] | None: The versions, or None if the request is not answered with
+            the post page.
+    """
+    user = user_utils.get_cached_user_info(username)
+    if user is None or not key_filters.might_exist("post_uid", post_uid):
+        return None
+    post_info = mongodb.post_info.find_one({"post_uid": post_uid}, PROJECTIONS["post_validators"])
+    if post_info is None or post_info.get("author") != username:
+        return None
+    if (post_info.get("custom_slug") or None) != slug:
+        return None
+    comment_count = post_info.get("comment_count")
+    if comment_count is None:
+        # posts written before comment_count was introduced, until backfilled
+        comment_count = comment_utils.count_comments([post_uid]).get(post_uid, 0)
+    versions = [user.version, RENDERER_VERSION, post_info.get("last_updated"), comment_count]
+    return versions, None
+
+
+def project_validators(
+    username: str, project_uid: str, slug: str | None = None, **kwargs
+) -> tuple[list, None] | None:
+    """Versions a project page is derived from, and the time of its last change.
+
+    Args:
+        username (str): The username of the project author.
+        project_uid (str): The unique identifier of the project.
+        slug (str | None): The slug in the URL, if any.
+
+    Returns:
+        tuple[list, datetime] | None: The versions and the last update of the user or the
+            project, or None if the request is not answered with the project page.
+    """
+    user = user_utils.get_cached_user_info(username)
+    if user is None or not key_filters.might_exist("project_uid", project_uid):
+        return None
+    project_info = mongodb.project_info.find_one(
+        {"project_uid": project_uid}, PROJECTIONS["project_validators"]
+    )
+    if project_info is None or project_info.get("author") != username:
+        return None
+    if (project_info.get("custom_slug") or None) != slug:
+        return None
+    versions = [user.version, RENDERER_VERSION, project_info.get("last_updated")]
+    return versions, last_modified(user, project_info.get("last_updated"))
+
+
+def changelog_validators(username: str, **kwargs) -> tuple[list, datetime | None] | None:
+    """Versions a changelog page is derived from, and the time of its last change.
+
+    Changelogs archived or deleted move no time of their own, only the version and the last
+    update of the user along with its counters. Until the counters of the user have been
+    computed, the page is validated by its ETag only.
+
+    Args:
+        username (str): The username of the user.
+
+    Returns:
+        tuple[list, datetime | None] | None: The versions and the last update of the user or
+            a changelog, or None if the request is not answered with the changelog page.
+    """
+    user = user_utils.get_cached_user_info(username)
+    if user is None or not user.changelog_enabled:
+        return None
+    changelogs = mongodb.changelog.find(
+        {"author": username, "archived": False}, PROJECTIONS["changelog_validators"]
+    ).as_list()
+    entries = sorted((log.get("changelog_uid"), log.get("last_updated")) for log in changelogs)
+    versions = [user.version, RENDERER_VERSION, entries]
+    if "changelog" not in (user.counts or {}):
+        return versions, None
+    return versions, last_modified(user, *(log.get("last_updated") for log in changelogs))
+
+
+def about_validators(username: str, **kwargs) -> tuple[list, datetime] | None:
+    """Versions an about page is derived from, and the time of its last change.
+
+    The about is written along with a bump of the user version. The total view count shown on
+    the page is left out, and may lag behind on pages validated by the client.
+
+    Args:
+        username (str): The username of the user.
+
+    Returns:
+        tuple[list, datetime] | None: The versions and the last update of the user, or None if
+            there is no such user.
+    """
+    user = user_utils.get_cached_user_info(username)
+    if user is None:
+        return None
+    return [user.version, RENDERER_VERSION], last_modified(user)
+
+
 @frontstage.route("/@<username>", methods=["GET"])
+@page_cache.cached(tags=user_page_tags, on_hit=count_visit)
 def home(username: str) -> str:
     """Render the home page for a given user.
 
@@ -45,7 +244,7 @@ def home(username: str) -> str:
     Returns:
         str: Rendered HTML of the home page.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
 
@@ -59,6 +258,7 @@ def home(username: str) -> str:
 
 
 @frontstage.route("/@<username>/blog", methods=["GET"])
+@page_cache.cached(tags=user_page_tags, on_hit=count_visit)
 def blog(username: str) -> str:
     """Render the blog page for a given user with pagination.
 
@@ -68,20 +268,26 @@ def blog(username: str) -> str:
     Returns:
         str: Rendered HTML of the blog page.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
 
+    user = user_utils.get_cached_user_info(username)
+
     current_page = request.args.get("page", default=1, type=int)
     POSTS_EACH_PAGE = 5
     paging = Paging(mongodb)
-    pagination = paging.setup(username, "post_info", current_page, POSTS_EACH_PAGE)
+    pagination = paging.setup(
+        username, "post_info", current_page, POSTS_EACH_PAGE, counts=user.counts
+    )
 
     posts = post_utils.get_post_infos_with_pagination(
-        username=username, page_number=current_page, posts_per_page=POSTS_EACH_PAGE
+        username=username,
+        page_number=current_page,
+        posts_per_page=POSTS_EACH_PAGE,
+        projection=PROJECTIONS["post_card"],
     )
 
-    user = user_utils.get_user_info(username)
     tags = sort_dict(user.tags)
     tags = {tag: count for tag, count in tags.items() if count > 0}
 
@@ -105,14 +311,12 @@ def blogpost_main_actions(username: str, post_uid: str, request: Request) -> str
         str: Rendered HTML of the blog post page.
     """
     author = mongodb.user_info.find_one({"username": username})
-    post = post_utils.get_full_post(post_uid)
-
-    post["content"] = convert_post_content(post.get("content"))
-    post["readtime"] = str(readtime.of_html(post.get("content")))
+    post = post_utils.get_rendered_post(post_uid)
 
     form = CommentForm()
     if form.validate_on_submit():
         create_comment(post_uid, form)
+        page_cache.purge(f"post:{post_uid}")
         flash("Comment published!", category="success")
     flashing_if_errors(form.errors)
 
@@ -128,6 +332,8 @@ def blogpost_main_actions(username: str, post_uid: str, request: Request) -> str
 
 
 @frontstage.route("/@<username>/posts/<post_uid>", methods=["GET", "POST"])
+@conditional_get.validated(post_validators, on_match=count_post_visit, forms=True)
+@page_cache.cached(tags=post_page_tags, on_hit=count_post_visit)
 def blogpost(username: str, post_uid: str) -> str:
     """Render a blog post page, optionally redirecting if a slug is present.
 
@@ -138,14 +344,16 @@ def blogpost(username: str, post_uid: str) -> str:
     Returns:
         str: Rendered HTML of the blog post page or redirect to the slugged URL.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
-    if not mongodb.post_info.exists("post_uid", post_uid):
+    if not key_filters.might_exist("post_uid", post_uid):
+        logger.debug(f"Invalid post uid {post_uid}.")
+        abort(404)
+    post_info = mongodb.post_info.find_one({"post_uid": post_uid}, PROJECTIONS["post_owner"])
+    if post_info is None:
         logger.debug(f"Invalid post uid {post_uid}.")
         abort(404)
-
-    post_info = mongodb.post_info.find_one({"post_uid": post_uid})
     if username != post_info.get("author"):
         logger.debug(f"User {username} does not own post {post_uid}.")
         abort(404)
@@ -165,6 +373,8 @@ def blogpost(username: str, post_uid: str) -> str:
 
 
 @frontstage.route("/@<username>/posts/<post_uid>/<slug>", methods=["GET", "POST"])
+@conditional_get.validated(post_validators, on_match=count_post_visit, forms=True)
+@page_cache.cached(tags=post_page_tags, on_hit=count_post_visit)
 def blogpost_with_slug(username: str, post_uid: str, slug: str) -> str:
     """Render a blog post page with a slug, or redirect if the slug does not match.
 
@@ -176,14 +386,16 @@ def blogpost_with_slug(username: str, post_uid: str, slug: str) -> str:
     Returns:
         str: Rendered HTML of the blog post page or redirect to the correct slug URL.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
-    if not mongodb.post_info.exists("post_uid", post_uid):
+    if not key_filters.might_exist("post_uid", post_uid):
+        logger.debug(f"Invalid post uid {post_uid}.")
+        abort(404)
+    post_info = mongodb.post_info.find_one({"post_uid": post_uid}, PROJECTIONS["post_owner"])
+    if post_info is None:
         logger.debug(f"Invalid post uid {post_uid}.")
         abort(404)
-
-    post_info = mongodb.post_info.find_one({"post_uid": post_uid})
     if username != post_info.get("author"):
         logger.debug(f"User {username} does not own post {post_uid}.")
         abort(404)
@@ -203,6 +415,7 @@ def blogpost_with_slug(username: str, post_uid: str, slug: str) -> str:
 
 
 @frontstage.route("/@<username>/tags", methods=["GET"])
+@page_cache.cached(tags=user_page_tags, on_hit=count_visit)
 def tag(username: str) -> str:
     """Render a page showing posts and projects with a specified tag.
 
@@ -212,7 +425,7 @@ def tag(username: str) -> str:
     Returns:
         str: Rendered HTML of the tag page.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
 
@@ -221,13 +434,24 @@ def tag(username: str) -> str:
         return redirect(url_for("frontstage.blog", username=username))
 
     tag = unquote(tag_url_encoded)
-    user = user_utils.get_user_info(username)
+    user = user_utils.get_cached_user_info(username)
+    entry = tag_index.get_entry(username, tag)
 
-    posts = post_utils.get_post_infos(username)
-    posts_with_desired_tag = [post for post in posts if tag in post.get("tags")]
+    current_page = request.args.get("page", default=1, type=int)
+    TAGGED_EACH_PAGE = 5
+    # page through whichever of posts and projects has more documents with the tag
+    longer = max(entry["counts"], key=lambda database: entry["counts"][database]["active"])
+    paging = Paging(mongodb)
+    pagination = paging.setup(
+        username, longer, current_page, TAGGED_EACH_PAGE, counts=entry["counts"]
+    )
 
-    projects = projects_utils.get_project_infos(username)
-    projects_with_desired_tag = [project for project in projects if tag in project.get("tags")]
+    posts = tag_index.find_tagged(
+        "post_info", entry, current_page, TAGGED_EACH_PAGE, PROJECTIONS["post_card"]
+    )
+    projects = tag_index.find_tagged(
+        "project_info", entry, current_page, TAGGED_EACH_PAGE, PROJECTIONS["project_card"]
+    )
 
     logger_utils.page_visited(request)
     user_utils.total_view_increment(username)
@@ -235,13 +459,16 @@ def tag(username: str) -> str:
     return render_template(
         "frontstage/tag.html",
         user=user,
-        posts=posts_with_desired_tag,
-        projects=projects_with_desired_tag,
+        posts=posts,
+        projects=projects,
         tag=tag,
+        counts=entry["counts"],
+        pagination=pagination,
     )
 
 
 @frontstage.route("/@<username>/gallery", methods=["GET"])
+@page_cache.cached(tags=user_page_tags, on_hit=count_visit)
 def gallery(username: str) -> str:
     """Render the gallery page for a given user.
 
@@ -251,10 +478,10 @@ def gallery(username: str) -> str:
     Returns:
         str: Rendered HTML of the gallery page.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
-    user = user_utils.get_user_info(username)
+    user = user_utils.get_cached_user_info(username)
     if not user.gallery_enabled:
         logger.debug(f"User {username} did not enable gallery feature.")
         abort(404)
@@ -262,12 +489,15 @@ def gallery(username: str) -> str:
     current_page = request.args.get("page", default=1, type=int)
     PROJECTS_EACH_PAGE = 12
     paging = Paging(mongodb)
-    pagination = paging.setup(username, "project_info", current_page, PROJECTS_EACH_PAGE)
+    pagination = paging.setup(
+        username, "project_info", current_page, PROJECTS_EACH_PAGE, counts=user.counts
+    )
 
     projects = projects_utils.get_project_infos_with_pagination(
         username=username,
         page_number=current_page,
         projects_per_page=PROJECTS_EACH_PAGE,
+        projection=PROJECTIONS["project_card"],
     )
     for project in projects:
         project["created_at"] = project.get("created_at").strftime("%Y-%m-%d")
@@ -303,6 +533,8 @@ def project_main_actions(username: str, project_uid: str, request: Request) -> s
 
 
 @frontstage.route("/@<username>/project/<project_uid>", methods=["GET"])
+@conditional_get.validated(project_validators, on_match=count_project_visit)
+@page_cache.cached(tags=project_page_tags, on_hit=count_project_visit)
 def project(username: str, project_uid: str) -> str:
     """Render a project page, optionally redirecting if a slug is present.
 
@@ -313,14 +545,18 @@ def project(username: str, project_uid: str) -> str:
     Returns:
         str: Rendered HTML of the project page or redirect to the slugged URL.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
-    if not mongodb.project_info.exists("project_uid", project_uid):
+    if not key_filters.might_exist("project_uid", project_uid):
+        logger.debug(f"Invalid project uid {project_uid}.")
+        abort(404)
+    project_info = mongodb.project_info.find_one(
+        {"project_uid": project_uid}, PROJECTIONS["project_owner"]
+    )
+    if project_info is None:
         logger.debug(f"Invalid project uid {project_uid}.")
         abort(404)
-
-    project_info = mongodb.project_info.find_one({"project_uid": project_uid})
     if username != project_info.get("author"):
         logger.debug(f"User {username} does not own project {project_uid}.")
         abort(404)
@@ -340,6 +576,8 @@ def project(username: str, project_uid: str) -> str:
 
 
 @frontstage.route("/@<username>/project/<project_uid>/<slug>", methods=["GET"])
+@conditional_get.validated(project_validators, on_match=count_project_visit)
+@page_cache.cached(tags=project_page_tags, on_hit=count_project_visit)
 def project_with_slug(username: str, project_uid: str, slug: str) -> str:
     """Render a project page with a slug, or redirect if the slug does not match.
 
@@ -351,14 +589,18 @@ def project_with_slug(username: str, project_uid: str, slug: str) -> str:
     Returns:
         str: Rendered HTML of the project page or redirect to the correct slug URL.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
-    if not mongodb.project_info.exists("project_uid", project_uid):
+    if not key_filters.might_exist("project_uid", project_uid):
+        logger.debug(f"Invalid project uid {project_uid}.")
+        abort(404)
+    project_info = mongodb.project_info.find_one(
+        {"project_uid": project_uid}, PROJECTIONS["project_owner"]
+    )
+    if project_info is None:
         logger.debug(f"Invalid project uid {project_uid}.")
         abort(404)
-
-    project_info = mongodb.project_info.find_one({"project_uid": project_uid})
     if username != project_info.get("author"):
         logger.debug(f"User {username} does not own project {project_uid}.")
         abort(404)
@@ -378,6 +620,8 @@ def project_with_slug(username: str, project_uid: str, slug: str) -> str:
 
 
 @frontstage.route("/@<username>/changelog", methods=["GET"])
+@conditional_get.validated(changelog_validators)
+@page_cache.cached(tags=user_page_tags)
 def changelog(username: str) -> str:
     """Render the changelog page for a given user.
 
@@ -387,10 +631,10 @@ def changelog(username: str) -> str:
     Returns:
         str: Rendered HTML of the changelog page.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
-    user = user_utils.get_user_info(username)
+    user = user_utils.get_cached_user_info(username)
     if not user.changelog_enabled:
         logger.debug(f"User {username} did not enable changelog feature.")
         abort(404)
@@ -403,6 +647,8 @@ def changelog(username: str) -> str:
 
 
 @frontstage.route("/@<username>/about", methods=["GET"])
+@conditional_get.validated(about_validators, on_match=count_visit)
+@page_cache.cached(tags=user_page_tags, on_hit=count_visit)
 def about(username: str) -> str:
     """Render the about page for a given user.
 
@@ -412,7 +658,7 @@ def about(username: str) -> str:
     Returns:
         str: Rendered HTML of the about page.
     """
-    if not mongodb.user_info.exists("username", username):
+    if not user_utils.user_exists(username):
         logger.debug(f"Invalid username {username}.")
         abort(404)
 
@@ -436,7 +682,7 @@ def get_profile_img(username: str) -> str:
     Returns:
         str: JSON response containing the profile image URL. Retrieve with key 'imageUrl'.
     """
-    user = user_utils.get_user_info(username)
+    user = user_utils.get_cached_user_info(username)
     return jsonify({"imageUrl": user.profile_img_url})
 
 
@@ -449,10 +695,13 @@ def is_unique() -> str:
     """
     email = request.args.get("email", default=None, type=str)
     username = request.args.get("username", default=None, type=str)
+    # a definite miss of the key filters is unique without a database query
     if email is not None:
+        if not key_filters.might_exist("email", email):
+            return jsonify(True)
         return jsonify(not mongodb.user_info.exists(key="email", value=email))
     elif username is not None:
-        return jsonify(not mongodb.user_info.exists(key="username", value=username))
+        return jsonify(not user_utils.user_exists(username))
 
 
 @frontstage.route("/readcount-increment", methods=["GET"])
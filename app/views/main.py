@@ -1,13 +1,23 @@
-from datetime import timezone
+from collections.abc import Iterator
 
 import bcrypt
-from flask import Blueprint, flash, make_response, redirect, render_template, request, url_for
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    flash,
+    redirect,
+    render_template,
+    request,
+    stream_template,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user, login_user
 
-from app.config import DOMAIN, TEMPLATE_FOLDER
+from app.config import TEMPLATE_FOLDER
 from app.forms.users import LoginForm, SignUpForm
-from app.helpers.posts import post_utils
-from app.helpers.projects import projects_utils
+from app.helpers.sitemap import sitemap_builder
 from app.helpers.users import user_utils
 from app.logging import logger, logger_utils
 from app.mongo import mongodb
@@ -74,7 +84,7 @@ def login() -> str:
             return render_template("main/login.html", form=form)
 
         username = user_creds.get("username")
-        user_info = user_utils.get_user_info(username)
+        user_info = user_utils.get_cached_user_info(username)
         login_user(user_info)
         logger_utils.login_succeeded(request=request, username=username)
         flash("Login Succeeded.", category="success")
@@ -139,62 +149,57 @@ def robotstxt() -> str:
 @main.route("/sitemap")
 @main.route("/sitemap/")
 @main.route("/sitemap.xml")
-def sitemap() -> str:
-    """Generate and serve a sitemap of the website/application.
+def sitemap() -> Response:
+    """Serve the sitemap index, listing the sitemap shards of every user.
 
     Returns:
-        str: XML content of the sitemap.
+        Response: XML content of the sitemap index.
     """
-    base_url = f"https://{DOMAIN}"
-
-    # Static routes
-    static_urls = [{"loc": f"{base_url}/{route}"} for route in ["", "login", "register"]]
-
-    # Dynamic routes
-    dynamic_urls = []
-    for username in user_utils.get_all_username():
-        dynamic_urls.extend(
-            [
-                {"loc": f"{base_url}@{username}"},
-                {"loc": f"{base_url}/@{username}/blog"},
-                {"loc": f"{base_url}/@{username}/about"},
-            ]
-        )
-    for username in user_utils.get_all_username_gallery_enabled():
-        dynamic_urls.append({"loc": f"{base_url}/@{username}/gallery"})
-    for username in user_utils.get_all_username_changelog_enabled():
-        dynamic_urls.append({"loc": f"{base_url}/@{username}/changelog"})
-
-    for post in post_utils.get_all_posts_info():
-        slug = post.get("custom_slug")
-        lastmod = (
-            post.get("last_updated").replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S%z")
-        )
-        lastmod = lastmod[:-2] + ":" + lastmod[-2:]
-        url = {
-            "loc": f"{base_url}/@{post.get('author')}/posts/{post.get('post_uid')}/{slug if slug else ''}",
-            "lastmod": lastmod,
-        }
-        dynamic_urls.append(url)
-
-    for project in projects_utils.get_all_projects_info():
-        slug = project.get("custom_slug")
-        logger.debug(project.get("last_updated"))
-        lastmod = (
-            project.get("last_updated").replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    def render() -> Iterator[str]:
+        return stream_template(
+            "main/sitemap-index.xml",
+            base_url=sitemap_builder.base_url,
+            shards=sitemap_builder.shards(),
         )
-        lastmod = lastmod[:-2] + ":" + lastmod[-2:]
-        url = {
-            "loc": f"{base_url}/@{project.get('author')}/projects/{project.get('project_uid')}/{slug if slug else ''}",
-            "lastmod": lastmod,
-        }
-        dynamic_urls.append(url)
-
-    xml_sitemap = render_template(
-        "main/sitemap.xml", static_urls=static_urls, dynamic_urls=dynamic_urls
+
+    chunks = sitemap_builder.cached("sitemap:index", None, render, sitemap_builder.index_timeout)
+    return Response(stream_with_context(chunks), mimetype="application/xml")
+
+
+@main.route("/sitemap/main.xml")
+def sitemap_main() -> Response:
+    """Serve the sitemap shard of the pages shared by every user.
+
+    Returns:
+        Response: XML content of the sitemap shard.
+    """
+    return Response(
+        render_template("main/sitemap.xml", urls=sitemap_builder.static_urls()),
+        mimetype="application/xml",
     )
-    response = make_response(xml_sitemap)
-    response.headers["Content-Type"] = "application/xml"
-    logger.debug("Sitemap generated successfully.")
 
-    return response
+
+@main.route("/sitemap/<username>/<int:page>.xml")
+def sitemap_shard(username: str, page: int) -> Response:
+    """Serve a sitemap shard of a user.
+
+    Args:
+        username (str): The username.
+        page (int): The page number of the shard, starting from 1.
+
+    Returns:
+        Response: XML content of the sitemap shard.
+    """
+    # out of range pages are not rendered, so that they never reach the cache
+    if not 1 <= page <= sitemap_builder.shard_count(username):
+        abort(404)
+    fingerprint = sitemap_builder.shard_fingerprint(username)
+    if fingerprint is None:
+        abort(404)
+
+    def render() -> Iterator[str]:
+        return stream_template("main/sitemap.xml", urls=sitemap_builder.shard_urls(username, page))
+
+    chunks = sitemap_builder.cached(f"sitemap:{username}:{page}", fingerprint, render)
+    return Response(stream_with_context(chunks), mimetype="application/xml")
@@ -0,0 +1,354 @@
+"""Offline benchmark of the markdown-to-HTML pipeline.
+
+Builds synthetic post corpora of increasing size and times every stage of the rendering
+pipeline: the plain Markdown conversion, each HTMLFormatter pass with its parse and to_string,
+the treeprocessor-based convert_post_content path and readtime.of_html. Results are written as
+JSON and can be compared against a stored baseline.
+
+Usage:
+    python -m benchmarks.markdown_pipeline --output results.json
+    python -m benchmarks.markdown_pipeline --sizes 1KB 100KB --baseline results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable
+
+os.environ.setdefault("ENV", "dev")
+
+import markdown
+import readtime
+from markdown import Markdown
+
+from app.helpers.utils import markdown_pool
+from app.renderer import MARKDOWN_PROFILES, RENDERER_VERSION, HTMLFormatter
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 * 1024}
+DEFAULT_SIZES = ["1KB", "10KB", "100KB", "1MB", "5MB"]
+PERCENTILES = (50, 90, 99)
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut "
+    "labore et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris"
+).split()
+
+
+##################################################################################################
+
+# corpus
+
+##################################################################################################
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a human readable size such as 10KB or 5MB.
+
+    Args:
+        size (str): The size string.
+
+    Returns:
+        int: The size in bytes.
+    """
+    size = size.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[: -len(unit)]) * factor)
+    return int(size)
+
+
+def _sentence(rng: random.Random, link_ratio: float) -> str:
+    """
+    Build a sentence of filler words, sometimes with an inline link.
+
+    Args:
+        rng (random.Random): The random generator.
+        link_ratio (float): The probability of adding a link.
+
+    Returns:
+        str: The sentence.
+    """
+    words = rng.choices(WORDS, k=rng.randint(6, 18))
+    if rng.random() < link_ratio:
+        position = rng.randrange(len(words))
+        words[position] = f"[{words[position]}](https://example.com/{rng.randint(1, 9999)})"
+    return " ".join(words).capitalize() + "."
+
+
+def build_corpus(size: int, seed: int, mix: dict[str, float]) -> str:
+    """
+    Build a synthetic markdown post of about the given size.
+
+    Args:
+        size (int): The target size in bytes.
+        seed (int): The random seed, so that corpora are reproducible.
+        mix (dict[str, float]): The probability of each kind of block after a paragraph.
+
+    Returns:
+        str: The markdown content.
+    """
+    rng = random.Random(seed)
+    blocks = []
+    footnotes = []
+    length = 0
+    while length < size:
+        paragraph = " ".join(_sentence(rng, mix["links"]) for _ in range(rng.randint(2, 6)))
+        if rng.random() < mix["footnotes"]:
+            label = f"n{len(footnotes) + 1}"
+            paragraph += f"[^{label}]"
+            footnotes.append(f"[^{label}]: {_sentence(rng, mix['links'])}")
+        block = [paragraph]
+
+        if rng.random() < mix["headings"]:
+            block.insert(0, "#" * rng.randint(1, 3) + " " + _sentence(rng, 0).rstrip("."))
+        if rng.random() < mix["figures"]:
+            number = rng.randint(1, 9999)
+            block.append(f"![Figure {number}](https://example.com/img/{number}.png)")
+        if rng.random() < mix["code"]:
+            lines = [f"    value_{i} = compute({i}, '{rng.choice(WORDS)}')" for i in range(8)]
+            block.append("```python\ndef example():\n" + "\n".join(lines) + "\n```")
+
+        text = "\n\n".join(block)
+        blocks.append(text)
+        length += len(text.encode("utf-8")) + 2
+
+    return "\n\n".join(blocks + footnotes) + "\n"
+
+
+##################################################################################################
+
+# measurement
+
+##################################################################################################
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """
+    Summarize timing samples.
+
+    Args:
+        samples (list[float]): The timings in seconds.
+
+    Returns:
+        dict[str, float]: The percentiles, mean, min and max in milliseconds.
+    """
+    ordered = sorted(samples)
+    summary = {}
+    for percentile in PERCENTILES:
+        rank = percentile / 100 * (len(ordered) - 1)
+        lower = int(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        value = ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+        summary[f"p{percentile}_ms"] = round(value * 1000, 4)
+    summary["mean_ms"] = round(statistics.fmean(ordered) * 1000, 4)
+    summary["min_ms"] = round(ordered[0] * 1000, 4)
+    summary["max_ms"] = round(ordered[-1] * 1000, 4)
+    return summary
+
+
+def run_stages(content: str) -> dict[str, float]:
+    """
+    Run the pipeline once, timing every stage.
+
+    Args:
+        content (str): The markdown content of a post.
+
+    Returns:
+        dict[str, float]: The time of each stage in seconds.
+    """
+    timings = {}
+
+    def timed(name: str, func: Callable[[], object]) -> object:
+        start = time.perf_counter()
+        result = func()
+        timings[name] = time.perf_counter() - start
+        return result
+
+    extensions, _ = MARKDOWN_PROFILES["post"]
+    source = "[TOC]\r\n\r\n" + content
+    html = timed("markdown_convert", lambda: Markdown(extensions=extensions).convert(source))
+
+    formatter = timed("formatter_parse", lambda: HTMLFormatter(html))
+    for name in ("add_padding", "change_headings", "modify_figure", "modify_hyperlink"):
+        timed(f"formatter_{name}", getattr(formatter, name))
+    formatted = timed("formatter_to_string", formatter.to_string)
+
+    timed("pipeline_convert", lambda: markdown_pool.convert("post", source))
+    timed("readtime_of_html", lambda: readtime.of_html(formatted))
+    return timings
+
+
+def peak_memory(content: str) -> dict[str, int]:
+    """
+    Measure the peak memory allocated by each stage.
+
+    Args:
+        content (str): The markdown content of a post.
+
+    Returns:
+        dict[str, int]: The peak allocation of each stage in bytes.
+    """
+    peaks = {}
+
+    def traced(name: str, func: Callable[[], object]) -> object:
+        tracemalloc.start()
+        try:
+            result = func()
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return result
+
+    extensions, _ = MARKDOWN_PROFILES["post"]
+    source = "[TOC]\r\n\r\n" + content
+    html = traced("markdown_convert", lambda: Markdown(extensions=extensions).convert(source))
+
+    def legacy_formatter() -> str:
+        formatter = HTMLFormatter(html)
+        formatter.add_padding().change_headings().modify_figure().modify_hyperlink()
+        return formatter.to_string()
+
+    formatted = traced("formatter_total", legacy_formatter)
+    traced("pipeline_convert", lambda: markdown_pool.convert("post", source))
+    traced("readtime_of_html", lambda: readtime.of_html(formatted))
+    return peaks
+
+
+def benchmark(sizes: list[str], repeat: int, warmup: int, seed: int, mix: dict) -> dict:
+    """
+    Benchmark the pipeline over corpora of the given sizes.
+
+    Args:
+        sizes (list[str]): The corpus sizes, e.g. 1KB or 5MB.
+        repeat (int): The number of timed runs per size.
+        warmup (int): The number of untimed runs per size.
+        seed (int): The random seed of the corpora.
+        mix (dict): The probability of each kind of block.
+
+    Returns:
+        dict: The benchmark report.
+    """
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "markdown": markdown.__version__,
+            "renderer_version": RENDERER_VERSION,
+            "repeat": repeat,
+            "warmup": warmup,
+            "seed": seed,
+            "mix": mix,
+        },
+        "results": {},
+    }
+
+    for size in sizes:
+        content = build_corpus(parse_size(size), seed, mix)
+        for _ in range(warmup):
+            run_stages(content)
+        samples = {}
+        for _ in range(repeat):
+            for stage, seconds in run_stages(content).items():
+                samples.setdefault(stage, []).append(seconds)
+
+        report["results"][size] = {
+            "bytes": len(content.encode("utf-8")),
+            "stages": {stage: summarize(values) for stage, values in samples.items()},
+            "peak_memory_bytes": peak_memory(content),
+        }
+        print(f"benchmarked {size}", file=sys.stderr)
+
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compare the median timings of a report against a baseline.
+
+    Args:
+        report (dict): The current report.
+        baseline (dict): The baseline report.
+        threshold (float): The slowdown ratio above which a stage counts as a regression.
+
+    Returns:
+        list[str]: One line per stage and size, regressions marked with an exclamation mark.
+    """
+    lines = []
+    for size, result in report["results"].items():
+        base_result = baseline.get("results", {}).get(size)
+        if base_result is None:
+            continue
+        for stage, summary in result["stages"].items():
+            base_summary = base_result["stages"].get(stage)
+            if not base_summary or not base_summary["p50_ms"]:
+                continue
+            ratio = summary["p50_ms"] / base_summary["p50_ms"]
+            mark = "!" if ratio > threshold else " "
+            lines.append(
+                f"{mark} {size:>6} {stage:<28} {base_summary['p50_ms']:>12.3f} ms"
+                f" -> {summary['p50_ms']:>12.3f} ms  x{ratio:.2f}"
+            )
+    return lines
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run the benchmark from the command line.
+
+    Args:
+        argv (list[str] | None): The command line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: The exit code, 1 if a regression against the baseline was found.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--headings", type=float, default=0.2)
+    parser.add_argument("--figures", type=float, default=0.1)
+    parser.add_argument("--footnotes", type=float, default=0.1)
+    parser.add_argument("--code", type=float, default=0.1)
+    parser.add_argument("--links", type=float, default=0.3)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against a stored JSON report")
+    parser.add_argument("--threshold", type=float, default=1.10)
+    args = parser.parse_args(argv)
+
+    mix = {
+        "headings": args.headings,
+        "figures": args.figures,
+        "footnotes": args.footnotes,
+        "code": args.code,
+        "links": args.links,
+    }
+    report = benchmark(args.sizes, args.repeat, args.warmup, args.seed, mix)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            lines = compare(report, json.load(file), args.threshold)
+        print("\n".join(lines), file=sys.stderr)
+        if any(line.startswith("!") for line in lines):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""Offline micro-benchmark of UID generation.
+
+Compares the former generate-then-probe loop, which issued one database round trip per attempt,
+with UIDGenerator.generate, which relies on the unique index and retries on DuplicateKeyError.
+It measures generation throughput in process, counts collisions of new UIDs against a simulated
+collection of existing documents, and models the round trips and latency per insert.
+
+Usage:
+    python -m benchmarks.uid_generation --existing 10000000 --inserts 1000000
+    python -m benchmarks.uid_generation --existing 100000 --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+os.environ.setdefault("ENV", "dev")
+
+from app.config import UID_INSERT_ATTEMPTS
+from app.helpers.utils import UIDGenerator
+
+ALPHABET = string.ascii_lowercase + string.digits
+SPACE = len(ALPHABET) ** UIDGenerator.LENGTH
+
+
+##################################################################################################
+
+# generation
+
+##################################################################################################
+
+
+def legacy_generate(exists) -> tuple[str, int]:
+    """
+    Generate a UID the former way, probing until an unused one is found.
+
+    Args:
+        exists (Callable[[str], bool]): Whether a UID is taken, standing in for the database.
+
+    Returns:
+        tuple[str, int]: The UID and the number of probes it took.
+    """
+    probes = 0
+    while True:
+        uid = "".join(random.choices(ALPHABET, k=8))
+        probes += 1
+        if not exists(uid):
+            return uid, probes
+
+
+def throughput(count: int) -> dict[str, float]:
+    """
+    Measure how many UIDs per second each generator produces in process.
+
+    The legacy generator is measured with a probe that never finds the UID, i.e. without the
+    database round trip it used to pay on every attempt.
+
+    Args:
+        count (int): The number of UIDs to generate.
+
+    Returns:
+        dict[str, float]: UIDs per second by generator.
+    """
+    generator = UIDGenerator()
+    start = time.perf_counter()
+    for _ in range(count):
+        generator.generate()
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        legacy_generate(lambda uid: False)
+    legacy_seconds = time.perf_counter() - start
+
+    return {
+        "generate_per_sec": round(count / generate_seconds),
+        "legacy_without_probe_per_sec": round(count / legacy_seconds),
+    }
+
+
+##################################################################################################
+
+# collisions
+
+##################################################################################################
+
+
+def existing_collection(size: int, seed: int) -> array:
+    """
+    Simulate the UIDs of an existing collection as sorted integers.
+
+    The values are drawn as uniform order statistics with exponential spacings, so that ten
+    million of them fit in an 80 MB array and need no sorting.
+
+    Args:
+        size (int): The number of existing documents.
+        seed (int): The random seed.
+
+    Returns:
+        array: The sorted UIDs, read as base 36 integers.
+    """
+    rng = random.Random(seed)
+    values = array("Q")
+    scale = SPACE / (size + 1)
+    position = 0.0
+    for _ in range(size):
+        position += rng.expovariate(1.0) * scale
+        values.append(min(int(position), SPACE - 1))
+    return values
+
+
+def collisions(existing: array, inserts: int) -> dict[str, float]:
+    """
+    Insert new UIDs against the existing ones and count the retries they need.
+
+    Args:
+        existing (array): The sorted existing UIDs.
+        inserts (int): The number of new documents.
+
+    Returns:
+        dict[str, float]: The observed and expected collisions and the most attempts needed.
+    """
+
+    def taken(uid: str) -> bool:
+        value = int(uid, 36)
+        index = bisect_left(existing, value)
+        return index < len(existing) and existing[index] == value
+
+    generator = UIDGenerator()
+    collided = 0
+    max_attempts = 1
+    for _ in range(inserts):
+        attempts = 1
+        while taken(generator.generate()):
+            attempts += 1
+        collided += attempts - 1
+        max_attempts = max(max_attempts, attempts)
+
+    probability = len(existing) / SPACE
+    return {
+        "collision_probability": probability,
+        "expected_collisions": round(inserts * probability, 4),
+        "observed_collisions": collided,
+        "max_attempts": max_attempts,
+        "attempts_allowed": UID_INSERT_ATTEMPTS,
+        "failure_probability_per_insert": probability**UID_INSERT_ATTEMPTS,
+    }
+
+
+def round_trips(probability: float, rtt_ms: float) -> dict[str, float]:
+    """
+    Model the database round trips and latency of one insert with each approach.
+
+    Args:
+        probability (float): The probability that a new UID is taken.
+        rtt_ms (float): The round trip time to the database in milliseconds.
+
+    Returns:
+        dict[str, float]: Round trips and latency per insert by approach.
+    """
+    attempts = 1 / (1 - probability)
+    legacy = attempts + 1
+    return {
+        "legacy_round_trips": round(legacy, 6),
+        "generate_round_trips": round(attempts, 6),
+        "legacy_latency_ms": round(legacy * rtt_ms, 4),
+        "generate_latency_ms": round(attempts * rtt_ms, 4),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run the benchmark from the command line.
+
+    Args:
+        argv (list[str] | None): The command line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--existing", type=int, default=10_000_000)
+    parser.add_argument("--inserts", type=int, default=1_000_000)
+    parser.add_argument("--throughput", type=int, default=200_000)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    print("measuring throughput", file=sys.stderr)
+    speeds = throughput(args.throughput)
+    print(f"simulating {args.existing} existing documents", file=sys.stderr)
+    existing = existing_collection(args.existing, args.seed)
+    print(f"inserting {args.inserts} documents", file=sys.stderr)
+    collided = collisions(existing, args.inserts)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "existing": args.existing,
+            "inserts": args.inserts,
+            "rtt_ms": args.rtt_ms,
+            "seed": args.seed,
+        },
+        "throughput": speeds,
+        "collisions": collided,
+        "per_insert": round_trips(collided["collision_probability"], args.rtt_ms),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())